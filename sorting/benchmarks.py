@@ -0,0 +1,345 @@
+'''
+Benchmarks for the sorting algorithms in this directory; run with:
+
+    python benchmarks.py
+
+Nothing here is a unit test: the numbers are printed for a human to look at.
+'''
+import array
+import imp
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import timeit
+
+
+def load(filename):
+    '''
+    Imports one of the algorithms; their file names (e.g. insert-sort.py) are not
+    valid module names
+    '''
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    return imp.load_source(filename[:-len('.py')].replace('-', '_'), path)
+
+
+def legacy_insert_sort(xs):
+    '''
+    insert_sort as it was before it switched to binary insertion in place; used as
+    the "before" of bench_insert_sort
+    '''
+    sorted_prefix = []
+    N = len(xs)
+    for i in range(0, N):
+        elem_to_insert = xs[i]
+        insertion_occured = False
+        for j in range(0, len(sorted_prefix)):
+            if sorted_prefix[j]>elem_to_insert:
+                head = sorted_prefix[:j]
+                tail = sorted_prefix[j:]
+                head.append(elem_to_insert)
+                head.extend(tail)
+                sorted_prefix = head
+                insertion_occured = True
+                break
+        if not insertion_occured:
+            sorted_prefix.append(elem_to_insert)
+    return sorted_prefix
+
+
+def legacy_merge_sort(xs):
+    '''
+    merge_sort as it was before it became bottom-up; used as the "before" of
+    bench_merge_sort
+    '''
+    if len(xs)<=1:
+        return xs
+    else:
+        fst_half = legacy_merge_sort(xs[        0: len(xs)//2])
+        snd_half = legacy_merge_sort(xs[len(xs)//2: len(xs)  ])
+        rv = []
+        a = 0
+        b = 0
+        for i in range(0, len(xs)):
+            v = None
+            if fst_half[a] <= snd_half[b]:
+                v = fst_half[a]
+                a+=1
+            else:
+                v = snd_half[b]
+                b+=1
+            rv.append(v)
+            if (a == len(fst_half)) or (b == len(snd_half)):
+                src  = snd_half if (a == len(fst_half)) else fst_half
+                idx  = b if (a == len(fst_half)) else a
+                for k in range(idx, len(src)):
+                    rv.append(src[k])
+                break
+        return rv
+
+
+def timed(f, repeat=3):
+    return min(timeit.repeat(f, number=1, repeat=repeat))
+
+
+def bench_insert_sort(N_legacy=3000, N=1000000):
+    '''
+    Reports the time insert_sort takes on presorted, nearly sorted and random input,
+    before and after the switch to binary insertion in place
+    '''
+    insert_sort = load('insert-sort.py')
+    random.seed(0)
+    presorted = list(range(0, N))
+    nearly_sorted = presorted[:]
+    for _ in range(0, N//1000):
+        i = random.randint(0, N-2)
+        nearly_sorted[i], nearly_sorted[i+1] = nearly_sorted[i+1], nearly_sorted[i]
+    shuffled = presorted[:N_legacy]
+    random.shuffle(shuffled)
+    print 'insert sort:'
+    rows = [('legacy, presorted', N_legacy, lambda: legacy_insert_sort(presorted[:N_legacy])),
+            ('legacy, random', N_legacy, lambda: legacy_insert_sort(shuffled)),
+            ('binary insertion, presorted', N, lambda: insert_sort.insert_sort_inplace(presorted[:], adaptive=False)),
+            ('adaptive, presorted', N, lambda: insert_sort.insert_sort(presorted)),
+            ('adaptive, nearly sorted', N, lambda: insert_sort.insert_sort(nearly_sorted)),
+            ('adaptive, random', N_legacy, lambda: insert_sort.insert_sort(shuffled))]
+    for description, n, f in rows:
+        print '    {:<40}{:>10} values{:>12.1f} ms'.format(description, n, 1000*timed(f))
+
+
+def bench_merge_sort(N=200000):
+    '''
+    Reports the time merge_sort takes on random, presorted and "two runs" input
+    (where galloping pays off), before and after the switch to bottom-up merging
+    '''
+    merge_sort = load('merge-sort.py')
+    random.seed(0)
+    inputs = [('random', [random.random() for _ in range(0, N)]),
+              ('presorted', list(range(0, N))),
+              ('two interleaved runs', sorted(random.sample(range(0, 10*N), N//2)) + sorted(random.sample(range(0, 10*N), N//2))),
+              ('long run + short run', list(range(0, N-N//100)) + [random.randint(0, N) for _ in range(0, N//100)])]
+    print 'merge sort, {} values:'.format(N)
+    for description, xs in inputs:
+        t_legacy = timed(lambda: legacy_merge_sort(xs))
+        t_new = timed(lambda: merge_sort.merge_sort(xs))
+        print '    {:<40}{:>10.1f} ms (legacy) {:>10.1f} ms (bottom-up)'.format(description, 1000*t_legacy, 1000*t_new)
+
+
+def segments(N, num_of_segments):
+    '''
+    Returns N random values made of num_of_segments sorted segments, a third of
+    them reversed
+    '''
+    rv = []
+    for i in range(0, num_of_segments):
+        segment = sorted(random.random() for _ in range(0, N//num_of_segments))
+        rv.extend(segment[::-1] if i % 3 == 2 else segment)
+    return rv
+
+
+def bench_tim_sort(N=200000):
+    '''
+    Reports the time tim_sort takes on random and partially ordered input, next to
+    merge_sort and the built-in sorted (which is Timsort too, in C)
+    '''
+    merge_sort = load('merge-sort.py')
+    tim_sort = load('tim-sort.py')
+    random.seed(0)
+    inputs = [('random', [random.random() for _ in range(0, N)]),
+              ('presorted', list(range(0, N))),
+              ('reverse sorted', list(range(N, 0, -1))),
+              ('10 sorted segments', segments(N, 10)),
+              ('1000 sorted segments', segments(N, 1000))]
+    print 'tim sort, {} values:'.format(N)
+    for description, xs in inputs:
+        t_merge = timed(lambda: merge_sort.merge_sort(xs))
+        t_tim = timed(lambda: tim_sort.tim_sort(xs))
+        t_builtin = timed(lambda: sorted(xs))
+        print '    {:<40}{:>10.1f} ms (merge) {:>10.1f} ms (tim) {:>10.1f} ms (built-in)'.format(description, 1000*t_merge, 1000*t_tim, 1000*t_builtin)
+
+
+def bench_parallel_merge_sort(N=2000000):
+    '''
+    Reports the time parallel_merge_sort takes with 1 to N worker processes (at least
+    4, or one per CPU if there are more), on ints, which are shared unboxed, and on
+    tuples sorted by an int key, whose order is sorted by the workers, next to the
+    built-in sorted. The speed-up is bounded by the number of CPUs: with fewer CPUs
+    than processes, the workers take turns and the processes only add their
+    start-up cost.
+    '''
+    parallel_merge_sort = load('parallel-merge-sort.py')
+    random.seed(0)
+    ints = [random.randint(0, 10**12) for _ in range(0, N)]
+    pairs = [(x, str(x)) for x in ints[:N//4]]
+    first = lambda pair: pair[0]
+    print 'parallel merge sort ({} CPUs):'.format(multiprocessing.cpu_count())
+    for description, xs, key in (('{} ints'.format(len(ints)), ints, None),
+                                 ('{} tuples by an int key'.format(len(pairs)), pairs, first)):
+        t_builtin = timed(lambda: sorted(xs, key=key), repeat=1)
+        print '    {:<40}{:>10.1f} ms (built-in)'.format(description, 1000*t_builtin)
+        for processes in range(1, max(multiprocessing.cpu_count(), 4)+1):
+            t = timed(lambda: parallel_merge_sort.parallel_merge_sort(xs, processes=processes, key=key), repeat=1)
+            print '    {:<40}{:>10.1f} ms'.format('{} processes'.format(processes), 1000*t)
+
+
+def bench_external_sort(N=1000000, record_size=16):
+    '''
+    Reports the time external_sort and sort_records take when only an eighth of the
+    input fits in memory, next to the built-in sorted, which holds all of it
+    '''
+    external_sort = load('external-sort.py')
+    random.seed(0)
+    values = [random.random() for _ in range(0, N)]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'records')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(N*record_size))
+        with open(path, 'rb') as f:
+            data = f.read()
+        rows = [('floats, built-in', lambda: sorted(values)),
+                ('floats, external', lambda: list(external_sort.external_sort(values, run_length=N//8))),
+                ('records, built-in', lambda: sorted(data[i:i+record_size] for i in range(0, len(data), record_size))),
+                ('records, external', lambda: external_sort.sort_records(path, os.path.join(tmpdir, 'sorted'), record_size,
+                                                                         memory=N*record_size//8))]
+        print 'external sort, {} values, {}-byte records:'.format(N, record_size)
+        for description, f in rows:
+            print '    {:<40}{:>10.1f} ms'.format(description, 1000*timed(f, repeat=1))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def bench_numeric(N=1000000):
+    '''
+    Reports the time merge_sort takes on a list of floats and on an array.array of
+    them, with typed=True, which goes through the typed fast path of numeric.py
+    (NumPy, if installed), and the time numeric.argsort takes on the array
+    '''
+    merge_sort = load('merge-sort.py')
+    numeric = load('numeric.py')
+    random.seed(0)
+    values = [random.random() for _ in range(0, N)]
+    column = array.array('d', values)
+    print 'numeric backend, {} floats ({}):'.format(N, 'NumPy' if numeric.numpy is not None else 'no NumPy')
+    rows = [('merge sort, list', lambda: merge_sort.merge_sort(values)),
+            ('merge sort, array.array, typed', lambda: merge_sort.merge_sort(column, typed=True)),
+            ('argsort, array.array', lambda: numeric.argsort(column)),
+            ('built-in, list', lambda: sorted(values))]
+    for description, f in rows:
+        print '    {:<40}{:>10.1f} ms'.format(description, 1000*timed(f))
+
+
+def bench_integer_sorts(N=200000):
+    '''
+    Reports the time counting_sort and radix_sort take on small keys (0..100, as in
+    the shared unit tests) and on wide ones (timestamps within a year), next to
+    merge_sort and the built-in sorted
+    '''
+    merge_sort = load('merge-sort.py')
+    counting_sort = load('counting-sort.py')
+    radix_sort = load('radix-sort.py')
+    random.seed(0)
+    inputs = [('keys 0..100', [random.randint(0, 100) for _ in range(0, N)]),
+              ('timestamps, 1 year', [1500000000 + random.randint(0, 365*86400) for _ in range(0, N)])]
+    print 'integer sorts, {} values:'.format(N)
+    for description, xs in inputs:
+        rows = [('merge sort', lambda: merge_sort.merge_sort(xs)),
+                ('radix, 8-bit digits', lambda: radix_sort.radix_sort(xs)),
+                ('radix, 16-bit digits', lambda: radix_sort.radix_sort(xs, bits=16)),
+                ('built-in', lambda: sorted(xs))]
+        if max(xs) - min(xs) < 2**16:
+            rows.insert(1, ('counting sort', lambda: counting_sort.counting_sort(xs)))
+        for algo, f in rows:
+            print '    {:<40}{:>10.1f} ms'.format('{}, {}'.format(description, algo), 1000*timed(f))
+
+
+def bench_key_options(N=200000):
+    '''
+    Reports the time merge_sort takes with a key, which it computes once per value,
+    next to decorating the values with (key, index, value) tuples by hand, as was
+    needed before key= existed, and to sorting in place
+    '''
+    merge_sort = load('merge-sort.py')
+    random.seed(0)
+    records = [{'id': i, 'score': random.random()} for i in range(0, N)]
+    score = lambda r: r['score']
+    def by_hand():
+        return [r for _, _, r in merge_sort.merge_sort([(score(r), i, r) for i, r in enumerate(records)])]
+    print 'merge sort with a key, {} records:'.format(N)
+    rows = [('decorated by hand', by_hand),
+            ('key=', lambda: merge_sort.merge_sort(records, key=score)),
+            ('key=, reverse=', lambda: merge_sort.merge_sort(records, key=score, reverse=True)),
+            ('key=, inplace=', lambda: merge_sort.merge_sort(records[:], key=score, inplace=True))]
+    for description, f in rows:
+        print '    {:<40}{:>10.1f} ms'.format(description, 1000*timed(f))
+
+
+def bench_partial_sort(N=200000, k=10):
+    '''
+    Reports the time the top k values, the median and the 99th percentile take with
+    partial-sort.py, next to a full tim_sort and the built-in sorted
+    '''
+    tim_sort = load('tim-sort.py')
+    partial_sort = load('partial-sort.py')
+    random.seed(0)
+    xs = [random.random() for _ in range(0, N)]
+    def nth(n):
+        ys = xs[:]
+        partial_sort.nth_element(ys, n)
+        return ys[n]
+    def incremental(k):
+        sorted_values = partial_sort.incremental_sort(xs)
+        return [next(sorted_values) for _ in range(0, k)]
+    print 'partial sort, {} values:'.format(N)
+    rows = [('full tim sort', lambda: tim_sort.tim_sort(xs)),
+            ('full built-in sort', lambda: sorted(xs)),
+            ('nsmallest, k={}'.format(k), lambda: partial_sort.nsmallest(k, xs)),
+            ('nlargest, k={}'.format(k), lambda: partial_sort.nlargest(k, xs)),
+            ('incremental sort, first {}'.format(k), lambda: incremental(k)),
+            ('nth_element, median', lambda: nth(N//2)),
+            ('nth_element, 99th percentile', lambda: nth(N*99//100))]
+    for description, f in rows:
+        print '    {:<40}{:>10.1f} ms'.format(description, 1000*timed(f))
+
+
+def bench_intro_sort(N=200000):
+    '''
+    Reports the time intro_sort takes on random input, on input with few distinct
+    values (as in the shared unit tests) and on partially ordered input, next to
+    merge_sort, tim_sort and the built-in sorted. With the defaults, checking ranges
+    for order before partitioning them (intro-sort.py's _presorted) took intro_sort
+    from 472 to 40 ms on presorted input, from 665 to 41 ms reverse sorted and from
+    513 to 59 ms on organ pipe input (merge_sort: 200, 414 and 345 ms), and left it at
+    770 ms on random input.
+    '''
+    merge_sort = load('merge-sort.py')
+    tim_sort = load('tim-sort.py')
+    intro_sort = load('intro-sort.py')
+    random.seed(0)
+    inputs = [('random', [random.random() for _ in range(0, N)]),
+              ('keys 0..100', [random.randint(0, 100) for _ in range(0, N)]),
+              ('presorted', list(range(0, N))),
+              ('reverse sorted', list(range(N, 0, -1))),
+              ('organ pipe', list(range(0, N, 2)) + list(range(N-1, 0, -2)))]
+    print 'intro sort, {} values:'.format(N)
+    for description, xs in inputs:
+        t_merge = timed(lambda: merge_sort.merge_sort(xs))
+        t_tim = timed(lambda: tim_sort.tim_sort(xs))
+        t_intro = timed(lambda: intro_sort.intro_sort(xs))
+        t_builtin = timed(lambda: sorted(xs))
+        print '    {:<40}{:>10.1f} ms (merge) {:>10.1f} ms (tim) {:>10.1f} ms (intro) {:>10.1f} ms (built-in)'.format(
+            description, 1000*t_merge, 1000*t_tim, 1000*t_intro, 1000*t_builtin)
+
+
+if __name__ == '__main__':
+    bench_insert_sort()
+    bench_merge_sort()
+    bench_tim_sort()
+    bench_parallel_merge_sort()
+    bench_external_sort()
+    bench_numeric()
+    bench_integer_sorts()
+    bench_key_options()
+    bench_partial_sort()
+    bench_intro_sort()
@@ -1,5 +1,16 @@
-def bubble_sort(xs_unsorted):
-    xs = xs_unsorted[:]
+from sort_options import sort_with_options
+
+
+def bubble_sort(xs, key=None, reverse=False, inplace=False, typed=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse, inplace and typed. The sort is
+    stable: values are only ever swapped with a greater neighbour.
+    '''
+    return sort_with_options(xs, _bubble_sort, key, reverse, inplace, typed=typed)
+
+
+def _bubble_sort(xs):
     while True:
         flip_happened = False
         for i in range(0, len(xs)-1):
@@ -8,7 +19,6 @@ def bubble_sort(xs_unsorted):
                 flip_happened = True
         if not flip_happened:
             break
-    return xs
                 
 
 
@@ -25,7 +35,14 @@ import sorting_unittests
 class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
     def sort_algo(self):
         return bubble_sort
-        
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return bubble_sort
+
+class UnitTestsNumeric(sorting_unittests.AbstractNumericUnitTestCases):
+    def sort_algo(self):
+        return bubble_sort
 
 
 if __name__ == '__main__' :
@@ -0,0 +1,92 @@
+import array
+import random
+
+from sort_options import sort_with_options
+
+
+def counting_sort(xs, key=None, reverse=False, inplace=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse and inplace. The sort is stable, by
+    counting: the values are ordered by their integer keys (the values themselves,
+    or key(value), which is called once per value), negative ones included, without
+    comparing them. This takes O(n + k) time and O(k) extra space, where k is the
+    range of the keys (max - min + 1), so it is meant for keys in a small range; see
+    radix_sort for wider ones.
+    '''
+    return sort_with_options(xs, _counting_sort, key, reverse, inplace, takes_key=True)
+
+
+def _counting_sort(xs, key):
+    keys = xs if key is None else [key(x) for x in xs]
+    if not keys:
+        return
+    lo = min(keys)
+    counts = [0]*(max(keys)-lo+1)
+    for k in keys:
+        counts[k-lo] += 1
+    # counts[k-lo] becomes the index in the result of the next value of key k
+    total = 0
+    for i, count in enumerate(counts):
+        counts[i] = total
+        total += count
+    rv = [None]*len(xs)
+    for x, k in zip(xs, keys):
+        rv[counts[k-lo]] = x
+        counts[k-lo] += 1
+    xs[:] = rv
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return counting_sort
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return counting_sort
+
+class UnitTestsCountingSort(unittest.TestCase):
+
+    def test_negative_keys(self):
+        random.seed(0)
+        xs = [random.randint(-50, 50) for _ in range(0, 1000)]
+        self.assertSequenceEqual(counting_sort(xs), sorted(xs))
+        self.assertSequenceEqual(counting_sort([-3, -3, -7]), [-7, -3, -3])
+
+    def test_key_is_called_once_per_value_and_stable(self):
+        random.seed(0)
+        xs = [(random.randint(-5, 5), i) for i in range(0, 1000)]
+        calls = []
+        def key(x):
+            calls.append(x)
+            return x[0]
+        self.assertSequenceEqual(counting_sort(xs, key=key), sorted(xs, key=lambda x: x[0]))
+        self.assertEqual(len(calls), len(xs))
+        self.assertSequenceEqual(counting_sort(['ccc', 'a', 'bb', 'd'], key=len), ['a', 'd', 'bb', 'ccc'])
+
+    def test_input_is_not_modified(self):
+        xs = [3, 1, 2]
+        counting_sort(xs)
+        self.assertSequenceEqual(xs, [3, 1, 2])
+        self.assertSequenceEqual(counting_sort(iter(xs)), [1, 2, 3])
+
+    def test_integer_keys_only(self):
+        self.assertRaises(TypeError, counting_sort, [1.5, 0.5])
+        self.assertRaises(TypeError, counting_sort, array.array('d', [1.5, 0.5]))
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
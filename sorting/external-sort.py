@@ -0,0 +1,352 @@
+import array
+import cPickle
+import heapq
+import itertools
+import mmap
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+
+import numeric
+from merging import kway_merge
+from sort_options import Keyed
+
+
+# values sorted in memory at a time (external_sort), and bytes of memory that
+# sorted_records may use
+DEFAULT_RUN_LENGTH = 1000000
+DEFAULT_MEMORY = 64*2**20
+
+# values pickled together in the runs spilled by external_sort
+_BLOCK = 1000
+
+# bytes of sorted records written to a run at a time
+_WRITE_CHUNK = 2**16
+
+
+def _unpickled(f):
+    '''
+    Yields the values of a run spilled by external_sort, block after block
+    '''
+    while True:
+        try:
+            block = cPickle.load(f)
+        except EOFError:
+            return
+        for v in block:
+            yield v
+
+
+def external_sort(values, run_length=DEFAULT_RUN_LENGTH, tmpdir=None, key=None, reverse=False):
+    '''
+    Yields the values of the iterable values (e.g. the lines of a file) in sorted
+    order, and stably, holding no more than run_length of them in memory at a time
+    (see sort_options for key and reverse; as nothing is returned, there is no
+    inplace):
+    the values are read run_length at a time, each such run is sorted and, unless it
+    is the only one, pickled to a temporary file (in tmpdir, or the default temporary
+    directory). The runs are then merged back with a k-way heap merge. The temporary
+    files are removed once the generator is exhausted or closed.
+
+    run_length is a number of values, not of bytes: it is only a proxy for memory,
+    as the values are arbitrary Python objects. A run takes run_length times the size
+    of a value (plus, with a key, that of its key and of a wrapper), plus a list slot
+    and the sort's buffer, about 12 bytes, per value. For a budget in bytes, use
+    sorted_records on fixed-width records.
+    '''
+    values = iter(values) if key is None else (Keyed(key(v), v) for v in values)
+    runs = []
+    try:
+        while True:
+            run = sorted(itertools.islice(values, run_length), reverse=reverse)
+            if not runs and len(run) < run_length:
+                # everything fitted in memory
+                for v in run:
+                    yield v if key is None else v.v
+                return
+            if not run:
+                break
+            f = tempfile.TemporaryFile(dir=tmpdir)
+            runs.append(f)
+            for lo in range(0, len(run), _BLOCK):
+                cPickle.dump(run[lo:lo+_BLOCK], f, cPickle.HIGHEST_PROTOCOL)
+            del run
+        for f in runs:
+            f.seek(0)
+        for v in kway_merge([_unpickled(f) for f in runs], reverse):
+            yield v if key is None else v.v
+    finally:
+        for f in runs:
+            f.close()
+
+
+def _record_cost(record_size, key_length):
+    '''
+    Returns the bytes of memory that sorting a run takes per record: the record
+    itself, in the mapped window of the file, and
+    * with NumPy, a copy of its key, its index and the merge sort's buffer of indices
+    * without it, a string of its key followed by its index, the slot of that string
+      in a list (over-allocated as the list grows) and the list sort's buffer, and
+      its index once sorted
+    '''
+    if numeric.numpy is not None:
+        return record_size + key_length + 16
+    string = (sys.getsizeof(b'\0'*(key_length+8)) + 7) // 8 * 8
+    return record_size + string + 16 + 8
+
+
+def _sorted_order(mm, offset, N, record_size, key_offset, key_length):
+    '''
+    Returns the indices of the N records at offset in mm in the (stable) order of
+    their keys: a NumPy array, sorted without boxing, or, without NumPy, an
+    array('l'), sorted by the built-in sort as strings of the keys followed by the
+    indices, which keeps the sort stable without a key function
+    '''
+    numpy = numeric.numpy
+    if numpy is not None:
+        if key_length == 0:
+            return numpy.arange(N)
+        records = numpy.frombuffer(mm, numpy.uint8, N*record_size, offset).reshape(N, record_size)
+        keys = records[:, key_offset:key_offset+key_length].copy().view(str('S{}'.format(key_length))).ravel()
+        return numpy.argsort(keys, kind='mergesort')
+    pack = struct.Struct(str('>Q')).pack
+    unpack_from = struct.Struct(str('>Q')).unpack_from
+    keys = []
+    for i in xrange(0, N):
+        start = offset + i*record_size + key_offset
+        keys.append(mm[start:start+key_length] + pack(i))
+    keys.sort()
+    return array.array(str('l'), (unpack_from(k, key_length)[0] for k in keys))
+
+
+def _write_run(mm, offset, order, record_size, f):
+    '''
+    Writes the records at offset in mm to f in order, _WRITE_CHUNK bytes at a time
+    '''
+    step = max(1, _WRITE_CHUNK // record_size)
+    numpy = numeric.numpy
+    if numpy is not None and isinstance(order, numpy.ndarray):
+        records = numpy.frombuffer(mm, numpy.uint8, len(order)*record_size, offset).reshape(len(order), record_size)
+        for lo in xrange(0, len(order), step):
+            f.write(records[order[lo:lo+step]].tobytes())
+        return
+    for lo in xrange(0, len(order), step):
+        f.write(b''.join(mm[offset+i*record_size:offset+(i+1)*record_size] for i in order[lo:lo+step]))
+
+
+def _keyed_records(f, run, block, record_size, key_offset, key_length):
+    '''
+    Yields (key, run, record) for the records of a run spilled by sorted_records,
+    which are read block bytes at a time
+    '''
+    while True:
+        buf = f.read(block)
+        if not buf:
+            return
+        for i in xrange(0, len(buf), record_size):
+            yield buf[i+key_offset:i+key_offset+key_length], run, buf[i:i+record_size]
+
+
+def sorted_records(path, record_size, key_offset=0, key_length=None, memory=DEFAULT_MEMORY, tmpdir=None):
+    '''
+    Yields the fixed-width records (byte strings of record_size bytes) of the binary
+    file at path, sorted stably by the bytes key_offset to key_offset+key_length of
+    each record (by default, the whole record), compared as unsigned bytes.
+
+    Nothing is parsed, and no more than about memory bytes are used (plus a buffer of
+    _WRITE_CHUNK bytes): the file is sorted one run of records at a time, each run
+    being memory-mapped on its own and unmapped once sorted. A run holds as many
+    records as memory has room for, counting what sorting takes per record besides
+    the record itself (see _record_cost): with NumPy, the indices of the records are
+    sorted by their keys without a Python object per record; without it, by the
+    built-in sort. Each run is written in chunks to a temporary file (in tmpdir, or
+    the default temporary directory), and the runs are merged back with a k-way
+    heap merge that reads each of them memory/k bytes at a time. The temporary files
+    are removed once the generator is exhausted or closed.
+    '''
+    key_length = record_size - key_offset if key_length is None else key_length
+    if record_size < 1 or not 0 <= key_offset <= key_offset+key_length <= record_size:
+        raise ValueError('the key must lie within the record')
+    size = os.path.getsize(path)
+    if size % record_size != 0:
+        raise ValueError('the size of {} is not a multiple of the record size'.format(path))
+    N = size // record_size
+    if N == 0:
+        return
+    run_records = max(1, memory // _record_cost(record_size, key_length))
+    runs = []
+    try:
+        with open(path, 'rb') as f:
+            for lo in xrange(0, N, run_records):
+                hi = min(lo+run_records, N)
+                # a mapping must start at a multiple of the allocation granularity
+                start = lo*record_size - lo*record_size % mmap.ALLOCATIONGRANULARITY
+                mm = mmap.mmap(f.fileno(), hi*record_size - start, access=mmap.ACCESS_READ, offset=start)
+                try:
+                    offset = lo*record_size - start
+                    order = _sorted_order(mm, offset, hi-lo, record_size, key_offset, key_length)
+                    if hi-lo == N:
+                        # everything fitted in memory
+                        for i in order:
+                            yield mm[offset+i*record_size:offset+(i+1)*record_size]
+                        return
+                    run = tempfile.TemporaryFile(dir=tmpdir, bufsize=0)
+                    runs.append(run)
+                    _write_run(mm, offset, order, record_size, run)
+                    del order
+                finally:
+                    mm.close()
+        block = max(1, memory // (len(runs)*record_size)) * record_size
+        for run in runs:
+            run.seek(0)
+        # equal keys are ordered by run, so heapq.merge never compares the records
+        merged = heapq.merge(*[_keyed_records(f, run, block, record_size, key_offset, key_length)
+                               for run, f in enumerate(runs)])
+        for _, _, record in merged:
+            yield record
+    finally:
+        for run in runs:
+            run.close()
+
+
+def sort_records(src, dst, record_size, key_offset=0, key_length=None, memory=DEFAULT_MEMORY, tmpdir=None):
+    '''
+    Writes the records of the file at src, sorted, to the file at dst (see
+    sorted_records) and returns how many there are
+    '''
+    count = 0
+    with open(dst, 'wb') as f:
+        for record in sorted_records(src, record_size, key_offset, key_length, memory, tmpdir):
+            f.write(record)
+            count += 1
+    return count
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+from sorting_unittests import FirstItemKey
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        # make most inputs spill a few runs
+        return lambda xs: list(external_sort(xs, run_length=100))
+
+class UnitTestsExternalSort(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_stable_across_runs(self):
+        random.seed(0)
+        for N, run_length in ((0, 10), (10, 10), (11, 10), (1000, 1), (1000, 33), (5000, 4999)):
+            xs = [(random.randint(0, 5), i) for i in range(0, N)]
+            rv = external_sort((FirstItemKey(x) for x in xs), run_length=run_length, tmpdir=self.tmpdir)
+            self.assertSequenceEqual([k.x for k in rv], sorted(xs, key=lambda x: x[0]))
+
+    def test_key_and_reverse(self):
+        random.seed(0)
+        xs = [(random.randint(0, 5), i) for i in range(0, 1000)]
+        calls = []
+        def key(x):
+            calls.append(x)
+            return x[0]
+        for run_length in (7, 1000):
+            self.assertSequenceEqual(list(external_sort(xs, run_length, key=lambda x: x[0])), sorted(xs, key=lambda x: x[0]))
+            self.assertSequenceEqual(list(external_sort(xs, run_length, key=key, reverse=True)),
+                                     sorted(xs, key=lambda x: x[0], reverse=True))
+            self.assertSequenceEqual(list(external_sort([x[1] for x in xs], run_length, reverse=True)), range(999, -1, -1))
+        self.assertEqual(len(calls), 2*len(xs))
+
+    def test_streams_from_a_file(self):
+        path = os.path.join(self.tmpdir, 'lines')
+        lines = ['{}\n'.format(random.random()) for _ in range(0, 1000)]
+        with open(path, 'w') as f:
+            f.writelines(lines)
+        with open(path) as f:
+            self.assertSequenceEqual(list(external_sort(f, run_length=64)), sorted(lines))
+
+    def test_closed_early(self):
+        rv = external_sort(range(1000, 0, -1), run_length=10)
+        self.assertSequenceEqual([next(rv) for _ in range(0, 5)], [1, 2, 3, 4, 5])
+        rv.close()
+
+    def write_records(self, N, record_size):
+        path = os.path.join(self.tmpdir, 'records')
+        records = [b''.join(chr(random.randint(0, 3)) for _ in range(0, record_size)) for _ in range(0, N)]
+        with open(path, 'wb') as f:
+            f.write(b''.join(records))
+        return path, records
+
+    def test_sorted_records(self):
+        random.seed(0)
+        for N in (0, 1, 10, 1000):
+            path, records = self.write_records(N, 8)
+            for memory in (8, 80, 8*N, 2**20):
+                self.assertSequenceEqual(list(sorted_records(path, 8, memory=memory)), sorted(records))
+                for key_offset, key_length in ((0, 0), (2, 3), (7, 1)):
+                    self.assertSequenceEqual(list(sorted_records(path, 8, key_offset, key_length, memory=memory)),
+                                             sorted(records, key=lambda r: r[key_offset:key_offset+key_length]))
+
+    def test_sorted_records_without_numpy(self):
+        numpy, numeric.numpy = numeric.numpy, None
+        try:
+            self.test_sorted_records()
+        finally:
+            numeric.numpy = numpy
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'needs ru_maxrss in KiB')
+    def test_memory_budget(self):
+        # the peak memory of a process sorting 8 MiB of records with a budget of 1 MiB,
+        # with and without NumPy
+        path = os.path.join(self.tmpdir, 'records')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(2**23))
+        script = '''
+import imp, os, resource, sys
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+module = imp.load_source('external_sort', sys.argv[1])
+if sys.argv[4] == 'without':
+    module.numeric.numpy = None
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+module.sort_records(sys.argv[2], sys.argv[3], 16, memory=2**20, tmpdir=os.path.dirname(sys.argv[3]))
+print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+'''
+        for numpy in ('with', 'without'):
+            growth = subprocess.check_output([sys.executable, '-c', script, os.path.abspath(__file__), path,
+                                              os.path.join(self.tmpdir, 'sorted'), numpy])
+            self.assertTrue(int(growth) <= 1.25*2**10, (numpy, growth))
+
+    def test_sort_records(self):
+        random.seed(0)
+        path, records = self.write_records(1000, 5)
+        dst = os.path.join(self.tmpdir, 'sorted')
+        self.assertEqual(sort_records(path, dst, 5, 1, 2, memory=500, tmpdir=self.tmpdir), 1000)
+        with open(dst, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(sorted(records, key=lambda r: r[1:3])))
+
+    def test_invalid_records(self):
+        path, _ = self.write_records(3, 5)
+        self.assertRaises(ValueError, list, sorted_records(path, 4))
+        self.assertRaises(ValueError, list, sorted_records(path, 5, 4, 2))
+        self.assertRaises(ValueError, list, sorted_records(path, 0))
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
@@ -1,22 +1,41 @@
-def insert_sort(xs):
-    sorted_prefix = []
-    N = len(xs)
-    for i in range(0, N):
-        elem_to_insert = xs[i]
-        insertion_occured = False
-        for j in range(0, len(sorted_prefix)):
-            if sorted_prefix[j]>elem_to_insert:
-                head = sorted_prefix[:j]
-                tail = sorted_prefix[j:]
-                head.append(elem_to_insert)
-                head.extend(tail)
-                sorted_prefix = head
-                insertion_occured = True
-                break
-        if not insertion_occured:
-            sorted_prefix.append(elem_to_insert)
-    return sorted_prefix
-                
+import bisect
+import random
+
+from sort_options import sort_with_options
+
+
+def insert_sort(xs, key=None, reverse=False, inplace=False, typed=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse, inplace and typed, and
+    insert_sort_inplace for the algorithm, which is stable.
+    '''
+    return sort_with_options(xs, insert_sort_inplace, key, reverse, inplace, typed=typed)
+
+
+def insert_sort_inplace(xs, lo=0, hi=None, adaptive=True):
+    '''
+    Sorts xs[lo:hi] in place, and stably, by binary insertion: the insertion point of
+    every value in the sorted prefix is found with a binary search (O(log n)
+    comparisons rather than O(n)) and the values after it are shifted up by one with
+    a single slice assignment, which is a memmove rather than a Python loop.
+
+    If adaptive is True, values that are not smaller than their predecessor are left
+    where they are after a single comparison, so every run that is already in order
+    is skipped in O(1) per value, and sorted input takes O(n) time overall.
+    '''
+    hi = len(xs) if hi is None else hi
+    i = lo+1
+    while i < hi:
+        v = xs[i]
+        if adaptive and not v < xs[i-1]:
+            i += 1
+            continue
+        # after any values equal to v, so that the sort is stable
+        j = bisect.bisect_right(xs, v, lo, i)
+        xs[j+1:i+1] = xs[j:i]
+        xs[j] = v
+        i += 1
 
 
 
@@ -28,11 +47,51 @@ def insert_sort(xs):
 
 import unittest
 import sorting_unittests
+from sorting_unittests import FirstItemKey
 
 class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
     def sort_algo(self):
         return insert_sort
-        
+
+class UnitTestsNonAdaptive(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        def sort(xs):
+            rv = xs[:]
+            insert_sort_inplace(rv, adaptive=False)
+            return rv
+        return sort
+
+class UnitTestsInPlace(unittest.TestCase):
+
+    def test_in_place_and_stable(self):
+        random.seed(0)
+        for adaptive in (True, False):
+            for N in range(0, 60):
+                xs = [(random.randint(0, 5), i) for i in range(0, N)]
+                wrapped = [FirstItemKey(x) for x in xs]
+                self.assertIs(insert_sort_inplace(wrapped, adaptive=adaptive), None)
+                self.assertSequenceEqual([k.x for k in wrapped], sorted(xs, key=lambda x: x[0]))
+
+    def test_slice(self):
+        xs = [9, 8, 5, 3, 4, 1, 0, -1]
+        insert_sort_inplace(xs, 2, 6)
+        self.assertSequenceEqual(xs, [9, 8, 1, 3, 4, 5, 0, -1])
+
+    def test_partially_sorted_runs(self):
+        random.seed(0)
+        xs = []
+        for _ in range(0, 50):
+            run = sorted(random.randint(0, 1000) for _ in range(0, random.randint(1, 40)))
+            xs.extend(run if random.random() < 0.5 else run[::-1])
+        self.assertSequenceEqual(insert_sort(xs), sorted(xs))
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return insert_sort
+
+class UnitTestsNumeric(sorting_unittests.AbstractNumericUnitTestCases):
+    def sort_algo(self):
+        return insert_sort
 
 
 if __name__ == '__main__' :
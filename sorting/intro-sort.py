@@ -0,0 +1,249 @@
+import bisect
+import itertools
+import math
+import operator
+import random
+
+from merging import binary_insertion_sort, merge
+from partitioning import partition, pivot
+from sort_options import sort_with_options
+
+
+# ranges this short are sorted by binary insertion rather than partitioned
+INSERTION_CUTOFF = 16
+
+# values out of order that partial insertion sort moves before it gives up on a range
+PARTIAL_INSERTION_LIMIT = 8
+
+
+def intro_sort(xs, key=None, reverse=False, inplace=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse and inplace. The sort is NOT stable:
+    it is an introsort (D. Musser), i.e. an in-place quicksort
+    * with median-of-three or ninther pivots (see partitioning.pivot)
+    * with three-way partitions, so the values equal to the pivot are done with at
+      once and inputs with many duplicates take O(n log k) time for k distinct values
+    * that leaves ranges of up to INSERTION_CUTOFF values to binary insertion
+    * that recurses into the smaller side of each partition only, and loops on the
+      larger one, so the stack is O(log n) deep
+    * and that falls back on heapsort for a range that is still being partitioned
+      after 2*log2(n) levels, which bounds the worst case to O(n log n)
+    Like pdqsort (O. Peters), it first checks every range it is about to partition
+    for order (see _presorted): a range made of one or two runs, in order or in
+    reverse order, takes a pass and at most one merge, and a range with at most
+    PARTIAL_INSERTION_LIMIT values out of order is finished by insertion. That makes
+    sorted, reversed, organ pipe and nearly sorted inputs O(n), and costs a handful
+    of comparisons per range on the others.
+    '''
+    return sort_with_options(xs, _intro_sort, key, reverse, inplace)
+
+
+def _intro_sort(xs):
+    _sort(xs, 0, len(xs), 2*len(xs).bit_length())
+
+
+def _sort(xs, lo, hi, depth):
+    '''
+    Sorts xs[lo:hi], falling back on heapsort once depth more levels of partitions
+    have been made
+    '''
+    while hi - lo > INSERTION_CUTOFF:
+        if _presorted(xs, lo, hi):
+            return
+        if depth == 0:
+            _heap_sort(xs, lo, hi)
+            return
+        depth -= 1
+        lt, gt = partition(xs, lo, hi, pivot(xs, lo, hi))
+        if lt - lo < hi - gt:
+            _sort(xs, lo, lt, depth)
+            lo = gt
+        else:
+            _sort(xs, gt, hi, depth)
+            hi = lt
+    binary_insertion_sort(xs, lo, hi)
+
+
+def _presorted(xs, lo, hi):
+    '''
+    Sorts xs[lo:hi] and returns True if it is made of at most two runs, each in
+    order or in reverse order (the runs in reverse order are reversed, and two runs
+    merged), or has at most PARTIAL_INSERTION_LIMIT values out of order (which are
+    moved to their places by binary insertion); otherwise gives up as soon as it
+    finds out, and returns False, with the range rearranged but not sorted. Only
+    ranges whose first and last values and seven values evenly spaced in between
+    change direction at most once are checked; others are left alone at once.
+    '''
+    samples = xs[lo:hi-1:max(1, (hi-lo)//8)] + [xs[hi-1]]
+    descents = [b < a for a, b in itertools.izip(samples, samples[1:])
+                if a < b or b < a]
+    if sum(itertools.imap(operator.ne, descents, descents[1:])) > 1:
+        return False
+    mid = _run_end(xs, lo, hi)
+    if mid == lo+1:
+        mid = _run_end(xs, lo, hi, descending=True)
+        _reverse(xs, lo, mid)
+    if mid == hi:
+        return True
+    end = _run_end(xs, mid, hi)
+    if end == mid+1:
+        end = _run_end(xs, mid, hi, descending=True)
+        _reverse(xs, mid, end)
+    if end == hi:
+        merge(xs[lo:mid], 0, mid-lo, xs, mid, hi, xs, lo)
+        return True
+    moves = 0
+    i = _run_end(xs, lo, hi)
+    while i < hi:
+        moves += 1
+        if moves > PARTIAL_INSERTION_LIMIT:
+            return False
+        v = xs[i]
+        j = bisect.bisect_right(xs, v, lo, i)
+        xs[j+1:i+1] = xs[j:i]
+        xs[j] = v
+        i = _run_end(xs, i, hi)
+    return True
+
+
+def _run_end(xs, lo, hi, descending=False):
+    '''
+    Returns the end of the run in order (in reverse order if descending) that starts
+    at lo: the first index in (lo, hi) whose value is smaller (greater) than the one
+    before it, or hi. The values are compared at C speed, up to the first one out of
+    order.
+    '''
+    get = xs.__getitem__
+    values = itertools.imap(get, xrange(lo, hi-1))
+    nexts = itertools.imap(get, xrange(lo+1, hi))
+    out_of_order = itertools.imap(operator.lt, values, nexts) if descending else \
+                   itertools.imap(operator.lt, nexts, values)
+    return next(itertools.compress(xrange(lo+1, hi), out_of_order), hi)
+
+
+def _reverse(xs, lo, hi):
+    xs[lo:hi] = xs[lo:hi][::-1]
+
+
+def _sift_down(xs, lo, i, n):
+    '''
+    Moves the value at the index i of the heap of size n that starts at lo down to
+    its place, below any greater child
+    '''
+    v = xs[lo+i]
+    while True:
+        child = 2*i + 1
+        if child >= n:
+            break
+        if child+1 < n and xs[lo+child] < xs[lo+child+1]:
+            child += 1
+        if not v < xs[lo+child]:
+            break
+        xs[lo+i] = xs[lo+child]
+        i = child
+    xs[lo+i] = v
+
+
+def _heap_sort(xs, lo, hi):
+    '''
+    Sorts xs[lo:hi] in place, in O(n log n) time whatever the input, by heapsort:
+    the range is made a max-heap, whose top is swapped to the end of the range as
+    the heap shrinks
+    '''
+    n = hi - lo
+    for i in range(n//2 - 1, -1, -1):
+        _sift_down(xs, lo, i, n)
+    for end in range(n-1, 0, -1):
+        xs[lo], xs[lo+end] = xs[lo+end], xs[lo]
+        _sift_down(xs, lo, 0, end)
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+from sorting_unittests import Counted
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return intro_sort
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    stable = False
+    def sort_algo(self):
+        return intro_sort
+
+class UnitTestsHeapSort(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        def sort(xs):
+            rv = xs[:]
+            _heap_sort(rv, 0, len(rv))
+            return rv
+        return sort
+
+class UnitTestsIntroSort(unittest.TestCase):
+
+    def inputs(self, N):
+        random.seed(0)
+        return [('random', [random.random() for _ in range(0, N)]),
+                ('few distinct', [random.randint(0, 3) for _ in range(0, N)]),
+                ('presorted', range(0, N)),
+                ('reverse sorted', range(N, 0, -1)),
+                ('all equal', [7]*N),
+                ('organ pipe', range(0, N, 2) + range(N-1 - (N-1) % 2, 0, -2)),
+                ('sawtooth', [i % 100 for i in range(0, N)])]
+
+    def test_adversarial_inputs_take_n_log_n(self):
+        for N in (17, 128, 1000, 5000):
+            for description, values in self.inputs(N):
+                xs = [Counted(v) for v in values]
+                Counted.comparisons = 0
+                intro_sort(xs, inplace=True)
+                self.assertSequenceEqual([x.v for x in xs], sorted(values), description)
+                self.assertTrue(Counted.comparisons <= 3*N*math.log(N, 2), description)
+
+    def test_heap_sort_fallback(self):
+        for description, values in self.inputs(1000):
+            xs = values[:]
+            _sort(xs, 0, len(xs), 0)
+            self.assertSequenceEqual(xs, sorted(values), description)
+            xs = values[:]
+            _heap_sort(xs, 100, 900)
+            self.assertSequenceEqual(xs, values[:100] + sorted(values[100:900]) + values[900:], description)
+
+    def test_duplicates_are_partitioned_out(self):
+        # three-way partitions make few distinct values take about n comparisons per
+        # distinct value, rather than n log n
+        N = 5000
+        xs = [Counted(i % 3) for i in range(0, N)]
+        Counted.comparisons = 0
+        intro_sort(xs, inplace=True)
+        self.assertTrue(Counted.comparisons <= 8*N)
+
+    def test_presorted_inputs_take_n(self):
+        N = 5000
+        random.seed(0)
+        appended = [random.randrange(0, N) for _ in range(0, PARTIAL_INSERTION_LIMIT)]
+        for description, values in [('presorted', range(0, N)),
+                                    ('reverse sorted', range(N, 0, -1)),
+                                    ('organ pipe', range(0, N, 2) + range(N-1, 0, -2)),
+                                    ('inverted organ pipe', range(N-1, 0, -2) + range(0, N, 2)),
+                                    ('a few values appended', range(0, N) + appended)]:
+            xs = [Counted(v) for v in values]
+            Counted.comparisons = 0
+            intro_sort(xs, inplace=True)
+            self.assertSequenceEqual([x.v for x in xs], sorted(values), description)
+            self.assertTrue(Counted.comparisons <= 4*N, description)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
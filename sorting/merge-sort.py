@@ -1,32 +1,48 @@
-def merge_sort(xs):
-    if len(xs)<=1:
-        return xs
-    else:
-        fst_half = merge_sort(xs[        0: len(xs)/2])
-        snd_half = merge_sort(xs[len(xs)/2: len(xs)  ])
-        rv = []
-        a = 0
-        b = 0
-        for i in range(0, len(xs)):
-            v = None
-            if fst_half[a] <= snd_half[b]:
-                v = fst_half[a]
-                a+=1
-            else:
-                v = snd_half[b]
-                b+=1
-            rv.append(v)
-            if (a == len(fst_half)) or (b == len(snd_half)):
-                src  = snd_half if (a == len(fst_half)) else fst_half
-                idx  = b if (a == len(fst_half)) else a
-                for k in range(idx, len(src)):
-                    rv.append(src[k])
-                break
-        return rv
+import bisect
+import random
+
+from merging import binary_insertion_sort, copy, gallop, merge
+from sort_options import sort_with_options
+
 
+# runs shorter than this are sorted by binary insertion before merging starts
+MIN_RUN = 32
 
 
-                
+def merge_sort(xs, key=None, reverse=False, inplace=False, typed=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse, inplace and typed. The sort is
+    stable, bottom-up and iterative: runs of MIN_RUN values are sorted by binary
+    insertion, then runs twice as long are merged pass after pass, back and forth
+    between the list and a single buffer of the same size allocated up front. The
+    merges copy values one at a time rather than through slices (see merging.copy),
+    so no temporary list is allocated per merge either.
+    '''
+    return sort_with_options(xs, _merge_sort, key, reverse, inplace, typed=typed)
+
+
+def _merge_sort(a):
+    N = len(a)
+    for lo in range(0, N, MIN_RUN):
+        binary_insertion_sort(a, lo, min(lo+MIN_RUN, N))
+    if N <= MIN_RUN:
+        return
+    src, dst = a, [None]*N
+    width = MIN_RUN
+    while width < N:
+        for lo in range(0, N, 2*width):
+            mid = min(lo+width, N)
+            hi = min(lo+2*width, N)
+            if mid == hi or not src[mid] < src[mid-1]:
+                # a lone run, or two runs already in order
+                copy(src, lo, hi, dst, lo)
+            else:
+                merge(src, lo, mid, src, mid, hi, dst, lo)
+        src, dst = dst, src
+        width *= 2
+    if src is not a:
+        a[:] = src
 
 
 
@@ -38,12 +54,61 @@ def merge_sort(xs):
 
 import unittest
 import sorting_unittests
+from sorting_unittests import FirstItemKey
 
 class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
     def sort_algo(self):
         return merge_sort
-        
-        
+
+class UnitTestsMergeSort(unittest.TestCase):
+
+    def test_stable(self):
+        random.seed(0)
+        for N in (0, 1, 31, 32, 33, 64, 65, 100, 1000, 5000):
+            for high in (3, 1000):
+                xs = [(random.randint(0, high), i) for i in range(0, N)]
+                self.assertSequenceEqual([k.x for k in merge_sort([FirstItemKey(x) for x in xs])],
+                                         sorted(xs, key=lambda x: x[0]))
+
+    def test_galloping(self):
+        random.seed(0)
+        for _ in range(0, 50):
+            # long stretches of each run go before the other run's next value
+            xs = sorted(random.sample(range(0, 100000), 3000))
+            ys = sorted(random.sample(range(0, 100000), 300))
+            for zs in (xs+ys, ys+xs, xs[::-1]+ys, [x//10 for x in xs]+[y//10 for y in ys]):
+                self.assertSequenceEqual(merge_sort(zs), sorted(zs))
+
+    def test_gallop(self):
+        xs = [1, 2, 2, 2, 3, 5, 8, 8, 9]
+        for v in range(0, 11):
+            for lo in range(0, len(xs)+1):
+                self.assertEqual(gallop(xs, v, lo, len(xs), True), bisect.bisect_right(xs, v, lo))
+                self.assertEqual(gallop(xs, v, lo, len(xs), False), bisect.bisect_left(xs, v, lo))
+
+    def test_copy(self):
+        xs = range(0, 10)
+        ys = [None]*5
+        copy(xs, 2, 6, ys, 1)
+        self.assertSequenceEqual(ys, [None, 2, 3, 4, 5])
+        # into the same list, towards the front
+        copy(xs, 4, 10, xs, 1)
+        self.assertSequenceEqual(xs, [0, 4, 5, 6, 7, 8, 9, 7, 8, 9])
+        copy(xs, 3, 3, ys, 0)
+        self.assertSequenceEqual(ys, [None, 2, 3, 4, 5])
+
+    def test_input_is_not_modified(self):
+        xs = [3, 1, 2]*50
+        merge_sort(xs)
+        self.assertSequenceEqual(xs, [3, 1, 2]*50)
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return merge_sort
+
+class UnitTestsNumeric(sorting_unittests.AbstractNumericUnitTestCases):
+    def sort_algo(self):
+        return merge_sort
 
 
 if __name__ == '__main__' :
@@ -0,0 +1,158 @@
+'''
+Building blocks shared by the merge-based sorts (merge-sort.py, tim-sort.py,
+parallel-merge-sort.py and external-sort.py)
+'''
+import bisect
+import heapq
+
+
+# a side that wins this many comparisons in a row switches a merge to galloping
+MIN_GALLOP = 7
+
+
+def binary_insertion_sort(xs, lo, hi, start=None):
+    '''
+    Sorts xs[lo:hi] in place, and stably, by binary insertion. xs[lo:start] must
+    already be sorted (by default start is lo+1, i.e. nothing is assumed).
+    '''
+    for i in range(lo+1 if start is None else max(start, lo+1), hi):
+        v = xs[i]
+        if v < xs[i-1]:
+            j = bisect.bisect_right(xs, v, lo, i)
+            xs[j+1:i+1] = xs[j:i]
+            xs[j] = v
+
+
+def copy(src, i, i_hi, dst, k):
+    '''
+    Copies src[i:i_hi] to dst, from index k on, one value at a time: a slice
+    assignment would first copy the values to a temporary list. dst may be src itself
+    as long as k <= i.
+    '''
+    for i in xrange(i, i_hi):
+        dst[k] = src[i]
+        k += 1
+
+
+def gallop(xs, v, lo, hi, after_equals):
+    '''
+    Returns the index in the sorted xs[lo:hi] where v would be inserted (after the
+    values equal to it if after_equals, before them otherwise). Probes lo, lo+1,
+    lo+3, lo+7, ... before a binary search, so the cost is O(log k) where k is the
+    distance from lo to the answer, rather than O(log (hi-lo)).
+    '''
+    bisect_ = bisect.bisect_right if after_equals else bisect.bisect_left
+    step = 1
+    prev = lo
+    probe = lo
+    while probe < hi and (not v < xs[probe] if after_equals else xs[probe] < v):
+        prev = probe+1
+        probe = lo + 2*step - 1
+        step *= 2
+    return bisect_(xs, v, prev, min(probe, hi))
+
+
+def merge(left, i, i_hi, right, j, j_hi, dst, k):
+    '''
+    Stably merges the sorted left[i:i_hi] and right[j:j_hi] into dst, from index k
+    on. dst may be right itself, as long as the merged values do not overwrite
+    values of right that have not been merged yet (i.e. k+(i_hi-i) <= j).
+
+    When one side keeps winning, the merge gallops: it looks for the end of the block
+    of values that side contributes next and copies the block at once. Nothing is
+    allocated: blocks are copied with copy rather than through slices.
+    '''
+    wins_left = wins_right = 0
+    while i < i_hi and j < j_hi:
+        if right[j] < left[i]:
+            dst[k] = right[j]
+            j += 1
+            k += 1
+            wins_left, wins_right = 0, wins_right+1
+            if wins_right >= MIN_GALLOP:
+                # the values of the right run that are smaller than left[i]
+                e = gallop(right, left[i], j, j_hi, False)
+                copy(right, j, e, dst, k)
+                k += e-j
+                j = e
+                wins_right = 0
+        else:
+            # on a tie the left run goes first, which keeps the merge stable
+            dst[k] = left[i]
+            i += 1
+            k += 1
+            wins_left, wins_right = wins_left+1, 0
+            if wins_left >= MIN_GALLOP:
+                # the values of the left run that are not greater than right[j]
+                e = gallop(left, right[j], i, i_hi, True)
+                copy(left, i, e, dst, k)
+                k += e-i
+                i = e
+                wins_left = 0
+    if i < i_hi:
+        copy(left, i, i_hi, dst, k)
+    elif not (dst is right and k == j):
+        copy(right, j, j_hi, dst, k)
+
+
+class _RunHead(object):
+    '''
+    The next value of one of the sorted runs being merged by kway_merge. Heads compare
+    by value, with < only, and then by run.
+    '''
+
+    __slots__ = ('v', 'run', 'rest')
+
+    def __init__(self, v, run, rest):
+        self.v = v
+        self.run = run
+        self.rest = rest
+
+    def __lt__(self, other):
+        if self.v < other.v:
+            return True
+        if other.v < self.v:
+            return False
+        return self.run < other.run
+
+
+class _ReversedRunHead(_RunHead):
+    '''
+    A _RunHead of runs sorted from the largest value to the smallest
+    '''
+
+    __slots__ = ()
+
+    def __lt__(self, other):
+        if other.v < self.v:
+            return True
+        if self.v < other.v:
+            return False
+        return self.run < other.run
+
+
+def kway_merge(runs, reverse=False):
+    '''
+    Stably merges the sorted iterables runs (sorted from the largest value to the
+    smallest if reverse), with a heap of their next values, and yields the merged
+    values; equal values come out in the order of their runs.
+    Unlike heapq.merge, this compares values with < only: heapq.merge falls back on
+    == to break ties, which may not agree with <.
+    '''
+    head_type = _ReversedRunHead if reverse else _RunHead
+    heap = []
+    for run, values in enumerate(runs):
+        rest = iter(values)
+        for v in rest:
+            heap.append(head_type(v, run, rest))
+            break
+    heapq.heapify(heap)
+    while heap:
+        head = heap[0]
+        yield head.v
+        for v in head.rest:
+            head.v = v
+            heapq.heapreplace(heap, head)
+            break
+        else:
+            heapq.heappop(heap)
@@ -0,0 +1,268 @@
+'''
+Typed fast path of the sorting algorithms for arrays of numbers: array.array, NumPy
+arrays and any other object exporting ints or floats through the buffer protocol
+(e.g. bytearray). Such arrays are sorted as a whole, without a Python object per
+value, by NumPy if it is installed. Anything else (e.g. a list) is left to the
+algorithms themselves.
+
+Without NumPy, there is no unboxed path: sort, argsort and take fall back on the
+built-in sort and on list comprehensions, which make a Python object of every value.
+That still saves the comparison loops of the algorithms, which are written in Python,
+but the typed fast path proper needs NumPy.
+'''
+import array
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# the array.array typecodes of ints and floats ('c' and 'u' hold characters)
+TYPECODES = 'bBhHiIlLfd'
+
+
+def typecode(xs):
+    '''
+    Returns the array.array typecode of the values of xs if xs is a one-dimensional
+    array of numbers (see above), or None if it is anything else
+
+    >>> typecode(array.array('d', [1.5])), typecode(bytearray(b'ab')), typecode([1, 2])
+    ('d', 'B', None)
+    '''
+    if isinstance(xs, array.array):
+        return xs.typecode if xs.typecode in TYPECODES else None
+    if numpy is not None and isinstance(xs, numpy.ndarray):
+        return xs.dtype.char if xs.ndim == 1 and xs.dtype.char in TYPECODES else None
+    if isinstance(xs, basestring):
+        return None
+    try:
+        view = memoryview(xs)
+    except TypeError:
+        return None
+    fmt = view.format.lstrip('@')
+    return fmt if view.ndim == 1 and fmt in TYPECODES else None
+
+
+def _as_array(xs, tc):
+    '''
+    Returns the values of the array of numbers xs as an array.array
+    '''
+    return xs if isinstance(xs, array.array) else array.array(tc, memoryview(xs).tobytes())
+
+
+def _as_ndarray(xs, tc):
+    '''
+    Returns the values of the array of numbers xs as a NumPy array, which shares
+    their memory where it can
+    '''
+    if isinstance(xs, numpy.ndarray):
+        return xs
+    if isinstance(xs, memoryview):
+        # frombuffer only takes objects with the old buffer interface in Python 2
+        return numpy.asarray(xs, dtype=tc)
+    return numpy.frombuffer(xs, dtype=tc) if len(xs) else numpy.empty(0, dtype=tc)
+
+
+def _from_ndarray(a, tc):
+    return array.array(tc, a.astype(tc).tobytes())
+
+
+def tolist(xs):
+    '''
+    Returns the values of the array of numbers xs as a list of Python numbers (which
+    iterating a memoryview does not yield in Python 2)
+
+    >>> tolist(memoryview(b'ab'))
+    [97, 98]
+    '''
+    if numpy is not None and isinstance(xs, numpy.ndarray):
+        return xs.tolist()
+    return _as_array(xs, typecode(xs)).tolist()
+
+
+def like(xs, values):
+    '''
+    Returns the numbers values as the same kind of array as the array of numbers xs:
+    a NumPy array or a bytearray if xs is one, an array.array otherwise
+
+    >>> like(bytearray(b'ab'), [99, 97])
+    bytearray(b'ca')
+    '''
+    if numpy is not None and isinstance(xs, numpy.ndarray):
+        return numpy.asarray(values, dtype=xs.dtype)
+    if isinstance(xs, bytearray):
+        return bytearray(values)
+    return array.array(typecode(xs), values)
+
+
+def sort(xs):
+    '''
+    Returns a sorted copy of the array of numbers xs: a NumPy array or a bytearray if
+    xs is one, an array.array otherwise. With NumPy, the values are sorted without being boxed, by
+    its stable sort (a radix sort for 8 and 16-bit ints, Timsort or a merge sort for
+    the others); without it, by the built-in sort, which boxes every value.
+
+    >>> sort(array.array('i', [3, -1, 2]))
+    array('i', [-1, 2, 3])
+    '''
+    tc = typecode(xs)
+    if tc is None:
+        raise TypeError('not an array of numbers')
+    if numpy is None:
+        rv = array.array(tc, sorted(_as_array(xs, tc)))
+    else:
+        rv = numpy.sort(_as_ndarray(xs, tc), kind='stable')
+        if isinstance(xs, numpy.ndarray):
+            return rv
+        rv = _from_ndarray(rv, tc)
+    return bytearray(rv) if isinstance(xs, bytearray) else rv
+
+
+def argsort(xs):
+    '''
+    Returns the indices that sort the array of numbers xs, stably: a NumPy array of
+    them if xs is one, an array.array('l') otherwise. They can reorder any column of
+    the same length as xs, with take. Without NumPy, the indices are sorted by the
+    built-in sort, which boxes every value.
+
+    >>> argsort(array.array('d', [0.5, -2.0, 0.5, 0.25]))
+    array('l', [1, 3, 0, 2])
+    '''
+    tc = typecode(xs)
+    if tc is None:
+        raise TypeError('not an array of numbers')
+    if numpy is None:
+        a = _as_array(xs, tc)
+        return array.array('l', sorted(range(0, len(a)), key=a.__getitem__))
+    rv = numpy.argsort(_as_ndarray(xs, tc), kind='stable')
+    return rv if isinstance(xs, numpy.ndarray) else _from_ndarray(rv, 'l')
+
+
+def take(column, indices):
+    '''
+    Returns the values of column at indices (e.g. as returned by argsort), in that
+    order, as the same kind of sequence as column: a NumPy array, an array.array or
+    a list. indices may be any sequence of ints. Unless column is an array of
+    numbers and NumPy is installed, every value is boxed.
+
+    >>> take(['a', 'b', 'c'], argsort(array.array('i', [2, 3, 1])))
+    ['c', 'a', 'b']
+    '''
+    if numpy is not None and isinstance(column, numpy.ndarray):
+        return column[numpy.asarray(indices, dtype=numpy.intp)]
+    tc = typecode(column)
+    if numpy is not None and tc is not None:
+        return _from_ndarray(_as_ndarray(column, tc)[numpy.asarray(indices, dtype=numpy.intp)], tc)
+    if isinstance(column, array.array):
+        return array.array(column.typecode, [column[i] for i in indices])
+    return [column[i] for i in indices]
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+
+class UnitTests(unittest.TestCase):
+    '''
+    Runs with NumPy if it is installed; see UnitTestsWithoutNumPy
+    '''
+
+    def random_array(self, tc, N):
+        if tc in 'fd':
+            return array.array(tc, [random.uniform(-100, 100) for _ in range(0, N)])
+        signed = tc in 'bhil'
+        bits = 8*array.array(tc).itemsize - (1 if signed else 0)
+        return array.array(tc, [random.randint(-2**bits if signed else 0, 2**bits-1) for _ in range(0, N)])
+
+    def test_typecode(self):
+        for tc in TYPECODES:
+            self.assertEqual(typecode(array.array(tc)), tc)
+        self.assertEqual(typecode(bytearray(b'xyz')), 'B')
+        self.assertEqual(typecode(array.array('c', b'xyz')), None)
+        for xs in ([1, 2], (1, 2), b'xyz', u'xyz', None, 42):
+            self.assertEqual(typecode(xs), None)
+
+    def test_sort(self):
+        random.seed(0)
+        for tc in TYPECODES:
+            for N in (0, 1, 2, 1000):
+                xs = self.random_array(tc, N)
+                before = xs[:]
+                rv = sort(xs)
+                self.assertIsInstance(rv, array.array)
+                self.assertEqual(rv.typecode, tc)
+                self.assertSequenceEqual(rv, sorted(xs))
+                self.assertSequenceEqual(xs, before)
+        self.assertEqual(sort(bytearray(b'cab')), bytearray(b'abc'))
+        self.assertEqual(sort(memoryview(b'cab')), array.array('B', b'abc'))
+        self.assertRaises(TypeError, sort, [3, 1, 2])
+
+    def test_like(self):
+        self.assertEqual(tolist(array.array('d', [0.5])), [0.5])
+        self.assertEqual(tolist(bytearray(b'ab')), [97, 98])
+        self.assertEqual(like(array.array('h', [1]), [3, 2]), array.array('h', [3, 2]))
+        self.assertEqual(like(bytearray(b'x'), [98, 97]), bytearray(b'ba'))
+        self.assertEqual(like(memoryview(b'x'), [98]), array.array('B', [98]))
+
+    def test_argsort_and_take(self):
+        random.seed(0)
+        for tc in 'bd':
+            for N in (0, 1, 1000):
+                xs = array.array(tc, [random.randint(0, 5) for _ in range(0, N)])
+                names = ['{}'.format(i) for i in range(0, N)]
+                ids = array.array('l', range(0, N))
+                indices = argsort(xs)
+                self.assertSequenceEqual(indices, sorted(range(0, N), key=xs.__getitem__))
+                self.assertSequenceEqual(take(xs, indices), sorted(xs))
+                self.assertSequenceEqual(take(names, indices), [names[i] for i in indices])
+                self.assertEqual(take(ids, indices), array.array('l', indices))
+                self.assertEqual(take(ids, list(indices)), array.array('l', indices))
+                self.assertSequenceEqual(take(names, list(indices)), [names[i] for i in indices])
+        self.assertRaises(TypeError, argsort, ['b', 'a'])
+
+class UnitTestsWithoutNumPy(UnitTests):
+    '''
+    The same tests, on the fallback that does without NumPy
+    '''
+
+    def setUp(self):
+        global numpy
+        self.numpy, numpy = numpy, None
+
+    def tearDown(self):
+        global numpy
+        numpy = self.numpy
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class UnitTestsNumPy(unittest.TestCase):
+
+    def test_numpy_arrays(self):
+        random.seed(0)
+        for dtype in ('int8', 'int16', 'int64', 'uint32', 'float32', 'float64'):
+            xs = numpy.array([random.randint(0, 100) for _ in range(0, 1000)], dtype=dtype)
+            rv = sort(xs)
+            self.assertIsInstance(rv, numpy.ndarray)
+            self.assertEqual(rv.dtype, xs.dtype)
+            self.assertSequenceEqual(list(rv), sorted(xs))
+            indices = argsort(xs)
+            self.assertSequenceEqual(list(indices), sorted(range(0, len(xs)), key=xs.__getitem__))
+            self.assertSequenceEqual(list(take(numpy.arange(len(xs)), indices)), list(indices))
+            self.assertSequenceEqual(list(take(xs, list(indices))), sorted(xs))
+            self.assertSequenceEqual(list(take(xs, [])), [])
+            self.assertEqual(like(xs, [3, 1]).dtype, xs.dtype)
+        self.assertEqual(typecode(numpy.zeros((2, 2))), None)
+        self.assertEqual(typecode(numpy.array(['a', 'b'])), None)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
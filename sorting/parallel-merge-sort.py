@@ -0,0 +1,265 @@
+import array
+import bisect
+import ctypes
+import functools
+import multiprocessing
+import random
+
+from sort_options import sort_with_options
+
+
+# values sampled from every sorted chunk to choose the splitters of the buckets
+_SAMPLES = 32
+
+# the shared arrays, set in every worker process by _init_worker
+_shared = None
+
+
+def _typecode(xs):
+    '''
+    Returns the typecode of the shared array that can hold the values of xs
+    unboxed ('l' for ints, which are C longs, 'd' for floats), or None if the
+    values are not all of the same such type
+    '''
+    types = set(map(type, xs))
+    if types == {int}:
+        return 'l'
+    if types == {float}:
+        return 'd'
+    return None
+
+
+def _shared_array(typecode, xs):
+    '''
+    Returns a shared array of the values of xs, which are copied through an
+    array.array rather than one at a time
+    '''
+    a = array.array(typecode, xs)
+    rv = multiprocessing.RawArray(typecode, len(a))
+    ctypes.memmove(rv, a.buffer_info()[0], len(a)*a.itemsize)
+    return rv
+
+
+def _init_worker(*shared):
+    global _shared
+    _shared = shared
+
+
+def _sort_values(bounds):
+    '''
+    Sorts the chunk keys[lo:hi] of the shared array in place
+    '''
+    keys, _ = _shared
+    lo, hi = bounds
+    keys[lo:hi] = sorted(keys[lo:hi])
+
+
+def _merge_values(args):
+    '''
+    Merges the sorted pieces keys[lo:hi] of a bucket, in the order of their chunks,
+    into out[start:]
+    '''
+    keys, out = _shared
+    pieces, start = args
+    merged = []
+    for lo, hi in pieces:
+        merged.extend(keys[lo:hi])
+    # the built-in sort merges the sorted runs it finds, stably
+    merged.sort()
+    out[start:start+len(merged)] = merged
+
+
+def _sort_keys(bounds):
+    '''
+    Stably sorts the chunk keys[lo:hi] of the shared array in place, and writes its
+    sorted order (indices into the input) to order[lo:hi]
+    '''
+    keys, order, _ = _shared
+    lo, hi = bounds
+    chunk = keys[lo:hi]
+    indices = sorted(range(0, hi-lo), key=chunk.__getitem__)
+    keys[lo:hi] = [chunk[i] for i in indices]
+    order[lo:hi] = [lo+i for i in indices]
+
+
+def _merge_keys(args):
+    '''
+    Merges the sorted pieces keys[lo:hi] of a bucket, in the order of their chunks,
+    and writes the order of the merged pieces (indices into the input) to out[start:]
+    '''
+    keys, order, out = _shared
+    pieces, start = args
+    merged = []
+    indices = []
+    for lo, hi in pieces:
+        merged.extend(keys[lo:hi])
+        indices.extend(order[lo:hi])
+    positions = sorted(range(0, len(merged)), key=merged.__getitem__)
+    out[start:start+len(merged)] = [indices[i] for i in positions]
+
+
+def parallel_merge_sort(xs, processes=None, min_parallel=100000, key=None, reverse=False, inplace=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse and inplace. The sort is stable. It
+    is a sample sort (parallel sorting by regular sampling) carried out by a pool of
+    worker processes (by default, one per CPU), on keys held unboxed in shared arrays:
+    * the input is split into one chunk per worker, and the workers sort the chunks
+      with the built-in sort
+    * values sampled from the sorted chunks give the splitters of one bucket of keys
+      per worker, and every sorted chunk is cut into one piece per bucket by bisection
+    * each worker merges the pieces of its bucket, in the order of the chunks, into
+      its own contiguous slice of the output
+    so the only serial work left to this process is to copy the keys in and the
+    result out. Inputs shorter than min_parallel are not worth the start-up cost of
+    the processes and are sorted in this process.
+
+    Only ints and floats can be shared with the workers without being pickled: the
+    values themselves, if they are all ints or all floats, or else their keys (the
+    result of key, which is then called once per value). The workers sort the values
+    in the first case, and their order in the second, so that the copy returned holds
+    the very objects of xs. Values whose keys are not all ints or all floats (e.g.
+    strings or tuples) are NOT sorted in parallel: they are sorted in this process by
+    the built-in sort.
+
+    Equal keys all go to the same bucket, so a bucket can take a worker much longer
+    than the others if most of the keys are equal.
+    '''
+    sort_inplace = functools.partial(_parallel_merge_sort, processes=processes, min_parallel=min_parallel)
+    return sort_with_options(xs, sort_inplace, key, reverse, inplace, takes_key=True)
+
+
+def _buckets(keys, bounds):
+    '''
+    Returns, for each bucket, the pieces (lo, hi) of the sorted chunks (at bounds in
+    the shared array keys) that belong to it, and the index of its first key in the
+    output
+    '''
+    samples = sorted(keys[lo + j*(hi-lo)//_SAMPLES] for lo, hi in bounds for j in range(0, _SAMPLES))
+    splitters = [samples[b*len(samples)//len(bounds)] for b in range(1, len(bounds))]
+    # equal keys all fall in the same bucket, that of the first splitter not below them
+    cuts = [[lo] + [bisect.bisect_right(keys, s, lo, hi) for s in splitters] + [hi] for lo, hi in bounds]
+    rv = []
+    start = 0
+    for b in range(0, len(bounds)):
+        pieces = [(cut[b], cut[b+1]) for cut in cuts if cut[b] < cut[b+1]]
+        rv.append((pieces, start))
+        start += sum(hi-lo for lo, hi in pieces)
+    return rv
+
+
+def _parallel_merge_sort(xs, key, processes, min_parallel):
+    N = len(xs)
+    processes = multiprocessing.cpu_count() if processes is None else processes
+    if N < min_parallel or processes < 2 or N < 2:
+        xs.sort(key=key)
+        return
+    keys = xs if key is None else [key(x) for x in xs]
+    typecode = _typecode(keys)
+    if typecode is None:
+        # key has been called already, and must not be called again
+        indices = sorted(range(0, N), key=keys.__getitem__)
+        xs[:] = [xs[i] for i in indices]
+        return
+    bounds = [(i*N//processes, (i+1)*N//processes) for i in range(0, processes)]
+    bounds = [(lo, hi) for lo, hi in bounds if lo < hi]
+    shared = _shared_array(typecode, keys)
+    if key is None:
+        out = multiprocessing.RawArray(typecode, N)
+        pool = multiprocessing.Pool(len(bounds), _init_worker, (shared, out))
+        try:
+            pool.map(_sort_values, bounds)
+            pool.map(_merge_values, _buckets(shared, bounds))
+        finally:
+            pool.close()
+            pool.join()
+        xs[:] = out[:]
+    else:
+        order = multiprocessing.RawArray('l', N)
+        out = multiprocessing.RawArray('l', N)
+        pool = multiprocessing.Pool(len(bounds), _init_worker, (shared, order, out))
+        try:
+            pool.map(_sort_keys, bounds)
+            pool.map(_merge_keys, _buckets(shared, bounds))
+        finally:
+            pool.close()
+            pool.join()
+        xs[:] = [xs[i] for i in out]
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+from sorting_unittests import FirstItemKey
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        # make even the shortest inputs go through the worker processes
+        return functools.partial(parallel_merge_sort, processes=2, min_parallel=0)
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return functools.partial(parallel_merge_sort, processes=2, min_parallel=0)
+
+class UnitTestsParallelMergeSort(unittest.TestCase):
+
+    def test_typecode(self):
+        self.assertEqual(_typecode([1, -2, 3]), 'l')
+        self.assertEqual(_typecode([1.5, -2.0]), 'd')
+        self.assertEqual(_typecode([1, 2.0]), None)
+        self.assertEqual(_typecode([2**64]), None)
+        self.assertEqual(_typecode([True, False]), None)
+        self.assertEqual(_typecode(['a']), None)
+
+    def test_numbers(self):
+        random.seed(0)
+        for values in ([random.randint(-10**12, 10**12) for _ in range(0, 5000)],
+                       [random.uniform(-1, 1) for _ in range(0, 5000)]):
+            rv = parallel_merge_sort(values, processes=4, min_parallel=0)
+            self.assertSequenceEqual(rv, sorted(values))
+            self.assertTrue(all(type(x) is type(values[0]) for x in rv))
+
+    def test_objects_are_returned_stably_and_as_is(self):
+        random.seed(0)
+        xs = [FirstItemKey((random.randint(0, 5), i)) for i in range(0, 1000)]
+        # sorted in this process, and in the workers by their int or float keys
+        for rv in (parallel_merge_sort(xs, processes=3, min_parallel=0),
+                   parallel_merge_sort(xs, processes=3, min_parallel=0, key=lambda k: k.x[0]),
+                   parallel_merge_sort(xs, processes=3, min_parallel=0, key=lambda k: float(k.x[0]))):
+            self.assertSequenceEqual([k.x for k in rv], sorted((k.x for k in xs), key=lambda x: x[0]))
+            self.assertTrue(all(any(r is x for x in xs) for r in rv[:10]))
+        rv = parallel_merge_sort(xs, processes=4, min_parallel=0, key=lambda k: k.x[0], reverse=True)
+        self.assertSequenceEqual([k.x for k in rv], sorted((k.x for k in xs), key=lambda x: x[0], reverse=True))
+
+    def test_buckets(self):
+        random.seed(0)
+        bounds = [(0, 3000), (3000, 6000), (6000, 9000)]
+        for values in ([3]*4500 + [1]*4500, range(0, 9000), [random.randint(0, 10**6) for _ in range(0, 9000)]):
+            keys = [k for lo, hi in bounds for k in sorted(values[lo:hi])]
+            buckets = _buckets(keys, bounds)
+            out = []
+            for b, (pieces, start) in enumerate(buckets):
+                self.assertEqual(start, len(out))
+                bucket = sorted(k for lo, hi in pieces for k in keys[lo:hi])
+                # every key of a bucket is below every key of the next one
+                self.assertTrue(not out or not bucket or out[-1] < bucket[0])
+                out.extend(bucket)
+            self.assertSequenceEqual(out, sorted(values))
+        # random keys are split evenly
+        self.assertTrue(all(2500 < sum(hi-lo for lo, hi in pieces) < 3500 for pieces, _ in _buckets(keys, bounds)))
+
+    def test_more_processes_than_values(self):
+        self.assertSequenceEqual(parallel_merge_sort([3, 1], processes=8, min_parallel=0), [1, 3])
+        self.assertSequenceEqual(parallel_merge_sort(['b', 'a', 'c'], processes=8, min_parallel=0), ['a', 'b', 'c'])
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
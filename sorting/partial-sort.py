@@ -0,0 +1,285 @@
+import heapq
+import random
+
+from merging import binary_insertion_sort
+from partitioning import partition, pivot
+from sort_options import Keyed
+
+
+# ranges this short are finished by binary insertion rather than partitioned
+SMALL = 16
+
+
+class _Ascending(object):
+    '''
+    A value with its key and its index in the input, in a heap; ordered by key, then
+    by index, so that equal values keep their order
+    '''
+
+    __slots__ = ('k', 'i', 'v')
+
+    def __init__(self, k, i, v):
+        self.k = k
+        self.i = i
+        self.v = v
+
+    def __lt__(self, other):
+        return self.k < other.k or (not other.k < self.k and self.i < other.i)
+
+
+class _Descending(_Ascending):
+    '''
+    An _Ascending ordered by key from the largest to the smallest, then by index
+    '''
+
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return other.k < self.k or (not self.k < other.k and self.i < other.i)
+
+
+def _bounded_heap(n, xs, key, entry_type, precedes):
+    '''
+    Returns the n first values of xs in the reverse order of entry_type, by a single
+    pass over xs with a heap of the n first values seen so far whose top is the last
+    of them. The index of every value is negated in its entry, which inverts the
+    order of equal values, so that the top is the value to be replaced first. A value
+    replaces it if precedes(key of the value, key of the top); a later value never
+    displaces an equal one. key is called once per value, and no entry is made for a
+    value that does not enter the heap.
+    '''
+    if n <= 0:
+        return []
+    heap = []
+    for i, x in enumerate(xs):
+        k = x if key is None else key(x)
+        if len(heap) < n:
+            heapq.heappush(heap, entry_type(k, -i, x))
+        elif precedes(k, heap[0].k):
+            heapq.heapreplace(heap, entry_type(k, -i, x))
+    return [e.v for e in sorted(heap, reverse=True)]
+
+
+def nsmallest(n, xs, key=None):
+    '''
+    Returns the n smallest values of the iterable xs, or of their keys if key is
+    given (it is called once per value), from the smallest; equal values are
+    returned in their order in xs. This takes O(len(xs) log n) time and O(n) space:
+    a bounded heap of the n smallest values seen so far, the largest on top, is
+    updated as xs is read.
+
+    >>> nsmallest(3, [5, 1, 4, 1, 5, 9, 2, 6])
+    [1, 1, 2]
+    '''
+    return _bounded_heap(n, xs, key, _Descending, lambda k, top: k < top)
+
+
+def nlargest(n, xs, key=None):
+    '''
+    Returns the n largest values of the iterable xs, or of their keys if key is
+    given, from the largest; equal values are returned in their order in xs. See
+    nsmallest.
+
+    >>> nlargest(2, ['bb', 'a', 'cc', 'ddd'], key=len)
+    ['ddd', 'bb']
+    '''
+    return _bounded_heap(n, xs, key, _Ascending, lambda k, top: top < k)
+
+
+def _median_of_medians(xs, lo, hi):
+    '''
+    Returns a pivot for xs[lo:hi] with at least 3/10 of the values on either side:
+    the median of the medians of groups of 5 values (Blum, Floyd, Pratt, Rivest and
+    Tarjan), found by a selection over a list of n/5 medians
+    '''
+    medians = []
+    for i in range(lo, hi, 5):
+        group = xs[i:min(i+5, hi)]
+        binary_insertion_sort(group, 0, len(group))
+        medians.append(group[(len(group)-1)//2])
+    m = (len(medians)-1)//2
+    _select(medians, 0, len(medians), m)
+    return medians[m]
+
+
+def _select(xs, lo, hi, n, median_of_medians=False):
+    '''
+    Rearranges xs[lo:hi] so that xs[n] is the value that would be there if xs[lo:hi]
+    were sorted, by introselect (D. Musser): quickselect with median-of-three or
+    ninther pivots (see partitioning.pivot), which switches for good to
+    median-of-medians pivots, and hence to a guaranteed O(n) worst case, if two
+    partitions in a row do not halve the range. Starts with median-of-medians pivots
+    if median_of_medians.
+    '''
+    passes = 0
+    size = hi - lo
+    while hi - lo > SMALL:
+        p = _median_of_medians(xs, lo, hi) if median_of_medians else pivot(xs, lo, hi)
+        lt, gt = partition(xs, lo, hi, p)
+        if n < lt:
+            hi = lt
+        elif n >= gt:
+            lo = gt
+        else:
+            return
+        passes += 1
+        if not median_of_medians and passes % 2 == 0:
+            median_of_medians = hi - lo > size // 2
+            size = hi - lo
+    binary_insertion_sort(xs, lo, hi)
+
+
+def nth_element(xs, n, key=None):
+    '''
+    Rearranges the list xs in place, in O(len(xs)) time, so that xs[n] is the value
+    that would be there if xs were sorted (by key if given, which is called once per
+    value), no value before it is greater and no value after it is smaller; returns
+    None. Negative n count from the end, as for indexing. The rearrangement is not
+    stable. See _select for the algorithm.
+
+    >>> xs = [5, 1, 4, 1, 5, 9, 2, 6]
+    >>> nth_element(xs, 4)
+    >>> xs[4], sorted(xs[:4]), sorted(xs[5:])
+    (5, [1, 1, 2, 4], [5, 6, 9])
+    '''
+    N = len(xs)
+    if not -N <= n < N:
+        raise IndexError('nth_element index out of range')
+    n %= N
+    if key is None:
+        _select(xs, 0, N, n)
+        return
+    work = [Keyed(key(x), x) for x in xs]
+    _select(work, 0, N, n)
+    for i, decorated in enumerate(work):
+        xs[i] = decorated.v
+
+
+def incremental_sort(xs, key=None, reverse=False):
+    '''
+    Yields the values of the iterable xs in sorted order (by key if given, which is
+    called once per value, and from the largest if reverse), and stably, doing only
+    as much work as has been consumed: the values are put in a heap in O(n) time,
+    then each value yielded is popped from it in O(log n) time, so the first k
+    values take O(n + k log n) time rather than O(n log n).
+
+    >>> sorted_values = incremental_sort([5, 1, 4, 1, 5, 9, 2, 6])
+    >>> next(sorted_values), next(sorted_values), next(sorted_values)
+    (1, 1, 2)
+    '''
+    entry_type = _Descending if reverse else _Ascending
+    heap = [entry_type(x if key is None else key(x), i, x) for i, x in enumerate(xs)]
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap).v
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+from sorting_unittests import Counted
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return lambda xs: list(incremental_sort(xs))
+
+class UnitTestsNSmallest(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return lambda xs: nsmallest(len(xs), xs)
+
+class UnitTestsPartialSort(unittest.TestCase):
+
+    def pairs(self, N):
+        return [(random.randint(0, 20), i) for i in range(0, N)]
+
+    def test_nsmallest_and_nlargest(self):
+        random.seed(0)
+        first = lambda x: x[0]
+        for N in (0, 1, 5, 100, 1000):
+            xs = self.pairs(N)
+            for n in (-1, 0, 1, 2, 10, N, N+1):
+                self.assertSequenceEqual(nsmallest(n, xs, key=first), sorted(xs, key=first)[:max(n, 0)])
+                self.assertSequenceEqual(nlargest(n, xs, key=first), sorted(xs, key=first, reverse=True)[:max(n, 0)])
+                self.assertSequenceEqual(nsmallest(n, iter(xs)), heapq.nsmallest(n, xs))
+                self.assertSequenceEqual(nlargest(n, xs), heapq.nlargest(n, xs))
+
+    def test_key_is_called_once_per_value(self):
+        calls = []
+        def key(x):
+            calls.append(x)
+            return -x
+        xs = range(0, 100)
+        self.assertSequenceEqual(nsmallest(3, xs, key=key), [99, 98, 97])
+        self.assertSequenceEqual(list(incremental_sort(xs, key=key))[:3], [99, 98, 97])
+        ys = xs[:]
+        nth_element(ys, 0, key=key)
+        self.assertEqual(ys[0], 99)
+        self.assertEqual(len(calls), 300)
+
+    def check_nth_element(self, xs, n):
+        ys = xs[:]
+        nth_element(ys, n)
+        expected = sorted(xs)
+        self.assertEqual(ys[n], expected[n])
+        self.assertTrue(all(not ys[n] < y for y in ys[:n]))
+        self.assertTrue(all(not y < ys[n] for y in ys[n+1:]))
+        self.assertSequenceEqual(sorted(ys), expected)
+
+    def test_nth_element(self):
+        random.seed(0)
+        for N in (1, 2, 3, 16, 17, 100, 1000):
+            inputs = [[random.randint(0, N) for _ in range(0, N)],
+                      [random.randint(0, 3) for _ in range(0, N)],
+                      range(0, N), range(N, 0, -1), [7]*N,
+                      range(0, N, 2) + range(N-1 - (N-1) % 2, 0, -2)]
+            for xs in inputs:
+                for n in set([0, len(xs)//4, len(xs)//2, len(xs)-1]):
+                    self.check_nth_element(xs, n)
+        xs = [3, 1, 2]
+        nth_element(xs, -1)
+        self.assertEqual(xs[2], 3)
+        self.assertRaises(IndexError, nth_element, [1, 2], 2)
+        self.assertRaises(IndexError, nth_element, [], 0)
+
+    def test_linear_with_median_of_medians(self):
+        random.seed(0)
+        N = 10000
+        for median_of_medians in (False, True):
+            for values in (range(0, N), range(N, 0, -1), [random.randint(0, N) for _ in range(0, N)], [1]*N):
+                xs = [Counted(v) for v in values]
+                Counted.comparisons = 0
+                _select(xs, 0, N, N//2, median_of_medians)
+                self.assertEqual(xs[N//2].v, sorted(values)[N//2])
+                self.assertTrue(Counted.comparisons < 30*N)
+
+    def test_incremental_sort(self):
+        random.seed(0)
+        first = lambda x: x[0]
+        for N in (0, 1, 2, 100, 1000):
+            xs = self.pairs(N)
+            self.assertSequenceEqual(list(incremental_sort(xs, key=first)), sorted(xs, key=first))
+            self.assertSequenceEqual(list(incremental_sort(xs, key=first, reverse=True)), sorted(xs, key=first, reverse=True))
+
+    def test_incremental_sort_is_lazy(self):
+        random.seed(0)
+        N = 10000
+        values = [Counted(random.random()) for _ in range(0, N)]
+        Counted.comparisons = 0
+        sorted_values = incremental_sort(values)
+        first = [next(sorted_values) for _ in range(0, 10)]
+        self.assertSequenceEqual([x.v for x in first], sorted(x.v for x in values)[:10])
+        # the heap is built in fewer than 2N comparisons (each of which may cost two)
+        self.assertTrue(Counted.comparisons < 4*N)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
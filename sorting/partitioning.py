@@ -0,0 +1,57 @@
+'''
+Building blocks shared by the partition-based algorithms (partial-sort.py and
+intro-sort.py)
+'''
+
+
+# ranges at least this long take a ninther rather than a median of three as pivot
+NINTHER_THRESHOLD = 128
+
+
+def median_of_three(a, b, c):
+    '''
+    Returns the median of a, b and c, with at most three comparisons
+    '''
+    if b < a:
+        a, b = b, a
+    if c < b:
+        b = a if c < a else c
+    return b
+
+
+def pivot(xs, lo, hi):
+    '''
+    Returns a pivot for xs[lo:hi]: the median of its first, middle and last values
+    or, for ranges of NINTHER_THRESHOLD values or more, Tukey's ninther (the median
+    of the medians of three such triples spread over the range), which is much less
+    likely to be among the smallest or largest values
+    '''
+    mid = (lo+hi)//2
+    if hi - lo < NINTHER_THRESHOLD:
+        return median_of_three(xs[lo], xs[mid], xs[hi-1])
+    step = (hi-lo)//8
+    return median_of_three(median_of_three(xs[lo], xs[lo+step], xs[lo+2*step]),
+                           median_of_three(xs[mid-step], xs[mid], xs[mid+step]),
+                           median_of_three(xs[hi-1-2*step], xs[hi-1-step], xs[hi-1]))
+
+
+def partition(xs, lo, hi, pivot):
+    '''
+    Rearranges xs[lo:hi] into the values smaller than pivot, the values equal to it
+    and the values greater than it, and returns (lt, gt), the bounds of the values
+    equal to it. Splitting the equal values out keeps inputs with many duplicates
+    linear. The rearrangement is not stable.
+    '''
+    lt, i, gt = lo, lo, hi
+    while i < gt:
+        v = xs[i]
+        if v < pivot:
+            xs[lt], xs[i] = v, xs[lt]
+            lt += 1
+            i += 1
+        elif pivot < v:
+            gt -= 1
+            xs[i], xs[gt] = xs[gt], v
+        else:
+            i += 1
+    return lt, gt
@@ -0,0 +1,107 @@
+import array
+import functools
+import random
+
+from sort_options import sort_with_options
+
+
+def radix_sort(xs, key=None, bits=8, reverse=False, inplace=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse and inplace. The sort is stable, by
+    LSD (least significant digit first) radix sort: the values are ordered by their
+    integer keys (the values themselves, or key(value), which is called once per
+    value), without comparing them. Every pass distributes the values into 2**bits
+    buckets by a digit of bits bits of their key, from the lowest digit up, and each
+    pass is stable, so the values end up ordered by their whole keys in O(n * d)
+    time, where d is the number of digits of the range of the keys.
+
+    Negative keys are handled by sorting on key - min(keys), which also makes the
+    number of passes depend on the range of the keys rather than on their magnitude
+    (e.g. timestamps within a day take 3 passes of 8 bits).
+    '''
+    if bits < 1:
+        raise ValueError('bits must be positive')
+    return sort_with_options(xs, functools.partial(_radix_sort, bits=bits), key, reverse, inplace, takes_key=True)
+
+
+def _radix_sort(xs, key, bits):
+    keys = xs if key is None else [key(x) for x in xs]
+    if not keys:
+        return
+    lo = min(keys)
+    span = max(keys) - lo
+    if not isinstance(span, (int, long)):
+        raise TypeError('radix sort needs integer keys, not {}'.format(type(span).__name__))
+    offsets = [k-lo for k in keys]
+    mask = (1 << bits) - 1
+    order = range(0, len(xs))
+    shift = 0
+    while span >> shift:
+        buckets = [[] for _ in range(0, mask+1)]
+        appends = [bucket.append for bucket in buckets]
+        for i in order:
+            appends[(offsets[i] >> shift) & mask](i)
+        order = [i for bucket in buckets for i in bucket]
+        shift += bits
+    xs[:] = [xs[i] for i in order]
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return radix_sort
+
+class UnitTestsOneBitDigits(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return functools.partial(radix_sort, bits=1)
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return radix_sort
+
+class UnitTestsRadixSort(unittest.TestCase):
+
+    def test_wide_and_negative_keys(self):
+        random.seed(0)
+        for bits in (1, 3, 8, 11, 16):
+            for high in (1, 1000, 2**40, 2**70):
+                xs = [random.randint(-high, high) for _ in range(0, 500)]
+                self.assertSequenceEqual(radix_sort(xs, bits=bits), sorted(xs))
+
+    def test_key_is_called_once_per_value_and_stable(self):
+        random.seed(0)
+        xs = [(random.randint(-10**6, 10**6) // 1000 * 1000, i) for i in range(0, 2000)]
+        calls = []
+        def key(x):
+            calls.append(x)
+            return x[0]
+        self.assertSequenceEqual(radix_sort(xs, key=key, bits=4), sorted(xs, key=lambda x: x[0]))
+        self.assertEqual(len(calls), len(xs))
+
+    def test_input_is_not_modified(self):
+        xs = [3, 1, 2]
+        radix_sort(xs)
+        self.assertSequenceEqual(xs, [3, 1, 2])
+        self.assertSequenceEqual(radix_sort(iter(xs)), [1, 2, 3])
+
+    def test_invalid_arguments(self):
+        self.assertRaises(TypeError, radix_sort, [1.5, 0.5])
+        self.assertRaises(TypeError, radix_sort, array.array('d', [1.5, 0.5]))
+        self.assertRaises(ValueError, radix_sort, [1, 2], bits=0)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
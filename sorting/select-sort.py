@@ -1,12 +1,23 @@
-def select_sort(xs_unsorted):
-    xs = xs_unsorted[:]
+from sort_options import sort_with_options
+
+
+def select_sort(xs, key=None, reverse=False, inplace=False, typed=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse, inplace and typed. The sort is NOT
+    stable: swapping the smallest remaining value into place may move another value
+    past values equal to it (e.g. [2, 2', 1] becomes [1, 2', 2]).
+    '''
+    return sort_with_options(xs, _select_sort, key, reverse, inplace, typed=typed)
+
+
+def _select_sort(xs):
     for i in range(0, len(xs)):
         ind_min = i
         for j in range(i+1, len(xs)):
             if xs[j] < xs[ind_min]:
                 ind_min = j
         xs[i], xs[ind_min] = xs[ind_min], xs[i]
-    return xs
                 
 
 
@@ -23,8 +34,21 @@ import sorting_unittests
 class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
     def sort_algo(self):
         return select_sort
-        
-        
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    stable = False
+    def sort_algo(self):
+        return select_sort
+
+class UnitTestsNumeric(sorting_unittests.AbstractNumericUnitTestCases):
+    def sort_algo(self):
+        return select_sort
+
+class UnitTestsSelectSort(unittest.TestCase):
+
+    def test_not_stable(self):
+        self.assertSequenceEqual(select_sort([(2, 'a'), (2, 'b'), (1, 'c')], key=lambda x: x[0]),
+                                 [(1, 'c'), (2, 'b'), (2, 'a')])
 
 
 if __name__ == '__main__' :
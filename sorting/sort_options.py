@@ -0,0 +1,87 @@
+'''
+The key, reverse and inplace options that all the sorting algorithms in this
+directory take; see sort_with_options
+'''
+import numeric
+
+
+class Keyed(object):
+    '''
+    A value decorated with its key, which is computed once; compares by the key
+    only, and with < only, like the algorithms themselves
+    '''
+
+    __slots__ = ('k', 'v')
+
+    def __init__(self, k, v):
+        self.k = k
+        self.v = v
+
+    def __lt__(self, other):
+        return self.k < other.k
+
+
+def sort_with_options(xs, sort_inplace, key=None, reverse=False, inplace=False, takes_key=False, typed=False):
+    '''
+    Sorts xs with sort_inplace, a function that sorts a list in place, and applies
+    the options of the algorithms:
+    * key: a function of one argument by the results of which the values are ordered,
+      as with the built-in sorted. It is called exactly once per value: the values
+      are decorated with their keys (see Keyed) for the time of the sort, rather than
+      paired with them in tuples, which would also compare the values on ties.
+    * reverse: orders the values from the largest to the smallest. The list is
+      reversed, sorted and reversed back, so that a stable algorithm stays stable:
+      equal values keep their order, as with the built-in sorted.
+    * inplace: sorts xs, which must then be a list or a writable array of numbers
+      (an array.array, a bytearray or a NumPy array), in place and returns None,
+      rather than returning a sorted copy of xs. Nothing is allocated for a list but
+      the decorated values, if there is a key, and whatever buffer the algorithm
+      needs; an array is sorted as a list of its values, which are then written back.
+    A copy of an array of numbers (see numeric.typecode) is returned as the same kind
+    of array (see numeric.like), whether there is a key or not. Such an array is
+    sorted by sort_inplace like any other sequence, unless typed is true and there is
+    no key: it is then sorted by numeric.sort instead, the typed fast path.
+
+    If takes_key, sort_inplace is passed the key (as its key argument, None if there
+    is none) rather than decorated values; this is for the algorithms that do not
+    compare values but compute with their keys, which they must call once per value.
+
+    >>> xs = ['bb', 'a', 'ccc', 'dd']
+    >>> sort_with_options(xs, list.sort, key=len, reverse=True)
+    ['ccc', 'bb', 'dd', 'a']
+    >>> sort_with_options(xs, list.sort, inplace=True), xs
+    (None, ['a', 'bb', 'ccc', 'dd'])
+    '''
+    tc = numeric.typecode(xs)
+    if inplace and not (isinstance(xs, list) or tc is not None and not isinstance(xs, memoryview)):
+        raise TypeError('only lists and arrays of numbers can be sorted in place, not {}'.format(type(xs).__name__))
+    if typed and key is None and tc is not None:
+        rv = numeric.sort(xs)
+        if reverse:
+            rv = rv[::-1]
+        if not inplace:
+            return rv
+        xs[:] = rv
+        return None
+    if tc is not None:
+        a = numeric.tolist(xs)
+    else:
+        a = xs if inplace else list(xs)
+    decorate = key is not None and not takes_key
+    work = [Keyed(key(x), x) for x in a] if decorate else a
+    if reverse:
+        work.reverse()
+    if takes_key:
+        sort_inplace(work, key=key)
+    else:
+        sort_inplace(work)
+    if reverse:
+        work.reverse()
+    if decorate:
+        for i, decorated in enumerate(work):
+            a[i] = decorated.v
+    if tc is not None:
+        a = numeric.like(xs, a)
+        if inplace:
+            xs[:] = a
+    return None if inplace else a
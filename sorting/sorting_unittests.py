@@ -1,5 +1,13 @@
+import array
 import random
 
+import numeric
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 import unittest
 class AbstractSortingAlgoUnitTestCases(unittest.TestCase):
@@ -60,3 +68,147 @@ class AbstractSortingAlgoUnitTestCases(unittest.TestCase):
             self.assertSequenceEqual(self.sort_algo()(arr), xs_expected)
                 
                 
+
+
+class AbstractSortingOptionsUnitTestCases(unittest.TestCase):
+    '''
+    Tests of the key, reverse and inplace options (see sort_options); an algorithm
+    that is not stable sets stable to False
+    '''
+
+    stable = True
+
+    def pairs(self, N):
+        return [(random.randint(0, 5), i) for i in range(0, N)]
+
+    def assertSortedBy(self, rv, xs, key, reverse):
+        expected = sorted(xs, key=key, reverse=reverse)
+        if self.stable:
+            self.assertSequenceEqual(rv, expected)
+        else:
+            self.assertSequenceEqual([key(x) for x in rv], [key(x) for x in expected])
+            self.assertSequenceEqual(sorted(rv), sorted(xs))
+
+    def test_key_is_called_once_per_value(self):
+        random.seed(0)
+        for N in (0, 1, 2, 50, 300):
+            xs = self.pairs(N)
+            calls = []
+            def key(x):
+                calls.append(x)
+                return x[0]
+            self.assertSortedBy(self.sort_algo()(xs, key=key), xs, lambda x: x[0], False)
+            self.assertEqual(len(calls), N)
+
+    def test_reverse(self):
+        random.seed(0)
+        for N in (0, 1, 2, 50, 300):
+            xs = self.pairs(N)
+            ys = [x[0]*N + x[1] for x in xs]
+            self.assertSequenceEqual(self.sort_algo()(ys, reverse=True), sorted(ys, reverse=True))
+            self.assertSortedBy(self.sort_algo()(xs, key=lambda x: x[0], reverse=True), xs, lambda x: x[0], True)
+
+    def test_inplace(self):
+        random.seed(0)
+        for N in (0, 1, 2, 50, 300):
+            for key, reverse in ((None, False), (None, True), (lambda x: x[0], False), (lambda x: -x[0], True)):
+                xs = self.pairs(N)
+                if key is None:
+                    xs = [x[0] for x in xs]
+                original = xs[:]
+                self.assertIs(self.sort_algo()(xs, key=key, reverse=reverse, inplace=True), None)
+                self.assertSortedBy(xs, original, key or (lambda x: x), reverse)
+        self.assertRaises(TypeError, self.sort_algo(), (3, 1, 2), inplace=True)
+
+    def test_copy_leaves_input_alone(self):
+        xs = [3, 1, 2]
+        self.assertSequenceEqual(self.sort_algo()(xs, reverse=True), [3, 2, 1])
+        self.assertSequenceEqual(self.sort_algo()(iter(xs)), [1, 2, 3])
+        self.assertSequenceEqual(xs, [3, 1, 2])
+
+    def test_arrays_of_numbers(self):
+        # sorted by the algorithm itself, and returned as the same kind of array
+        xs = array.array('i', [3, -1, 2, 2])
+        self.assertEqual(self.sort_algo()(xs, reverse=True), array.array('i', [3, 2, 2, -1]))
+        self.assertEqual(self.sort_algo()(xs, key=lambda x: -x), array.array('i', [3, 2, 2, -1]))
+        self.assertEqual(xs, array.array('i', [3, -1, 2, 2]))
+        self.assertIs(self.sort_algo()(xs, inplace=True), None)
+        self.assertEqual(xs, array.array('i', [-1, 2, 2, 3]))
+        self.assertIs(self.sort_algo()(xs, key=lambda x: -x, inplace=True), None)
+        self.assertEqual(xs, array.array('i', [3, 2, 2, -1]))
+        ys = bytearray(b'cab')
+        self.assertEqual(self.sort_algo()(ys), bytearray(b'abc'))
+        self.assertIs(self.sort_algo()(ys, reverse=True, inplace=True), None)
+        self.assertEqual(ys, bytearray(b'cba'))
+        self.assertEqual(self.sort_algo()(memoryview(b'cab')), array.array('B', b'abc'))
+        self.assertRaises(TypeError, self.sort_algo(), memoryview(b'cab'), inplace=True)
+
+
+class AbstractNumericUnitTestCases(unittest.TestCase):
+    '''
+    Tests of the typed fast path of the algorithms that take typed (see numeric.py)
+    '''
+
+    def test_arrays_of_numbers(self):
+        xs = array.array('d', [2.5, -1.0, 2.0])
+        self.assertEqual(self.sort_algo()(xs, typed=True), array.array('d', [-1.0, 2.0, 2.5]))
+        self.assertEqual(xs, array.array('d', [2.5, -1.0, 2.0]))
+        self.assertEqual(self.sort_algo()(xs, reverse=True, typed=True), array.array('d', [2.5, 2.0, -1.0]))
+        self.assertIs(self.sort_algo()(xs, inplace=True, typed=True), None)
+        self.assertEqual(xs, array.array('d', [-1.0, 2.0, 2.5]))
+        self.assertEqual(self.sort_algo()(bytearray(b'cab'), typed=True), bytearray(b'abc'))
+
+    def test_only_unkeyed_arrays_take_the_fast_path(self):
+        calls = []
+        sort = numeric.sort
+        numeric.sort = lambda xs: calls.append(xs) or sort(xs)
+        try:
+            xs = array.array('i', [3, -1, 2])
+            self.sort_algo()(xs, typed=True)
+            self.assertEqual(len(calls), 1)
+            self.sort_algo()(xs)
+            self.sort_algo()(xs, key=lambda x: -x, typed=True)
+            self.sort_algo()([3, -1, 2], typed=True)
+            self.assertEqual(len(calls), 1)
+        finally:
+            numeric.sort = sort
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_numpy_arrays(self):
+        random.seed(0)
+        for dtype in ('int64', 'float32'):
+            xs = numpy.array([random.randint(-100, 100) for _ in range(0, 200)], dtype=dtype)
+            for typed in (False, True):
+                rv = self.sort_algo()(xs, typed=typed)
+                self.assertIsInstance(rv, numpy.ndarray)
+                self.assertEqual(rv.dtype, xs.dtype)
+                self.assertSequenceEqual(list(rv), sorted(xs))
+            self.assertIs(self.sort_algo()(xs, key=lambda x: -x, inplace=True), None)
+            self.assertSequenceEqual(list(xs), sorted(xs, reverse=True))
+            self.assertIs(self.sort_algo()(xs, inplace=True, typed=True), None)
+            self.assertSequenceEqual(list(xs), sorted(xs))
+
+
+class FirstItemKey(object):
+    '''
+    Wraps a pair and compares by its first item only, so that the second one tells
+    apart values that compare equal
+    '''
+    def __init__(self, x):
+        self.x = x
+    def __lt__(self, other):
+        return self.x[0] < other.x[0]
+
+
+class Counted(object):
+    '''
+    Compares by v, counting the comparisons in Counted.comparisons; id can tell apart
+    values that compare equal, so that stability can be checked
+    '''
+    comparisons = 0
+    def __init__(self, v, id=None):
+        self.v = v
+        self.id = id
+    def __lt__(self, other):
+        Counted.comparisons += 1
+        return self.v < other.v
@@ -0,0 +1,210 @@
+import bisect
+import random
+
+from merging import binary_insertion_sort, copy, merge
+from sort_options import sort_with_options
+
+
+def _min_run_length(N):
+    '''
+    Returns a run length between 32 and 64 such that N/min_run_length is a power of
+    two or slightly less than one, which keeps the final merges balanced
+    '''
+    r = 0
+    while N >= 64:
+        r |= N & 1
+        N >>= 1
+    return N + r
+
+
+def _count_run_and_make_ascending(xs, lo, hi):
+    '''
+    Returns the end of the run that starts at lo: the longest ascending
+    (non-descending) or strictly descending stretch of xs[lo:hi]. A descending run
+    is reversed in place; as it is strictly descending, that keeps the sort stable.
+    '''
+    i = lo+1
+    if i == hi:
+        return hi
+    if xs[i] < xs[lo]:
+        i += 1
+        while i < hi and xs[i] < xs[i-1]:
+            i += 1
+        j, k = lo, i-1
+        while j < k:
+            xs[j], xs[k] = xs[k], xs[j]
+            j += 1
+            k -= 1
+    else:
+        i += 1
+        while i < hi and not xs[i] < xs[i-1]:
+            i += 1
+    return i
+
+
+def _merge_at(xs, runs, n, buf):
+    '''
+    Merges the runs n and n+1 of the stack of (start, length) runs
+    '''
+    lo, left_length = runs[n]
+    mid, right_length = runs[n+1]
+    hi = mid + right_length
+    runs[n] = (lo, left_length + right_length)
+    del runs[n+1]
+    # the values at the start of the left run and at the end of the right run are
+    # already where they belong
+    lo = bisect.bisect_right(xs, xs[mid], lo, mid)
+    hi = bisect.bisect_left(xs, xs[mid-1], mid, hi)
+    if lo == mid or mid == hi:
+        return
+    copy(xs, lo, mid, buf, 0)
+    merge(buf, 0, mid-lo, xs, mid, hi, xs, lo)
+
+
+def _merge_collapse(xs, runs, buf):
+    '''
+    Merges runs until the lengths on the stack, from top to bottom, grow faster than
+    the Fibonacci numbers (each is greater than the sum of the two above it), which
+    keeps the stack O(log n) deep and the merges balanced. This checks the invariant
+    on the top four runs rather than three, which the original Timsort got wrong.
+    '''
+    while len(runs) > 1:
+        n = len(runs) - 2
+        if (n > 0 and runs[n-1][1] <= runs[n][1] + runs[n+1][1]) or \
+           (n > 1 and runs[n-2][1] <= runs[n-1][1] + runs[n][1]):
+            if runs[n-1][1] < runs[n+1][1]:
+                n -= 1
+        elif runs[n][1] > runs[n+1][1]:
+            break
+        _merge_at(xs, runs, n, buf)
+
+
+def tim_sort(xs, key=None, reverse=False, inplace=False, typed=False):
+    '''
+    Returns a sorted copy of xs, or sorts the list xs in place and returns None if
+    inplace; see sort_options for key, reverse, inplace and typed. The sort is
+    stable and adaptive (Timsort, T. Peters):
+    * the input is split into its natural runs, ascending or strictly descending (the
+      latter are reversed), so presorted or reverse-sorted input takes O(n) time
+    * runs shorter than a minimum length (32 to 64) are extended to it by binary
+      insertion
+    * the runs are pushed on a stack and merged under an invariant on their lengths
+      that keeps the merges balanced, so the worst case is O(n log n)
+    * merges gallop when one run dominates; see merging.merge
+    A single buffer, allocated up front, receives the left run of each merge.
+    '''
+    return sort_with_options(xs, _tim_sort, key, reverse, inplace, typed=typed)
+
+
+def _tim_sort(a):
+    N = len(a)
+    if N < 2:
+        return
+    min_run = _min_run_length(N)
+    buf = [None]*N
+    runs = []
+    lo = 0
+    while lo < N:
+        hi = _count_run_and_make_ascending(a, lo, N)
+        if hi-lo < min_run:
+            forced_hi = min(lo+min_run, N)
+            binary_insertion_sort(a, lo, forced_hi, hi)
+            hi = forced_hi
+        runs.append((lo, hi-lo))
+        _merge_collapse(a, runs, buf)
+        lo = hi
+    while len(runs) > 1:
+        n = len(runs) - 2
+        if n > 0 and runs[n-1][1] < runs[n+1][1]:
+            n -= 1
+        _merge_at(a, runs, n, buf)
+
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import sorting_unittests
+from sorting_unittests import Counted
+
+class UnitTests(sorting_unittests.AbstractSortingAlgoUnitTestCases):
+    def sort_algo(self):
+        return tim_sort
+
+class UnitTestsOptions(sorting_unittests.AbstractSortingOptionsUnitTestCases):
+    def sort_algo(self):
+        return tim_sort
+
+class UnitTestsTimSort(unittest.TestCase):
+
+    def sort_counting_comparisons(self, values):
+        xs = [Counted(v, i) for i, v in enumerate(values)]
+        Counted.comparisons = 0
+        rv = tim_sort(xs)
+        self.assertSequenceEqual([(x.v, x.id) for x in rv], sorted((x.v, x.id) for x in xs))
+        return Counted.comparisons
+
+    def test_linear_on_presorted_and_reverse_sorted_input(self):
+        N = 10000
+        self.assertEqual(self.sort_counting_comparisons(range(0, N)), N-1)
+        self.assertEqual(self.sort_counting_comparisons(range(N, 0, -1)), N-1)
+        self.assertEqual(self.sort_counting_comparisons([5]*N), N-1)
+
+    def test_concatenated_segments(self):
+        random.seed(0)
+        N = 20000
+        values = []
+        while len(values) < N:
+            segment = sorted(random.randint(0, 1000) for _ in range(0, random.randint(500, 3000)))
+            values.extend(segment if random.random() < 0.7 else segment[::-1])
+        segments_comparisons = self.sort_counting_comparisons(values)
+        random.shuffle(values)
+        random_comparisons = self.sort_counting_comparisons(values)
+        self.assertTrue(segments_comparisons < random_comparisons/2)
+
+    def test_stable_and_n_log_n_on_random_input(self):
+        random.seed(0)
+        for N in (0, 1, 2, 63, 64, 65, 1000, 4321):
+            for high in (3, 10**6):
+                comparisons = self.sort_counting_comparisons([random.randint(0, high) for _ in range(0, N)])
+                self.assertTrue(comparisons <= 2*N*max(1, N.bit_length()))
+
+    def test_min_run_length(self):
+        self.assertEqual(_min_run_length(63), 63)
+        self.assertEqual(_min_run_length(64), 32)
+        self.assertEqual(_min_run_length(65), 33)
+        self.assertEqual(_min_run_length(2**20), 32)
+        for N in range(64, 5000):
+            self.assertTrue(32 <= _min_run_length(N) <= 64)
+
+    def test_stack_invariant(self):
+        random.seed(0)
+        runs = []
+        buf = [None]*10000
+        xs = []
+        for length in (random.randint(1, 200) for _ in range(0, 100)):
+            runs.append((len(xs), length))
+            xs.extend(sorted(random.randint(0, 1000) for _ in range(0, length)))
+            _merge_collapse(xs, runs, buf)
+            lengths = [length for _, length in runs]
+            for i in range(0, len(lengths)-2):
+                self.assertTrue(lengths[i] > lengths[i+1] + lengths[i+2])
+            for i in range(0, len(lengths)-1):
+                self.assertTrue(lengths[i] > lengths[i+1])
+            for start, length in runs:
+                self.assertSequenceEqual(xs[start:start+length], sorted(xs[start:start+length]))
+
+class UnitTestsNumeric(sorting_unittests.AbstractNumericUnitTestCases):
+    def sort_algo(self):
+        return tim_sort
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests.'
+    unittest.main()
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import math
+import random
+
+from bst import BSTNode, OneByOneBatchUpdates
+
+
+class AVLNode(OneByOneBatchUpdates, BSTNode):
+    '''
+    Self-balancing (AVL) variant of BSTNode that offers the same multiset API:
+    insert, find, count, delete(v, delete_all), min / max, size, the traversals,
+    to_string and depth.
+
+    The height of the two subtrees of every node differs by at most one, so the
+    depth of the tree is guaranteed to be O(log n) (more precisely, less than
+    1.44*log2(n+2)) regardless of the order in which the values are inserted.
+
+    Rotations are performed by swapping values between nodes rather than by
+    re-linking nodes to new parents. That way the node on which a method is invoked
+    always remains the root of the tree (exactly as with BSTNode) and callers never
+    have to re-assign their root pointer.
+
+    Since a rotation can move an occurrence of a key into the right subtree of
+    another occurrence of the same key, this tree maintains the binary search
+    property in the form given by Wikipedia (left <= node <= right) rather than the
+    stricter "duplicates only in the left subtree" form BSTNode relies on. The only
+    method affected by this is count, which is overridden accordingly (and the walk
+    of count_many, which looks on both sides as _DUPLICATES_RIGHT is set).
+    '''
+
+    __slots__ = ('height',)
+
+    _DUPLICATES_RIGHT = True
+
+    def __init__(self, parent, v, left=None, right=None):
+        BSTNode.__init__(self, parent, v, left, right)
+        self._update_height_and_size()
+
+    @staticmethod
+    def createTreeUsingRecursiveInsert(values):
+        root = AVLNode(None, values[0])
+        for v in values[1:]:
+            root.insert(v)
+        assert root.size()==len(values)
+        return root
+
+    @staticmethod
+    def createTreeUsingBulkLoad(values):
+        '''
+        Builds an AVL tree out of the values of any (non-empty) iterable in O(n log n)
+        time, or O(n) if the values are already sorted. As duplicates may sit on
+        either side of a node here, the sorted values are split right at the middle:
+        the two subtrees of every node differ in size by at most one, hence in height
+        by at most one too.
+        '''
+        values = sorted(values)
+        assert len(values) > 0
+        return AVLNode._bulk_build(values, 0, len(values), None)
+
+    @staticmethod
+    def _bulk_build(values, lo, hi, parent):
+        '''
+        Builds a perfectly balanced tree out of the sorted values[lo:hi] (with lo < hi)
+        and returns its root, whose parent pointer is set to parent; the recursion is
+        only O(log n) deep
+        '''
+        mid = (lo+hi)//2
+        node = AVLNode(parent, values[mid])
+        if lo < mid:
+            node.left = AVLNode._bulk_build(values, lo, mid, node)
+        if mid+1 < hi:
+            node.right = AVLNode._bulk_build(values, mid+1, hi, node)
+        node._update_height_and_size()
+        return node
+
+
+    @staticmethod
+    def _height(node):
+        return -1 if node is None else node.height
+
+    def _update_height_and_size(self):
+        self.height = 1 + max(AVLNode._height(self.left), AVLNode._height(self.right))
+        self.subtree_size = 1 + (0 if self.left is None else self.left.subtree_size) + (0 if self.right is None else self.right.subtree_size)
+
+    def _balance_factor(self):
+        return AVLNode._height(self.left) - AVLNode._height(self.right)
+
+    def _rotate_right(self):
+        '''
+        Rotates the subtree rooted at this node to the right; this node stays at the
+        top of the subtree and takes over the value of its left child.
+        '''
+        pivot = self.left
+        self.v, pivot.v = pivot.v, self.v
+        self.left = pivot.left
+        if self.left is not None:
+            self.left.parent = self
+        pivot.left = pivot.right
+        pivot.right = self.right
+        if pivot.right is not None:
+            pivot.right.parent = pivot
+        self.right = pivot
+        pivot._update_height_and_size()
+        self._update_height_and_size()
+
+    def _rotate_left(self):
+        pivot = self.right
+        self.v, pivot.v = pivot.v, self.v
+        self.right = pivot.right
+        if self.right is not None:
+            self.right.parent = self
+        pivot.right = pivot.left
+        pivot.left = self.left
+        if pivot.left is not None:
+            pivot.left.parent = pivot
+        self.left = pivot
+        pivot._update_height_and_size()
+        self._update_height_and_size()
+
+    def _rebalance(self):
+        balance = self._balance_factor()
+        if balance > 1:
+            if self.left._balance_factor() < 0:
+                self.left._rotate_left()
+            self._rotate_right()
+        elif balance < -1:
+            if self.right._balance_factor() > 0:
+                self.right._rotate_right()
+            self._rotate_left()
+        else:
+            self._update_height_and_size()
+
+    def _rebalance_upwards(self):
+        node = self
+        while node is not None:
+            node._rebalance()
+            node = node.parent
+
+    def insert(self, v):
+        p = self
+        while True:
+            if p.v >= v:
+                if p.left is None:
+                    p.left = AVLNode(p, v)
+                    break
+                p = p.left
+            else:
+                if p.right is None:
+                    p.right = AVLNode(p, v)
+                    break
+                p = p.right
+        p._rebalance_upwards()
+
+    # the AVL insert is not recursive to begin with
+    insert_non_recursive = insert
+
+    def insert_persistent(self, v):
+        '''
+        Inserts a value without modifying the original tree: returns a new tree and
+        leaves the old one unmodified, as BSTNode.insert_persistent does. Only the
+        nodes on the path to the new value are copied, and the copies are then
+        rebalanced bottom-up, as insert rebalances that path. A rotation swaps values
+        between a node and a child on the path (see _rotate_right), so it only ever
+        modifies copies; it does re-parent the subtrees it moves, though, and those
+        subtrees are shared with the original tree, so their parent pointers are put
+        back to where they lead in it. The new tree is meant to be extended with
+        insert_persistent too: its shared subtrees still belong to the original.
+        '''
+        path = []
+        node = self
+        while node is not None:
+            path.append(node)
+            node = node.left if node.v >= v else node.right
+        child = AVLNode(None, v)
+        copies = []
+        shared = []
+        for node in reversed(path):
+            if node.v >= v:
+                copy = AVLNode(None, node.v, child, node.right)
+                other = node.right
+            else:
+                copy = AVLNode(None, node.v, node.left, child)
+                other = node.left
+            if other is not None:
+                shared.append((other, other.parent))
+            child.parent = copy
+            copies.append(copy)
+            child = copy
+        child.parent = self.parent
+        for copy in copies:
+            copy._rebalance()
+        for node, parent in shared:
+            node.parent = parent
+        return child
+
+    def count(self, v):
+        '''
+        Occurrences of v may be found on both sides of a node holding v, so both
+        subtrees of such a node are searched; O(log n + k) for k occurrences.
+        '''
+        rv = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if node.v == v:
+                rv += 1
+                stack.append(node.left)
+                stack.append(node.right)
+            elif node.v > v:
+                stack.append(node.left)
+            else:
+                stack.append(node.right)
+        return rv
+
+    def _find_node(self, v):
+        node = self
+        while node is not None and node.v != v:
+            node = node.left if node.v > v else node.right
+        return node
+
+    def _remove_node(self):
+        '''
+        Removes this node's value from the tree and restores the AVL property on the
+        path up to the root.
+        '''
+        if self.left is not None and self.right is not None:
+            predecessor = self.left
+            while predecessor.right is not None:
+                predecessor = predecessor.right
+            self.v = predecessor.v
+            # the in-order predecessor has no right child so it can simply be spliced out
+            if predecessor.parent.left is predecessor:
+                predecessor.parent.left = predecessor.left
+            else:
+                predecessor.parent.right = predecessor.left
+            if predecessor.left is not None:
+                predecessor.left.parent = predecessor.parent
+            predecessor.parent._rebalance_upwards()
+        elif self.left is not None or self.right is not None:
+            # copy the only child into this node so that the root never changes identity
+            child = self.left if self.left is not None else self.right
+            self.v = child.v
+            self.left = child.left
+            self.right = child.right
+            if self.left is not None:
+                self.left.parent = self
+            if self.right is not None:
+                self.right.parent = self
+            self._rebalance_upwards()
+        else:
+            if self.parent is None:
+                raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+            if self.is_right_child():
+                self.parent.right = None
+            else:
+                self.parent.left = None
+            self.parent._rebalance_upwards()
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        howManyWereDeleted = 0
+        while True:
+            node = self._find_node(v)
+            if node is None:
+                break
+            node._remove_node()
+            howManyWereDeleted += 1
+            if not delete_all:
+                break
+        return howManyWereDeleted
+
+    def depth(self):
+        '''
+        Reports the depth of the tree in O(1) time, using the cached height
+        >>> n = AVLNode(None, 0)
+        >>> for i in range(1, 7): n.insert(i)
+        >>> print(n.depth())
+        2
+        '''
+        return self.height
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def assert_avl_invariants(self, tree):
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            for child in (node.left, node.right):
+                if child is not None:
+                    self.assertIs(child.parent, node)
+                    stack.append(child)
+            self.assertEqual(node.height, 1 + max(AVLNode._height(node.left), AVLNode._height(node.right)))
+            self.assertTrue(abs(node._balance_factor()) <= 1)
+            self.assertEqual(node.subtree_size, len(list(node.preorder_traversal_nonrecur_yield())))
+        values = [x.v for x in tree.preorder_traversal_nonrecur_yield()]
+        self.assertEqual(self.inorder(tree), sorted(values))
+
+    def inorder(self, tree):
+        rv = []
+        stack = []
+        node = tree
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                rv.append(node.v)
+                node = node.right
+        return rv
+
+    def test_to_string(self):
+        tree = AVLNode.createTreeUsingRecursiveInsert([1, 2, 3])
+        self.assertEqual(tree.to_string(),
+'''
+2
+├─R──>3
+└─L──>1
+'''.strip())
+
+    def test_depth_is_logarithmic_on_sorted_input(self):
+        for N in (10, 1000, 20000):
+            for values in (range(0, N), range(N, 0, -1), [i//10 for i in range(0, N)]):
+                tree = AVLNode.createTreeUsingRecursiveInsert(values)
+                self.assertEqual(tree.size(), N)
+                self.assertTrue(tree.depth() < 1.4405*math.log(N+2, 2))
+                self.assertEqual(tree.min(), min(values))
+                self.assertEqual(tree.max(), max(values))
+        self.assert_avl_invariants(tree)
+
+    def test_bulk_load(self):
+        random.seed(0)
+        for values in ([5], range(0, 1000), [7]*100, [random.randint(0, 50) for _ in range(0, 1000)]):
+            tree = AVLNode.createTreeUsingBulkLoad(iter(values))
+            self.assertTrue(all(isinstance(node, AVLNode) for node in tree.preorder_traversal_nonrecur_yield()))
+            self.assert_avl_invariants(tree)
+            self.assertEqual(tree.size(), len(values))
+            for v in set(values):
+                self.assertEqual(tree.count(v), values.count(v))
+            tree.insert(values[0])
+            tree.delete(values[-1], False)
+            self.assert_avl_invariants(tree)
+
+    def test_insert_persistent(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 60):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = AVLNode.createTreeUsingRecursiveInsert(random_values)
+            before = tree.to_string()
+            reference = AVLNode.createTreeUsingRecursiveInsert(random_values)
+            version = tree
+            for v in [random.randint(-1, 21) for _ in range(0, 10)]:
+                version = version.insert_persistent(v)
+                # the same shape as an ordinary insert gives
+                reference.insert(v)
+                self.assertEqual(version.to_string(), reference.to_string())
+                self.assertEqual(version.size(), reference.size())
+                self.assertEqual(version.depth(), reference.depth())
+            # the original is untouched, parent pointers included, and still usable
+            self.assertEqual(tree.to_string(), before)
+            self.assert_avl_invariants(tree)
+            tree.insert(7)
+            tree.delete(random_values[0], False)
+            self.assert_avl_invariants(tree)
+
+    def test_find_and_count(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = AVLNode.createTreeUsingRecursiveInsert(random_values)
+            self.assert_avl_invariants(tree)
+            for f in range(-1, 22):
+                self.assertEqual(tree.find(f), f in random_values)
+                self.assertEqual(tree.count(f), random_values.count(f))
+
+    def test_batch_operations(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = AVLNode.createTreeUsingRecursiveInsert(random_values)
+            queries = [random.randint(-1, 21) for _ in range(0, 30)]
+            self.assertEqual(tree.find_many(queries), [v in random_values for v in queries])
+            self.assertEqual(tree.count_many(queries), [random_values.count(v) for v in queries])
+            more = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree.insert_many(more)
+            random_values.extend(more)
+            self.assert_avl_invariants(tree)
+            self.assertEqual(tree.count_many(range(-1, 22)), [random_values.count(v) for v in range(-1, 22)])
+            to_delete = [v for v in range(0, 21) if v != random_values[0]]
+            self.assertEqual(tree.delete_many(to_delete, True), [random_values.count(v) for v in to_delete])
+            self.assertEqual(tree.size(), random_values.count(random_values[0]))
+            self.assert_avl_invariants(tree)
+
+    def test_rank_and_select(self):
+        random.seed(0)
+        random_values = [random.randint(0, 50) for _ in range(0, 300)]
+        tree = AVLNode.createTreeUsingRecursiveInsert(random_values)
+        self.assertSequenceEqual([tree.select(k) for k in range(0, len(random_values))], sorted(random_values))
+        for v in range(-1, 53):
+            self.assertEqual(tree.rank(v), len([x for x in random_values if x < v]))
+            self.assertEqual(tree.count_range(v, v+1), random_values.count(v))
+
+    def test_delete_and_size(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = AVLNode.createTreeUsingRecursiveInsert(random_values)
+            remaining = random_values[:]
+            indexOfOnlyValueToNotDelete = random.randint(0, len(random_values)-1)
+            for i in range(0, len(random_values)):
+                if i == indexOfOnlyValueToNotDelete:
+                    continue
+                self.assertEqual(tree.delete(random_values[i], False), 1)
+                remaining.remove(random_values[i])
+                self.assertEqual(tree.size(), len(remaining))
+                self.assertEqual(tree.count(random_values[i]), remaining.count(random_values[i]))
+                self.assert_avl_invariants(tree)
+            self.assertEqual(tree.v, random_values[indexOfOnlyValueToNotDelete])
+            self.assertIs(tree.parent, None)
+            self.assertEqual(tree.depth(), 0)
+            self.assertEqual(tree.delete(-1, False), 0)
+            self.assertRaises(Exception, tree.delete, tree.v, False)
+
+    def test_delete_all_and_size(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = AVLNode.createTreeUsingRecursiveInsert(random_values)
+            deletionsSoFar = 0
+            valueToNotDelete = random.choice(random_values)
+            for v in set(random_values):
+                if v == valueToNotDelete:
+                    continue
+                elementsDeleted = tree.delete(v, True)
+                self.assertEqual(elementsDeleted, random_values.count(v))
+                deletionsSoFar += elementsDeleted
+                self.assertEqual(tree.size(), num_of_nodes-deletionsSoFar)
+                self.assertFalse(tree.find(v))
+                self.assert_avl_invariants(tree)
+            self.assertEqual(tree.count(valueToNotDelete), random_values.count(valueToNotDelete))
+
+    def test_interleaved_inserts_and_deletes_on_sorted_input(self):
+        N = 5000
+        tree = AVLNode(None, 0)
+        for i in range(1, N):
+            tree.insert(i)
+            tree.insert(i)
+            self.assertEqual(tree.delete(i-1, False), 1)
+        self.assertEqual(tree.size(), N)
+        self.assertTrue(tree.depth() < 1.4405*math.log(N+2, 2))
+        self.assert_avl_invariants(tree)
+        self.assertSequenceEqual([x.v for x in tree.preorder_traversal_yield()],
+                                 [x.v for x in tree.preorder_traversal_nonrecur_yield()])
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmarks for the tree implementations in this directory; run with:
+
+    python benchmarks.py
+
+Nothing here is a unit test: the numbers are printed for a human to look at.
+'''
+from __future__ import unicode_literals
+
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import bst
+import bst_serialize
+import bst_stats
+from bst import BSTNode
+from bst_set import BSTSet
+from btree import BTree
+from compact_bst import CompactBST
+from concurrent_bst import ConcurrentBST, LockedBST, RWLockedBST
+from skip_list import SkipList
+from treap import Treap
+
+
+class LegacyBSTNode:
+    '''
+    Node with the layout BSTNode had before it switched to __slots__ (an old-style
+    class with a per-instance __dict__); used as the "before" of the memory benchmark
+    '''
+    def __init__(self, parent, v, left=None, right=None):
+        self.parent = parent
+        self.v = v
+        self.left = left
+        self.right = right
+
+
+def bench_memory(N=200000):
+    '''
+    Reports the bytes per key of every node layout. The key objects themselves are
+    not counted (they are shared with the caller) except for typed CompactBST trees
+    which store them unboxed.
+    '''
+    random.seed(0)
+    values = [random.randint(0, N) for _ in range(0, N)]
+    print 'memory, {} keys (a boxed int key adds another {} bytes/key where not stored unboxed):'.format(N, sys.getsizeof(N))
+
+    legacy = [LegacyBSTNode(None, v) for v in values]
+    legacy_bytes = sum(sys.getsizeof(x) + sys.getsizeof(x.__dict__) for x in legacy)
+    del legacy
+    print '    {:<40}{:>8.1f} bytes/key'.format('dict-based node (before)', float(legacy_bytes)/N)
+
+    tree = BSTNode.createTreeUsingBulkLoad(values)
+    slots_bytes = sum(sys.getsizeof(x) for x in tree.preorder_traversal_nonrecur_yield())
+    del tree
+    print '    {:<40}{:>8.1f} bytes/key'.format('BSTNode with __slots__', float(slots_bytes)/N)
+
+    for typecode, description in ((None, 'CompactBST (keys in a list)'), ('l', "CompactBST (keys in array('l'))")):
+        tree = CompactBST.createTreeUsingBulkLoad(values, typecode)
+        print '    {:<40}{:>8.1f} bytes/key'.format(description, float(tree.memory_usage())/N)
+
+
+def bench_deep_trees(N=100000):
+    '''
+    Reports the throughput of the (loop-based) BSTNode operations on a degenerate tree
+    N levels deep, where the recursive implementations they replaced would overflow the
+    stack, and compares the two on a balanced tree of the same size.
+    '''
+    deep = bst.degenerate_tree(N)
+    balanced = BSTNode.createTreeUsingBulkLoad(range(0, N))
+    print 'operations on a tree {} levels deep:'.format(N)
+    operations = [('find (deepest key)', lambda: deep.find(N-1)),
+                  ('count (deepest key)', lambda: deep.count(N-1)),
+                  ('max', lambda: deep.max()),
+                  ('depth', lambda: deep.depth()),
+                  ('preorder traversal', lambda: sum(1 for _ in deep.preorder_traversal_yield())),
+                  ('insert_persistent (deepest key)', lambda: deep.insert_persistent(N)),
+                  ('delete + re-insert (deepest key)', lambda: (deep.delete(N-1, False), deep.insert_non_recursive(N-1)))]
+    for description, f in operations:
+        n, seconds = 5, min(timeit.repeat(f, number=5, repeat=3))
+        print '    {:<40}{:>10.1f} ms/op'.format(description, 1000*seconds/n)
+    print 'loop-based vs recursive, balanced tree of {} keys:'.format(N)
+    keys = [random.randint(0, N) for _ in range(0, 10000)]
+    comparisons = [('find', lambda: [balanced.find(k) for k in keys], lambda: [bst.recursive_find(balanced, k) for k in keys]),
+                   ('count', lambda: [balanced.count(k) for k in keys], lambda: [bst.recursive_count(balanced, k) for k in keys]),
+                   ('preorder traversal', lambda: sum(1 for _ in balanced.preorder_traversal_yield()), lambda: sum(1 for _ in bst.recursive_preorder(balanced))),
+                   ('depth', lambda: balanced.depth(), lambda: bst.recursive_depth(balanced))]
+    for description, loop, recursive in comparisons:
+        t_loop = min(timeit.repeat(loop, number=1, repeat=3))
+        t_recursive = min(timeit.repeat(recursive, number=1, repeat=3))
+        print '    {:<40}{:>10.1f} ms (loop) {:>10.1f} ms (recursive)'.format(description, 1000*t_loop, 1000*t_recursive)
+
+
+def bench_batches(N=100000, batch_size=10000):
+    '''
+    Compares the batch operations of BSTNode with the equivalent loops of single
+    operations, on a random tree of N keys and random batches of batch_size keys
+    '''
+    random.seed(0)
+    values = [random.randint(0, N) for _ in range(0, N)]
+    batch = [random.randint(0, N) for _ in range(0, batch_size)]
+    print 'batches of {} keys, random tree of {} keys:'.format(batch_size, N)
+    def timed_on_fresh_trees(f):
+        # the updates change the tree, so every run gets a tree of its own
+        rv = []
+        for _ in range(0, 3):
+            tree = BSTNode.createTreeUsingRecursiveInsert(values)
+            rv.append(timeit.timeit(lambda: f(tree), number=1))
+        return min(rv)
+    comparisons = [('find', lambda t: t.find_many(batch), lambda t: [t.find(v) for v in batch]),
+                   ('count', lambda t: t.count_many(batch), lambda t: [t.count(v) for v in batch]),
+                   ('insert', lambda t: t.insert_many(batch), lambda t: [t.insert_non_recursive(v) for v in batch]),
+                   ('delete', lambda t: t.delete_many(batch, False), lambda t: [t.delete(v, False) for v in batch])]
+    for description, many, singles in comparisons:
+        t_many, t_singles = timed_on_fresh_trees(many), timed_on_fresh_trees(singles)
+        print '    {:<40}{:>10.1f} ms (batch) {:>10.1f} ms (one at a time)'.format(description, 1000*t_many, 1000*t_singles)
+
+
+def bench_cold_start(N=200000, lookups=1000):
+    '''
+    Reports how long it takes to get a tree of N keys back from storage and run a
+    number of lookups on it: replaying the inserts, loading the binary format, and
+    memory-mapping it
+    '''
+    random.seed(0)
+    values = [random.randint(0, N) for _ in range(0, N)]
+    keys = [random.randint(0, N) for _ in range(0, lookups)]
+    tree = BSTNode.createTreeUsingRecursiveInsert(values)
+    fd, path = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    try:
+        with open(path, 'wb') as f:
+            bst_serialize.dump(tree, f)
+        print 'cold start, {} keys ({} bytes on disk) + {} lookups:'.format(N, os.path.getsize(path), lookups)
+        def replay():
+            t = BSTNode.createTreeUsingRecursiveInsert(values)
+            return [t.find(k) for k in keys]
+        def load():
+            with open(path, 'rb') as f:
+                t = bst_serialize.load(f)
+            return [t.find(k) for k in keys]
+        def mapped():
+            with bst_serialize.MappedBST(path) as t:
+                return [t.find(k) for k in keys]
+        for description, f in (('replaying the inserts', replay), ('bst_serialize.load', load), ('bst_serialize.MappedBST', mapped)):
+            print '    {:<40}{:>10.1f} ms'.format(description, 1000*min(timeit.repeat(f, number=1, repeat=3)))
+    finally:
+        os.remove(path)
+
+
+def bench_rendering(N=200000):
+    '''
+    Reports the time it takes to render a random tree of N keys: building the whole
+    string with to_string, streaming it with write_to, and streaming just the top
+    levels
+    '''
+    random.seed(0)
+    tree = BSTNode.createTreeUsingRecursiveInsert([random.randint(0, N) for _ in range(0, N)])
+    print 'rendering a random tree of {} keys, {} levels deep:'.format(N, tree.depth())
+    class NullFile(object):
+        def write(self, s):
+            pass
+    renderings = [('to_string', lambda: tree.to_string()),
+                  ('write_to', lambda: tree.write_to(NullFile())),
+                  ('write_to, max_depth=10', lambda: tree.write_to(NullFile(), max_depth=10)),
+                  ('write_to, max_nodes=1000', lambda: tree.write_to(NullFile(), max_nodes=1000))]
+    for description, f in renderings:
+        print '    {:<40}{:>10.1f} ms'.format(description, 1000*min(timeit.repeat(f, number=1, repeat=3)))
+
+
+def bench_concurrency(N=100000, num_of_readers=4, seconds=2.0):
+    '''
+    Reports the throughput of the thread-safe trees when num_of_readers threads
+    run finds while one writer thread runs inserts and deletes, on a tree of N keys
+    '''
+    random.seed(0)
+    values = [random.randint(0, N) for _ in range(0, N)]
+    print 'concurrency, {} reader threads + 1 writer thread, tree of {} keys:'.format(num_of_readers, N)
+    for cls in (LockedBST, RWLockedBST, ConcurrentBST):
+        tree = cls(values)
+        stop = threading.Event()
+        reads = [0]*num_of_readers
+        writes = [0]
+        def reader(i):
+            rnd = random.Random(i)
+            while not stop.is_set():
+                tree.find(rnd.randint(0, N))
+                reads[i] += 1
+        def writer():
+            rnd = random.Random(-1)
+            while not stop.is_set():
+                v = rnd.randint(0, N)
+                tree.insert(v)
+                tree.delete(v, False)
+                writes[0] += 2
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(0, num_of_readers)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        print '    {:<40}{:>10.0f} reads/s {:>10.0f} writes/s'.format(cls.__name__, sum(reads)/seconds, writes[0]/seconds)
+
+
+def bench_engines(N=100000, N_sorted=5000):
+    '''
+    Reports the time each ordered set engine takes for a number of workloads: N
+    random inserts, finds, counts and deletes, a full iteration, and N_sorted
+    inserts in sorted order (which degenerate a plain BST into a list)
+    '''
+    random.seed(0)
+    values = [random.randint(0, N) for _ in range(0, N)]
+    keys = [random.randint(0, N) for _ in range(0, N)]
+    workloads = ['insert', 'find', 'count', 'iterate', 'delete', 'sorted insert']
+    print 'ordered set engines, {} random keys ({} for sorted inserts), ms:'.format(N, N_sorted)
+    print '    {:<40}'.format('') + ''.join('{:>14}'.format(w) for w in workloads)
+    for cls in (BSTSet, SkipList, Treap, BTree):
+        tree = cls()
+        def insert():
+            for v in values:
+                tree.insert(v)
+        def delete():
+            for v in keys:
+                tree.delete(v, False)
+        def sorted_insert():
+            t = cls()
+            for v in range(0, N_sorted):
+                t.insert(v)
+        timings = [timeit.timeit(insert, number=1),
+                   timeit.timeit(lambda: [tree.find(k) for k in keys], number=1),
+                   timeit.timeit(lambda: [tree.count(k) for k in keys], number=1),
+                   timeit.timeit(lambda: sum(1 for _ in tree), number=1),
+                   timeit.timeit(delete, number=1),
+                   timeit.timeit(sorted_insert, number=1)]
+        print '    {:<40}'.format(cls.__name__) + ''.join('{:>14.1f}'.format(1000*t) for t in timings)
+
+
+def bench_instrumentation(N=100000):
+    '''
+    Reports the time N finds take on a random tree of N keys before instrumentation
+    is enabled, while it is, and after it has been disabled again
+    '''
+    random.seed(0)
+    tree = BSTNode.createTreeUsingBulkLoad([0])
+    for _ in range(0, N):
+        tree.insert_non_recursive(random.randint(0, N))
+    keys = [random.randint(0, N) for _ in range(0, N)]
+    def finds():
+        for k in keys:
+            tree.find(k)
+    print 'instrumentation, {} finds on a random tree of {} keys (degeneration {:.2f}):'.format(N, N, bst_stats.degeneration(tree))
+    print '    {:<40}{:>10.1f} ms'.format('before enabling', 1000*min(timeit.repeat(finds, number=1, repeat=3)))
+    with bst_stats.instrumented() as stats:
+        print '    {:<40}{:>10.1f} ms'.format('enabled', 1000*min(timeit.repeat(finds, number=1, repeat=3)))
+    print '    {:<40}{:>10.1f} ms'.format('after disabling', 1000*min(timeit.repeat(finds, number=1, repeat=3)))
+    print '    {:<40}{:>10.2f}'.format('nodes visited per find', stats.average_nodes_visited('find'))
+
+
+if __name__ == '__main__':
+    bench_memory()
+    bench_deep_trees()
+    bench_batches(batch_size=10000)
+    bench_batches(batch_size=100000)
+    bench_cold_start()
+    bench_rendering()
+    bench_concurrency()
+    bench_engines()
+    bench_instrumentation()
@@ -2,10 +2,12 @@
 from __future__ import unicode_literals
 
 
+import bisect
+import collections
 import random
 
 
-class BSTNode:
+class BSTNode(object):
     '''
     From Wikipedia:
         A binary search tree is a rooted binary tree, whose internal nodes each store
@@ -28,22 +30,43 @@ class BSTNode:
         - recursive that preserves the previous tree version (persistent data structures)
     * find
     * count
-    * size
+    * size (O(1): every node caches the size of the subtree rooted at it)
+    * rank, select and count_range (order statistics in O(height))
+    * floor, ceiling, predecessor and successor of a value, and range(lo, hi)
+    * next_inorder / prev_inorder: in-order cursor movement using the parent pointers
+    * insert_many, find_many, count_many and delete_many: batch versions of the above
+      that process a sorted batch in a single coordinated walk of the tree
     * delete
-    * preorder traversal. Available in four variants:
+    * preorder traversal. Available in three variants:
         - recursive     with visitor pattern
         - non-recursive --------------------
-        - recursive     with yield
-        - non-recursive ----------
+        - non-recursive with yield
+    * in-order, reverse in-order, post-order and level-order traversals (with yield)
+    * Morris variants of all the traversals with yield, that use O(1) extra memory
     * to_string: generates nice schematic of tree
+    * createTreeUsingBulkLoad: builds a minimum-height tree out of a bunch of values
+
+    Nodes use __slots__ rather than a per-instance __dict__, which cuts their memory
+    footprint by more than half. See CompactBST (compact_bst.py) for an array-backed
+    layout that does away with per-node objects altogether, and bst_serialize.py for
+    a binary file format that can be loaded back, or memory-mapped and queried as is.
     '''
 
+    __slots__ = ('parent', 'v', 'left', 'right', 'subtree_size')
+
+    # the subtrees in which further occurrences of a value held by a node may be found
+    # (see _count_sorted): duplicates only ever go to the left subtree
+    _DUPLICATES_LEFT = True
+    _DUPLICATES_RIGHT = False
+
     def __init__(self, parent, v, left=None, right=None):
+        # sanity check; inlined (rather than a method call) as this is on the hot path
+        assert not ( (v is None) and (left is None or right is None) )
         self.parent = parent
         self.v = v
         self.left = left
         self.right = right
-        self._sanity_check()
+        self.subtree_size = 1 + (0 if left is None else left.subtree_size) + (0 if right is None else right.subtree_size)
 
     @staticmethod
     def createTreeUsingRecursiveInsert(values):
@@ -53,16 +76,60 @@ class BSTNode:
         assert root.size()==len(values)
         return root
 
+    @staticmethod
+    def createTreeUsingBulkLoad(values):
+        '''
+        Builds a minimum-height tree out of the values of any (non-empty) iterable in
+        O(n log n) time, or O(n) if the values are already sorted, as Python's sort
+        is linear on sorted input. Nothing is inserted one value at a time and the
+        tree is built with an explicit stack so the recursion limit is never hit.
+
+        The sorted values are split at the middle but, since duplicates are only
+        allowed in the left subtree, the split point is moved to the closest run
+        boundary: each node holds the last occurrence of its value in its range.
+        >>> print(BSTNode.createTreeUsingBulkLoad([3, 1, 2, 2]).to_string())
+        2
+        ├─R──>3
+        └─L──>2
+              ├─R──>nil
+              └─L──>1
+        '''
+        values = sorted(values)
+        assert len(values) > 0
+        return BSTNode._bulk_build(values, 0, len(values), None)
+
+    @staticmethod
+    def _bulk_build(values, lo, hi, parent):
+        '''
+        Builds a minimum-height tree out of the sorted values[lo:hi] (with lo < hi) and
+        returns its root, whose parent pointer is set to parent
+        '''
+        i = bulk_load_split_point(values, lo, hi)
+        root = BSTNode(parent, values[i])
+        root.subtree_size = hi-lo
+        stack = [(lo, i, root, True), (i+1, hi, root, False)]
+        while stack:
+            lo, hi, parent, left_child = stack.pop()
+            if lo == hi:
+                continue
+            i = bulk_load_split_point(values, lo, hi)
+            node = BSTNode(parent, values[i])
+            node.subtree_size = hi-lo
+            if left_child:
+                parent.left = node
+            else:
+                parent.right = node
+            stack.append((lo, i, node, True))
+            stack.append((i+1, hi, node, False))
+        return root
+
 
-    def _sanity_check(self):
-        assert not ( (self.v is None) and (self.left is None or self.right is None) )
-        
-        
     def is_right_child(self):
         assert self.parent is not None
         return self.parent.right is self        
         
     def insert(self, v):
+        self.subtree_size += 1
         if self.v>=v:
             if self.left==None:
                 self.left = BSTNode(self, v)
@@ -79,6 +146,7 @@ class BSTNode:
         parent = None
         left_child = None
         while p is not None:
+            p.subtree_size += 1
             if p.v >= v:
                 parent = p
                 p = p.left
@@ -94,81 +162,293 @@ class BSTNode:
         else:
             parent.right = BSTNode(parent, v)
 
+    # what delete and insert_many insert with: bst_stats replaces insert_non_recursive
+    # while instrumentation is enabled, and must not have their inserts counted as such
+    _insert_non_recursive = insert_non_recursive
+
     def insert_persistent(self, v):
         '''
         Insert a value without modifying the original tree: returns a new tree and leaves
         the old one unmodified. This is to support persistent data structures.
+
+        Only the nodes on the path to the new value are copied (and the copies point to
+        their copied parents); all other subtrees are shared with the original tree,
+        so their parent pointers still lead into it. See PersistentBST
+        (persistent_bst.py) for a persistent tree without parent pointers that also
+        supports persistent deletes.
         '''
-        def _insert_persistent(node, parent, v):
-            if (node is None):
-                return BSTNode(parent, v)
+        path = []
+        node = self
+        while node is not None:
+            path.append(node)
+            node = node.left if node.v >= v else node.right
+        child = BSTNode(None, v)
+        for node in reversed(path):
+            if node.v >= v:
+                copy = BSTNode(None, node.v, child, node.right)
             else:
-                if (node.v>=v):
-                    return BSTNode(parent
-                                , node.v
-                                , _insert_persistent(node.left, node, v)
-                                , node.right)
-                else:
-                    return BSTNode(parent
-                                , node.v
-                                , node.left
-                                , _insert_persistent(node.right, node, v))
-        return _insert_persistent(self, self.parent, v)
+                copy = BSTNode(None, node.v, node.left, child)
+            child.parent = copy
+            child = copy
+        child.parent = self.parent
+        return child
 
     def find(self, v):
-        def _find(node, v):
-            if node is None:
-                return False
-            else:
-                if (node.v == v):
-                    return True
-                else:
-                    if (node.v > v):
-                        return _find(node.left, v)
-                    else:
-                        return _find(node.right, v)
-        return _find(self, v)
+        node = self
+        while node is not None:
+            if node.v == v:
+                return True
+            node = node.left if node.v > v else node.right
+        return False
 
     def count(self, v):
-        def _count(node, v):
-            if node is None:
-                return 0
+        rv = 0
+        node = self
+        while node is not None:
+            if node.v == v:
+                rv += 1
+                node = node.left
             else:
-                if node.v == v:
-                    return 1 + _count(node.left, v)
-                else:
-                    if node.v > v:
-                        return _count(node.left, v)
-                    else:
-                        return _count(node.right, v)
-        return _count(self, v)
+                node = node.left if node.v > v else node.right
+        return rv
 
     def max(self):
-        if self.right is None:
-            return self.v
-        else:
-            return self.right.max()
+        node = self
+        while node.right is not None:
+            node = node.right
+        return node.v
 
     def min(self):
-        if self.left is None:
-            return self.v
-        else:
-            return self.left.min()
+        node = self
+        while node.left is not None:
+            node = node.left
+        return node.v
 
     def size(self):
-        return 1 +(0 if self.left is None else self.left.size()) +(0 if self.right is None else self.right.size())
+        return self.subtree_size
+
+    def _own_size(self):
+        '''
+        How many values this node accounts for, not counting its subtrees
+        '''
+        return self.subtree_size - (0 if self.left is None else self.left.subtree_size) - (0 if self.right is None else self.right.subtree_size)
+
+    def rank(self, v):
+        '''
+        Returns the number of values in the tree that are strictly smaller than v
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print([tree.rank(v) for v in [0, 1, 2, 5, 6, 10]])
+        [0, 0, 1, 2, 4, 5]
+        '''
+        rv = 0
+        node = self
+        while node is not None:
+            if node.v < v:
+                rv += node.subtree_size - (0 if node.right is None else node.right.subtree_size)
+                node = node.right
+            else:
+                node = node.left
+        return rv
+
+    def select(self, k):
+        '''
+        Returns the k-th smallest value in the tree (counting from 0, so that
+        select(0) is the min and select(size()-1) is the max)
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print([tree.select(k) for k in range(0, 5)])
+        [1, 3, 5, 5, 9]
+        '''
+        if not (0 <= k < self.subtree_size):
+            raise IndexError('no value of rank {} in a tree of size {}'.format(k, self.subtree_size))
+        node = self
+        while True:
+            left_size = 0 if node.left is None else node.left.subtree_size
+            if k < left_size:
+                node = node.left
+            elif k < left_size + node._own_size():
+                return node.v
+            else:
+                k -= left_size + node._own_size()
+                node = node.right
+
+    def count_range(self, lo, hi):
+        '''
+        Returns the number of values v in the tree for which lo <= v < hi
+        '''
+        if not (lo < hi):
+            return 0
+        return self.rank(hi) - self.rank(lo)
+
+
+    def ceiling_node(self, v):
+        '''
+        Returns the first node in in-order whose value is >= v (None if there is none)
+        '''
+        rv = None
+        node = self
+        while node is not None:
+            if node.v >= v:
+                rv = node
+                node = node.left
+            else:
+                node = node.right
+        return rv
+
+    def floor_node(self, v):
+        '''
+        Returns the last node in in-order whose value is <= v (None if there is none)
+        '''
+        rv = None
+        node = self
+        while node is not None:
+            if node.v <= v:
+                rv = node
+                node = node.right
+            else:
+                node = node.left
+        return rv
+
+    def _strict_successor_node(self, v):
+        rv = None
+        node = self
+        while node is not None:
+            if node.v > v:
+                rv = node
+                node = node.left
+            else:
+                node = node.right
+        return rv
+
+    def _strict_predecessor_node(self, v):
+        rv = None
+        node = self
+        while node is not None:
+            if node.v < v:
+                rv = node
+                node = node.right
+            else:
+                node = node.left
+        return rv
+
+    def ceiling(self, v):
+        '''
+        Returns the smallest value >= v in the tree, or None if there is none
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print([tree.ceiling(v) for v in [0, 3, 4, 9, 10]])
+        [1, 3, 5, 9, None]
+        '''
+        node = self.ceiling_node(v)
+        return None if node is None else node.v
+
+    def floor(self, v):
+        '''
+        Returns the largest value <= v in the tree, or None if there is none
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print([tree.floor(v) for v in [0, 1, 4, 9, 10]])
+        [None, 1, 3, 9, 9]
+        '''
+        node = self.floor_node(v)
+        return None if node is None else node.v
+
+    def successor(self, v):
+        '''
+        Returns the smallest value > v in the tree (v need not be in the tree itself)
+        or None if there is none
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print([tree.successor(v) for v in [0, 3, 4, 5, 9]])
+        [1, 5, 5, 9, None]
+        '''
+        node = self._strict_successor_node(v)
+        return None if node is None else node.v
+
+    def predecessor(self, v):
+        '''
+        Returns the largest value < v in the tree (v need not be in the tree itself)
+        or None if there is none
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print([tree.predecessor(v) for v in [1, 3, 4, 5, 10]])
+        [None, 1, 3, 3, 9]
+        '''
+        node = self._strict_predecessor_node(v)
+        return None if node is None else node.v
+
+    def range(self, lo, hi):
+        '''
+        Yields, in sorted order, the nodes whose value v satisfies lo <= v < hi (one
+        node per occurrence). Only the O(height + k) nodes on the way to the k nodes
+        yielded are visited.
+        '''
+        # the stack holds the nodes >= lo whose left subtree has been dealt with, and
+        # never more than O(height) of them
+        stack = []
+        node = self
+        while node is not None:
+            if node.v >= lo:
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        while stack:
+            node = stack.pop()
+            if not (node.v < hi):
+                return
+            yield node
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+    def next_inorder(self):
+        '''
+        Returns the node that follows this one in in-order (None if this is the last
+        one), in O(height) time (O(1) amortized over a full scan) and without a stack,
+        by means of the parent pointers. As a cursor:
+            node = tree.ceiling_node(lo)
+            while node is not None and node.v < hi:
+                ...
+                node = node.next_inorder()
+
+        Note that the trees returned by insert_persistent share subtrees with the trees
+        they are derived from and the parent pointers of those shared subtrees lead into
+        the original tree; use range (which needs no parent pointers) on such trees.
+        '''
+        if self.right is not None:
+            node = self.right
+            while node.left is not None:
+                node = node.left
+            return node
+        node = self
+        while node.parent is not None and node.parent.right is node:
+            node = node.parent
+        return node.parent
+
+    def prev_inorder(self):
+        '''
+        Returns the node that precedes this one in in-order (None if this is the first
+        one); see next_inorder
+        '''
+        if self.left is not None:
+            node = self.left
+            while node.right is not None:
+                node = node.right
+            return node
+        node = self
+        while node.parent is not None and node.parent.left is node:
+            node = node.parent
+        return node.parent
 
 
-    def preorder_traversal(self, f): # TODO: write test cases
+    def preorder_traversal(self, f):
         '''
         Root, Left, Right
         '''
-        if (self is not None):
-            f(self)
-            preorder_traversal(self.left)
-            preorder_traversal(self.right)
+        f(self)
+        if self.left is not None:
+            self.left.preorder_traversal(f)
+        if self.right is not None:
+            self.right.preorder_traversal(f)
 
-    def preorder_traversal_nonrecur(self, f): # TODO: write test cases
+    def preorder_traversal_nonrecur(self, f):
         stack = []
 
         stack.append(self)
@@ -176,21 +456,18 @@ class BSTNode:
             node = stack.pop()
             f(node)
             if node.right:
-                stack.push(node.right)
+                stack.append(node.right)
             if node.left:
-                stack.push(node.left)
+                stack.append(node.left)
 
     def preorder_traversal_yield(self):
         '''
         Root, Left, Right
+
+        Used to be a recursive generator, which costs O(depth) generator hops for every
+        node yielded; it is now simply the non-recursive variant.
         '''
-        yield self
-        if self.left:
-            for x in self.left.preorder_traversal_yield():
-                yield x
-        if self.right:
-            for x in self.right.preorder_traversal_yield():
-                yield x           
+        return self.preorder_traversal_nonrecur_yield()
 
 
     def preorder_traversal_nonrecur_yield(self):
@@ -204,58 +481,484 @@ class BSTNode:
                 stack.append(node.right)
             if node.left:
                 stack.append(node.left)
-                
+
+    def inorder_traversal_yield(self):
+        '''
+        Left, Root, Right (i.e. the values in sorted order)
+        '''
+        stack = []
+        node = self
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node
+                node = node.right
+
+    def reverse_inorder_traversal_yield(self):
+        '''
+        Right, Root, Left (i.e. the values in reverse sorted order)
+        '''
+        stack = []
+        node = self
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.right
+            else:
+                node = stack.pop()
+                yield node
+                node = node.left
+
+    def postorder_traversal_yield(self):
+        '''
+        Left, Right, Root
+        '''
+        stack = []
+        last_yielded = None
+        node = self
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                top = stack[-1]
+                if top.right is not None and top.right is not last_yielded:
+                    node = top.right
+                else:
+                    stack.pop()
+                    yield top
+                    last_yielded = top
+
+    def levelorder_traversal_yield(self):
+        '''
+        Breadth-first: level by level, each level from left to right
+        '''
+        queue = collections.deque([self])
+        while queue:
+            node = queue.popleft()
+            yield node
+            if node.left is not None:
+                queue.append(node.left)
+            if node.right is not None:
+                queue.append(node.right)
+
+    # The Morris traversals below need no stack (or queue): they temporarily thread
+    # the tree, making the right pointer of the in-order predecessor of a node point
+    # back to the node (mirrored for the reverse in-order traversal), and remove each
+    # thread on the way back up. The tree is therefore modified while such a traversal
+    # is in progress and must be neither read nor modified by anything else until the
+    # traversal is over. A traversal that is abandoned half-way (i.e. its generator is
+    # closed or garbage-collected) runs to completion silently so that all the threads
+    # are removed.
+
+    def _morris_inorder(self, reverse):
+        near, far = ('right', 'left') if reverse else ('left', 'right')
+        node = self
+        while node is not None:
+            if getattr(node, near) is None:
+                yield node
+                node = getattr(node, far)
+            else:
+                predecessor = getattr(node, near)
+                while getattr(predecessor, far) is not None and getattr(predecessor, far) is not node:
+                    predecessor = getattr(predecessor, far)
+                if getattr(predecessor, far) is None:
+                    setattr(predecessor, far, node)
+                    node = getattr(node, near)
+                else:
+                    setattr(predecessor, far, None)
+                    yield node
+                    node = getattr(node, far)
+
+    def _morris_preorder_with_depth(self):
+        '''
+        Yields (node, depth) pairs in preorder. On returning to a node through a
+        thread, the number of steps taken to find its predecessor again tells how many
+        levels we have gone back up.
+        '''
+        node = self
+        depth = 0
+        while node is not None:
+            if node.left is None:
+                yield node, depth
+                node = node.right
+                depth += 1
+            else:
+                predecessor = node.left
+                steps = 0
+                while predecessor.right is not None and predecessor.right is not node:
+                    predecessor = predecessor.right
+                    steps += 1
+                if predecessor.right is None:
+                    yield node, depth
+                    predecessor.right = node
+                    node = node.left
+                    depth += 1
+                else:
+                    # we got here from the predecessor, which is 1+steps levels further down
+                    predecessor.right = None
+                    depth -= steps+2
+                    node = node.right
+                    depth += 1
+
+    def _morris_postorder(self):
+        dummy = BSTNode(None, self.v, self)
+        node = dummy
+        while node is not None:
+            if node.left is None:
+                node = node.right
+            else:
+                predecessor = node.left
+                while predecessor.right is not None and predecessor.right is not node:
+                    predecessor = predecessor.right
+                if predecessor.right is None:
+                    predecessor.right = node
+                    node = node.left
+                else:
+                    # yield the right spine from node.left down to predecessor bottom-up, by
+                    # reversing its right pointers and then restoring them on the way back
+                    predecessor.right = None
+                    previous, spine = None, node.left
+                    while spine is not None:
+                        spine.right, previous, spine = previous, spine, spine.right
+                    previous, spine = None, predecessor
+                    while spine is not None:
+                        yield spine
+                        spine.right, previous, spine = previous, spine, spine.right
+                    node = node.right
+
+    def inorder_traversal_morris(self):
+        return _run_to_completion_on_close(self._morris_inorder(False))
+
+    def reverse_inorder_traversal_morris(self):
+        return _run_to_completion_on_close(self._morris_inorder(True))
+
+    def preorder_traversal_morris(self):
+        return _run_to_completion_on_close(node for node, depth in self._morris_preorder_with_depth())
+
+    def postorder_traversal_morris(self):
+        return _run_to_completion_on_close(self._morris_postorder())
+
+    def levelorder_traversal_morris(self):
+        '''
+        One Morris preorder pass per level, yielding only the nodes of that level, so
+        this takes O(n * depth) time in exchange for O(1) extra memory
+        '''
+        level = 0
+        while True:
+            walk = self._morris_preorder_with_depth()
+            deeper_levels_exist = False
+            try:
+                for node, depth in walk:
+                    if depth == level:
+                        yield node
+                    elif depth > level:
+                        deeper_levels_exist = True
+            finally:
+                for _ in walk:
+                    pass
+            if not deeper_levels_exist:
+                return
+            level += 1
     
     def delete(self, v, delete_all):
+        '''
+        Deletes one occurrence of v (or all of them, if delete_all is True) and returns
+        the number of values deleted.
+
+        The topmost node holding v takes over the largest value of its left subtree,
+        or, if it has none, the smallest value of its right subtree; the node that held
+        that value is then deleted in turn, and so on down to a leaf, which is
+        unlinked (so the root of the tree never changes identity). When a node takes
+        over the smallest value of its right subtree, the other occurrences of that
+        value in the right subtree are moved to its left subtree afterwards, as
+        duplicates are only allowed on the left.
+
+        This used to be recursive; it is now a loop (see _delete_one), which deletes
+        exactly as the recursion did, down to the shape of the tree.
+        '''
         assert delete_all is True or delete_all is False
-        def _delete(node, v):
-            if node is None:
-                return 0
+        howManyWereDeleted = 0
+        while self._delete_one(v):
+            howManyWereDeleted += 1
+            if not delete_all:
+                break
+        return howManyWereDeleted
+
+    def _delete_one(self, v):
+        '''
+        Deletes the topmost node holding v as delete does; returns False if there is no
+        such node. The recursion is unrolled into the loop of _remove and a stack of the
+        tasks it would do on its way back up: moving a duplicate out of a right subtree
+        (False, node, value), then inserting it on the left (True, node, value).
+        '''
+        node, parent = self._topmost_node(v)
+        if node is None:
+            return False
+        if node.left is None and node.right is None and node.parent is None:
+            raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+        tasks = []
+        BSTNode._remove(node, parent, tasks)
+        while tasks:
+            insert, node, v = tasks.pop()
+            if insert:
+                node._insert_non_recursive(v)
+                tasks.append((False, node, v))
+                continue
+            if node.right is None:
+                continue
+            duplicate, parent = node.right._topmost_node(v)
+            if duplicate is not None:
+                node.subtree_size -= 1
+                tasks.append((True, node, v))
+                BSTNode._remove(duplicate, node if parent is None else parent, tasks)
+        return True
+
+    def _topmost_node(self, v):
+        '''
+        Returns the topmost node holding v (None if there is none) and its parent (None
+        if it is this node). The subtree sizes along the way are decremented if there
+        is such a node.
+        '''
+        path = []
+        node = self
+        while node is not None and node.v != v:
+            path.append(node)
+            node = node.left if node.v > v else node.right
+        if node is None:
+            return None, None
+        for p in path:
+            p.subtree_size -= 1
+        return node, (path[-1] if path else None)
+
+    @staticmethod
+    def _remove(node, parent, tasks):
+        '''
+        Removes the value of node (whose parent is parent, or node.parent if None) by
+        shifting values up a chain of nodes down to a leaf, which is unlinked; see
+        delete. Pushes onto tasks the duplicates that must be moved afterwards.
+        '''
+        while True:
+            node.subtree_size -= 1
+            if node.left is not None:
+                # the largest value of the left subtree, at the bottom of its right spine
+                parent = node
+                child = node.left
+                while child.right is not None:
+                    child.subtree_size -= 1
+                    parent = child
+                    child = child.right
+            elif node.right is not None:
+                # the smallest value of the right subtree, at the bottom of its left
+                # spine; the topmost node holding it is the first one on the spine to
+                spine = [node.right]
+                while spine[-1].left is not None:
+                    spine.append(spine[-1].left)
+                m = spine[-1].v
+                parent = node
+                for child in spine:
+                    if child.v == m:
+                        break
+                    child.subtree_size -= 1
+                    parent = child
+                tasks.append((False, node, m))
             else:
-                if node.v == v:
-                    if node.left is not None:
-                        maxInLeft = node.left.max()
-                        node.v = maxInLeft
-                        assert _delete(node.left, maxInLeft) is 1
-                    elif node.right is not None:
-                        minInRight = node.right.min()
-                        node.v = minInRight
-                        assert _delete(node.right, minInRight) is 1
-                        # we're not done yet, there may be more values equal to minInRight in the right subTree
-                        # and now that we've placed this value in the root, we have to suck them all into the
-                        # left subtree. This is because equality is only allowed for left subtree values, not
-                        # right subtree values: all values in the right subtree must be strictly greater than
-                        # the value of the root
-                        while (_delete(node.right, minInRight) is 1):
-                            node.insert(minInRight)
+                parent = node.parent if parent is None else parent
+                if parent.right is node:
+                    parent.right = None
+                else:
+                    parent.left = None
+                return
+            node.v = child.v
+            node = child
+    
+
+    def _take_over(self, other):
+        '''
+        Makes this node take the place of node other (i.e. take over its value and its
+        subtrees) without changing the identity of this node
+        '''
+        self.v = other.v
+        self.left = other.left
+        self.right = other.right
+        self.subtree_size = other.subtree_size
+        if self.left is not None:
+            self.left.parent = self
+        if self.right is not None:
+            self.right.parent = self
+
+    @staticmethod
+    def _sorted_distinct(values):
+        '''
+        Returns the distinct values in sorted order, and, for every position in values,
+        the index of its value among the distinct ones
+        '''
+        keys = []
+        slots = [0]*len(values)
+        for i in sorted(range(0, len(values)), key=values.__getitem__):
+            if not keys or keys[-1] != values[i]:
+                keys.append(values[i])
+            slots[i] = len(keys)-1
+        return keys, slots
+
+    def _occurrences(self):
+        '''
+        Returns the number of occurrences of its value that this node holds
+        '''
+        return 1
+
+    def _count_sorted(self, keys, all_occurrences):
+        '''
+        Counts the occurrences (or, if all_occurrences is False, just notes the presence)
+        of each of the sorted, distinct keys in a single walk of the tree: each node is
+        visited once for the whole range of keys whose search paths go through it.
+        Subclasses that keep their duplicates elsewhere set _DUPLICATES_LEFT and
+        _DUPLICATES_RIGHT accordingly.
+        '''
+        # the subtrees in which to go on looking for a key found at a node
+        more_left = all_occurrences and self._DUPLICATES_LEFT
+        more_right = all_occurrences and self._DUPLICATES_RIGHT
+        counts = [0]*len(keys)
+        stack = [(self, 0, len(keys))] if keys else []
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi-lo == 1:
+                # a single key left: finish its search with a plain descent
+                k = keys[lo]
+                while node is not None:
+                    if node.v == k:
+                        counts[lo] += node._occurrences()
+                        if more_right and node.right is not None:
+                            stack.append((node.right, lo, hi))
+                        node = node.left if more_left else None
                     else:
-                        if node.parent is None:
-                            raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
-                        else:
-                            if node.is_right_child():
-                                node.parent.right = None
-                            else:
-                                node.parent.left = None
-                    return 1
-                elif node.v > v:
-                    return _delete(node.left, v)
+                        node = node.left if node.v > k else node.right
+                continue
+            i = bisect.bisect_left(keys, node.v, lo, hi)
+            j = i
+            if i < hi and keys[i] == node.v:
+                counts[i] += node._occurrences()
+                j = i+1
+            left_hi = j if more_left else i
+            right_lo = i if more_right else j
+            if node.left is not None and lo < left_hi:
+                stack.append((node.left, lo, left_hi))
+            if node.right is not None and right_lo < hi:
+                stack.append((node.right, right_lo, hi))
+        return counts
+
+    def find_many(self, values):
+        '''
+        Returns a list with the result of find for each of the values
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print(tree.find_many([9, 2, 5, 9]))
+        [True, False, True, True]
+        '''
+        values = list(values)
+        keys, slots = BSTNode._sorted_distinct(values)
+        found = self._count_sorted(keys, False)
+        return [found[slot] > 0 for slot in slots]
+
+    def count_many(self, values):
+        '''
+        Returns a list with the result of count for each of the values
+        >>> tree = BSTNode.createTreeUsingRecursiveInsert([5, 1, 5, 9, 3])
+        >>> print(tree.count_many([9, 2, 5, 9]))
+        [1, 0, 2, 1]
+        '''
+        values = list(values)
+        keys, slots = BSTNode._sorted_distinct(values)
+        counts = self._count_sorted(keys, True)
+        return [counts[slot] for slot in slots]
+
+    def insert_many(self, values):
+        '''
+        Inserts all the values. The sorted batch is split at every node it reaches so
+        that the values headed for an empty subtree are bulk-loaded into a balanced
+        subtree in one go. A batch at least as large as the tree is merged with it and
+        the whole tree is rebuilt (balanced) instead.
+        '''
+        values = sorted(values)
+        if not values:
+            return
+        if len(values) >= self.subtree_size:
+            merged = [node.v for node in self.inorder_traversal_yield()]
+            merged.extend(values)
+            merged.sort() # two sorted runs: merged in linear time
+            self._take_over(BSTNode._bulk_build(merged, 0, len(merged), self.parent))
+            return
+        stack = [(self, 0, len(values))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi-lo == 1:
+                node._insert_non_recursive(values[lo])
+                continue
+            node.subtree_size += hi-lo
+            i = bisect.bisect_right(values, node.v, lo, hi)
+            if lo < i:
+                if node.left is None:
+                    node.left = BSTNode._bulk_build(values, lo, i, node)
+                else:
+                    stack.append((node.left, lo, i))
+            if i < hi:
+                if node.right is None:
+                    node.right = BSTNode._bulk_build(values, i, hi, node)
                 else:
-                    return _delete(node.right, v)
-        if delete_all:
-            howManyWereDeleted = 0
-            while (_delete(self, v) is 1):
-                howManyWereDeleted += 1
-            return howManyWereDeleted
+                    stack.append((node.right, i, hi))
+
+    def delete_many(self, values, delete_all):
+        '''
+        Deletes the values and returns a list with the number of values deleted for
+        each of them, as if delete had been called for each one in turn. Which values
+        are present is established with a single coordinated walk. If they make up a
+        large part of the tree, the tree is rebuilt (balanced) without them; otherwise
+        they are deleted one by one.
+        '''
+        assert delete_all is True or delete_all is False
+        values = list(values)
+        keys, slots = BSTNode._sorted_distinct(values)
+        present = self._count_sorted(keys, True)
+        to_delete = [0]*len(keys)
+        rv = [0]*len(values)
+        for i, slot in enumerate(slots):
+            if delete_all:
+                howMany = present[slot] - to_delete[slot]
+            else:
+                howMany = 1 if to_delete[slot] < present[slot] else 0
+            to_delete[slot] += howMany
+            rv[i] = howMany
+        total = sum(to_delete)
+        if total == self.subtree_size:
+            raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+        if 2*total >= self.subtree_size:
+            survivors = []
+            k = 0
+            for node in self.inorder_traversal_yield():
+                while k < len(keys) and keys[k] < node.v:
+                    k += 1
+                if k < len(keys) and keys[k] == node.v and to_delete[k] > 0:
+                    to_delete[k] -= 1
+                else:
+                    survivors.append(node.v)
+            self._take_over(BSTNode._bulk_build(survivors, 0, len(survivors), self.parent))
         else:
-            return _delete(self, v)
-    
+            for key, howMany in zip(keys, to_delete):
+                for _ in range(0, howMany):
+                    self._delete_one(key)
+        return rv
 
     def visit_RL(self, visitor, depth=0):
-        visitor.visit(self.parent, depth, None if self.parent is None else self.is_right_child(), self)
-        if self.right != None:
-            self.right.visit_RL(visitor, depth+1)
-        if self.left != None:
-            self.left.visit_RL(visitor, depth+1)
+        stack = [(self, depth)]
+        while stack:
+            node, depth = stack.pop()
+            visitor.visit(node.parent, depth, None if node.parent is None else node.is_right_child(), node)
+            if node.left is not None:
+                stack.append((node.left, depth+1))
+            if node.right is not None:
+                stack.append((node.right, depth+1))
 
     def to_string(self):
         '''
@@ -268,43 +971,39 @@ class BSTNode:
         ├─R──>3
         └─L──>1
         '''
-        return '\n'.join(self._to_string(0))
+        return '\n'.join(self._to_string())
 
-    def _to_string(self, depth):
-        T = u'\u251c'
-        L = u'\u2514'
-        bar = u'\u2500'
-        def adornR(x):
-            if (x[0]==0):
-                return T+bar+'R'+(2*bar)+'>'+x[1]
-            else:
-                return '|     '+x[1]
+    def write_to(self, f, max_depth=None, max_nodes=None):
+        '''
+        Streams the stringification of the BST to the (text) file object f; without
+        limits, what is written is identical to what to_string returns. The
+        rendering can be cut short at a given depth and/or number of nodes; see
+        iter_to_string_lines.
+        >>> import io
+        >>> n = BSTNode.createTreeUsingRecursiveInsert([4, 2, 6, 1, 3, 5, 7])
+        >>> f = io.StringIO()
+        >>> n.write_to(f, max_depth=1)
+        >>> print(f.getvalue())
+        4
+        ├─R──>6
+        |     └─... (2 values below)
+        └─L──>2
+              └─... (2 values below)
+        >>> f = io.StringIO()
+        >>> n.write_to(f, max_nodes=3)
+        >>> print(f.getvalue())
+        4
+        ├─R──>6
+        |     ├─R──>7
+        ... (4 more values not shown)
+        '''
+        write_lines(iter_to_string_lines(self, max_depth, max_nodes), f)
 
-        def adornL(x):
-            if (x[0]==0):
-                return L+bar+'L'+(2*bar)+'>'+x[1]
-            else:
-                return '      '+x[1]            
-            
-        rv = []
-        rv.append(str(self.v))
-        if (not (self.right is None and self.left is None)):
-            if (self.right is None):
-                x = [T+bar+'R'+(2*bar)+'>nil']
-            else:
-                right_subtree_strings = self.right._to_string(depth+1)
-                x = map(adornR,
-                        [x for x in enumerate(right_subtree_strings)]) # purposefully use a different idiom than in sse-1530890265
-            rv.extend(x)
-            if (self.left is None):
-                x = [L+bar+'L'+(2*bar)+'>nil']            
-            else:
-                left_subtree_strings = self.left._to_string(depth+1)
-                x = map(adornL
-                        , zip(range(0, len(left_subtree_strings)) # sse-1530890265 (another passable idiom)
-                              , left_subtree_strings))
-            rv.extend(x)
-        return rv
+    def _label(self):
+        return str(self.v)
+
+    def _to_string(self):
+        return to_string_lines(self)
 
     def depth(self):
         '''
@@ -331,14 +1030,142 @@ class BSTNode:
         >>> print(n.depth())
         3
         '''        
-        return max(0
-                   , 1+self.left.depth()  if self.left  is not None else 0
-                   , 1+self.right.depth() if self.right is not None else 0)
+        rv = 0
+        stack = [(self, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth > rv:
+                rv = depth
+            if node.left is not None:
+                stack.append((node.left, depth+1))
+            if node.right is not None:
+                stack.append((node.right, depth+1))
+        return rv
 
     def pathTo(self, x):
         pass # todo
 
 
+class OneByOneBatchUpdates(object):
+    '''
+    insert_many and delete_many for the subclasses of BSTNode that cannot have a
+    batch bulk-loaded into their empty subtrees, or be rebuilt around it, the way
+    BSTNode does (AVLNode must stay balanced, CountedBSTNode keeps one node per
+    distinct key): the values are inserted or deleted one at a time, which costs
+    exactly what the individual calls would. find_many and count_many are inherited
+    from BSTNode as they are.
+    '''
+
+    def insert_many(self, values):
+        for v in values:
+            self.insert(v)
+
+    def delete_many(self, values, delete_all):
+        return [self.delete(v, delete_all) for v in values]
+
+
+def bulk_load_split_point(values, lo, hi):
+    '''
+    Returns the index of the value to place at the root of a minimum-height tree
+    holding the sorted values[lo:hi]: the middle one, moved to the closest run boundary
+    so that all the values after it are strictly greater (duplicates may only appear
+    in the left subtree)
+    '''
+    mid = (lo+hi)//2
+    last_of_run = bisect.bisect_right(values, values[mid], lo, hi)-1
+    last_of_previous_run = bisect.bisect_left(values, values[mid], lo, hi)-1
+    if (last_of_previous_run >= lo) and (mid-last_of_previous_run < last_of_run-mid):
+        return last_of_previous_run
+    else:
+        return last_of_run
+
+
+def to_string_lines(root, max_depth=None, max_nodes=None):
+    '''
+    Returns the lines of BSTNode.to_string for the tree rooted at root; see
+    iter_to_string_lines
+    '''
+    return list(iter_to_string_lines(root, max_depth, max_nodes))
+
+
+def iter_to_string_lines(root, max_depth=None, max_nodes=None):
+    '''
+    Yields the lines of BSTNode.to_string for the tree rooted at root, one at a time,
+    in a single pass over the tree: the memory used is O(height) whatever the size of
+    the tree. Only the left and right attributes and the _label method of the nodes
+    (and subtree_size, when something is elided) are used, so other kinds of nodes can
+    be rendered too. Every node is given two prefixes by its parent: one for its own
+    line and one for the lines of its subtrees.
+
+    The rendering can be cut short:
+    * the children of the nodes at depth max_depth are not shown; a single line
+      stands for them that says how many values they hold
+    * after max_nodes nodes have been shown, a last line says how many values have
+      not been shown
+    Without limits, the lines are exactly those of the full rendering.
+    '''
+    T = u'\u251c'
+    L = u'\u2514'
+    bar = u'\u2500'
+    R_branch = T+bar+'R'+(2*bar)+'>'
+    L_branch = L+bar+'L'+(2*bar)+'>'
+    nodes_shown = 0
+    # a stack item is either (node, prefix of its line, prefix of its subtree lines, depth)
+    # or (None, a complete line, None, None) for the nil placeholders
+    stack = [(root, '', '', 0)]
+    while stack:
+        node, first, rest, depth = stack.pop()
+        if node is None:
+            yield first
+            continue
+        if max_nodes is not None and nodes_shown == max_nodes:
+            stack.append((node, first, rest, depth))
+            not_shown = sum(x[0].subtree_size for x in stack if x[0] is not None)
+            yield '... ({} more values not shown)'.format(not_shown)
+            return
+        yield first+node._label()
+        nodes_shown += 1
+        if (not (node.right is None and node.left is None)):
+            if max_depth is not None and depth == max_depth:
+                elided = sum(x.subtree_size for x in (node.left, node.right) if x is not None)
+                yield rest+L+bar+'... ({} values below)'.format(elided)
+                continue
+            # pushed in reverse order: the right subtree is printed first
+            if (node.left is None):
+                stack.append((None, rest+L_branch+'nil', None, None))
+            else:
+                stack.append((node.left, rest+L_branch, rest+'      ', depth+1))
+            if (node.right is None):
+                stack.append((None, rest+R_branch+'nil', None, None))
+            else:
+                stack.append((node.right, rest+R_branch, rest+'|     ', depth+1))
+
+
+def write_lines(lines, f):
+    '''
+    Writes the lines to the file object f, separated by newlines (no newline after
+    the last one, as in '\n'.join(lines)), without ever holding more than one of them
+    '''
+    separator = ''
+    for line in lines:
+        f.write(separator)
+        f.write(line)
+        separator = '\n'
+
+
+def _run_to_completion_on_close(walk):
+    '''
+    Yields what walk yields; if closed early, exhausts walk before returning so that a
+    Morris traversal gets to remove the threads it has added to the tree
+    '''
+    try:
+        for x in walk:
+            yield x
+    finally:
+        for _ in walk:
+            pass
+
+
 # +-------------------------------------------+
 # |                                           |
 # |         U N I T    T E S T S              |
@@ -346,6 +1173,164 @@ class BSTNode:
 # +-------------------------------------------+
 
 import unittest
+
+# The recursive implementations the loop-based methods of BSTNode replaced. They are
+# kept here as reference implementations which the loop-based ones are verified against.
+
+def recursive_find(node, v):
+    if node is None:
+        return False
+    elif node.v == v:
+        return True
+    else:
+        return recursive_find(node.left if node.v > v else node.right, v)
+
+def recursive_count(node, v):
+    if node is None:
+        return 0
+    elif node.v == v:
+        return 1 + recursive_count(node.left, v)
+    else:
+        return recursive_count(node.left if node.v > v else node.right, v)
+
+def recursive_max(node):
+    return node.v if node.right is None else recursive_max(node.right)
+
+def recursive_min(node):
+    return node.v if node.left is None else recursive_min(node.left)
+
+def recursive_depth(node):
+    return max(0
+               , 1+recursive_depth(node.left)  if node.left  is not None else 0
+               , 1+recursive_depth(node.right) if node.right is not None else 0)
+
+def recursive_preorder(node):
+    yield node
+    if node.left:
+        for x in recursive_preorder(node.left):
+            yield x
+    if node.right:
+        for x in recursive_preorder(node.right):
+            yield x
+
+def recursive_inorder(node):
+    if node.left:
+        for x in recursive_inorder(node.left):
+            yield x
+    yield node
+    if node.right:
+        for x in recursive_inorder(node.right):
+            yield x
+
+def recursive_postorder(node):
+    if node.left:
+        for x in recursive_postorder(node.left):
+            yield x
+    if node.right:
+        for x in recursive_postorder(node.right):
+            yield x
+    yield node
+
+def levelorder_by_depth(tree):
+    nodes = [(depth, i, node) for i, (node, depth) in enumerate(tree._morris_preorder_with_depth())]
+    return [node for depth, i, node in sorted(nodes)]
+
+def recursive_visit_RL(node, visitor, depth=0):
+    visitor.visit(node.parent, depth, None if node.parent is None else node.is_right_child(), node)
+    if node.right != None:
+        recursive_visit_RL(node.right, visitor, depth+1)
+    if node.left != None:
+        recursive_visit_RL(node.left, visitor, depth+1)
+
+def recursive_to_string(node):
+    T = u'\u251c'
+    L = u'\u2514'
+    bar = u'\u2500'
+    rv = [node._label()]
+    if (not (node.right is None and node.left is None)):
+        if (node.right is None):
+            rv.append(T+bar+'R'+(2*bar)+'>nil')
+        else:
+            rv.extend([(T+bar+'R'+(2*bar)+'>' if i==0 else '|     ')+x for i, x in enumerate(recursive_to_string(node.right))])
+        if (node.left is None):
+            rv.append(L+bar+'L'+(2*bar)+'>nil')
+        else:
+            rv.extend([(L+bar+'L'+(2*bar)+'>' if i==0 else '      ')+x for i, x in enumerate(recursive_to_string(node.left))])
+    return rv
+
+def recursive_insert_persistent(node, parent, v):
+    if (node is None):
+        return BSTNode(parent, v)
+    elif (node.v>=v):
+        return BSTNode(parent, node.v, recursive_insert_persistent(node.left, node, v), node.right)
+    else:
+        return BSTNode(parent, node.v, node.left, recursive_insert_persistent(node.right, node, v))
+
+def recursive_delete(tree, v, delete_all):
+    '''
+    The recursive delete that BSTNode.delete replaced, verbatim
+    '''
+    assert delete_all is True or delete_all is False
+    def _delete(node, v):
+        if node is None:
+            return 0
+        else:
+            if node.v == v:
+                if node.left is not None:
+                    maxInLeft = node.left.max()
+                    node.v = maxInLeft
+                    assert _delete(node.left, maxInLeft) is 1
+                elif node.right is not None:
+                    minInRight = node.right.min()
+                    node.v = minInRight
+                    assert _delete(node.right, minInRight) is 1
+                    # we're not done yet, there may be more values equal to minInRight in the right subTree
+                    # and now that we've placed this value in the root, we have to suck them all into the
+                    # left subtree. This is because equality is only allowed for left subtree values, not
+                    # right subtree values: all values in the right subtree must be strictly greater than
+                    # the value of the root
+                    while (_delete(node.right, minInRight) is 1):
+                        node.insert(minInRight)
+                else:
+                    if node.parent is None:
+                        raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+                    else:
+                        if node.is_right_child():
+                            node.parent.right = None
+                        else:
+                            node.parent.left = None
+                return 1
+            elif node.v > v:
+                return _delete(node.left, v)
+            else:
+                return _delete(node.right, v)
+    if delete_all:
+        howManyWereDeleted = 0
+        while (_delete(tree, v) is 1):
+            howManyWereDeleted += 1
+        return howManyWereDeleted
+    else:
+        return _delete(tree, v)
+
+def degenerate_tree(N):
+    '''
+    Returns a tree holding 0..N-1 in which every node is the right child of its
+    predecessor, i.e. what inserting sorted values yields, without the O(N^2) cost
+    '''
+    node = None
+    for v in range(N-1, -1, -1):
+        node = BSTNode(None, v, None, node)
+        if node.right is not None:
+            node.right.parent = node
+    return node
+
+class RecordingVisitor:
+    def __init__(self):
+        self.visits = []
+    def visit(self, parent, depth, is_right_child, node):
+        self.visits.append((parent, depth, is_right_child, node))
+
+
 class UnitTestCases(unittest.TestCase):
 
     def test_tree_creation(self):
@@ -603,6 +1588,293 @@ class UnitTestCases(unittest.TestCase):
         self.assertSequenceEqual(nodes_visited1, nodes_visited2)
         self.assertSequenceEqual(nodes_visited1, [2, 1, 0, 0, 0, 17, 16, 5, 4, 10, 9, 9, 9, 13, 16, 16, 15, 17, 19, 18])
 
+    def assert_left_duplicates_invariant(self, tree):
+        stack = [(tree, None, None)]
+        while stack:
+            node, lo, hi = stack.pop()
+            self.assertTrue(lo is None or node.v > lo)
+            self.assertTrue(hi is None or node.v <= hi)
+            if node.left is not None:
+                self.assertIs(node.left.parent, node)
+                stack.append((node.left, lo, node.v))
+            if node.right is not None:
+                self.assertIs(node.right.parent, node)
+                stack.append((node.right, node.v, hi))
+
+    def test_bulk_load(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, num_of_nodes/3) for _ in range(0, num_of_nodes)]
+            tree = BSTNode.createTreeUsingBulkLoad(iter(random_values))
+            self.assert_left_duplicates_invariant(tree)
+            self.assertEqual(tree.size(), num_of_nodes)
+            for f in range(-1, num_of_nodes/3+2):
+                self.assertEqual(tree.find(f), f in random_values)
+                self.assertEqual(tree.count(f), random_values.count(f))
+            indexOfOnlyValueToNotDelete = random.randint(0, len(random_values)-1)
+            for i in range(0, len(random_values)):
+                if i != indexOfOnlyValueToNotDelete:
+                    self.assertIs(tree.delete(random_values[i], False), 1)
+            self.assertEqual(tree.v, random_values[indexOfOnlyValueToNotDelete])
+            self.assertEqual(tree.size(), 1)
+
+    def assert_subtree_sizes(self, tree):
+        for node in tree.preorder_traversal_nonrecur_yield():
+            self.assertEqual(node.subtree_size, len(list(node.preorder_traversal_nonrecur_yield())))
+
+    def test_subtree_sizes_are_maintained(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 61):
+            random_values = [random.randint(0, 12) for _ in range(0, num_of_nodes)]
+            tree1 = BSTNode(None, random_values[0])
+            tree2 = BSTNode(None, random_values[0])
+            tree3 = BSTNode(None, random_values[0])
+            for v in random_values[1:]:
+                tree1.insert(v)
+                tree2.insert_non_recursive(v)
+                treeOld = tree3
+                tree3 = tree3.insert_persistent(v)
+                self.assertEqual(treeOld.size(), tree3.size()-1)
+            for tree in (tree1, tree2, tree3, BSTNode.createTreeUsingBulkLoad(random_values)):
+                self.assert_subtree_sizes(tree)
+                self.assertEqual(tree.size(), num_of_nodes)
+            for v in random_values[1:]:
+                delete_all = random.choice([False, True])
+                if tree1.size() > (tree1.count(v) if delete_all else 1):
+                    tree1.delete(v, delete_all)
+                    self.assert_subtree_sizes(tree1)
+
+    def test_rank_select_and_count_range(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            sorted_values = sorted(random_values)
+            for tree in (BSTNode.createTreeUsingRecursiveInsert(random_values),
+                         BSTNode.createTreeUsingBulkLoad(random_values)):
+                self.assertSequenceEqual([tree.select(k) for k in range(0, num_of_nodes)], sorted_values)
+                self.assertRaises(IndexError, tree.select, num_of_nodes)
+                self.assertRaises(IndexError, tree.select, -1)
+                for v in range(-1, 23):
+                    self.assertEqual(tree.rank(v), len([x for x in random_values if x < v]))
+                    for w in range(v, v+5):
+                        self.assertEqual(tree.count_range(v, w), len([x for x in random_values if v <= x < w]))
+                self.assertEqual(tree.count_range(5, 4), 0)
+
+    def test_loop_based_operations_agree_with_the_recursive_ones(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 81):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            for f in range(-1, 22):
+                self.assertEqual(tree.find(f), recursive_find(tree, f))
+                self.assertEqual(tree.count(f), recursive_count(tree, f))
+            self.assertEqual(tree.max(), recursive_max(tree))
+            self.assertEqual(tree.min(), recursive_min(tree))
+            self.assertEqual(tree.depth(), recursive_depth(tree))
+            self.assertSequenceEqual(list(tree.preorder_traversal_yield()), list(recursive_preorder(tree)))
+            self.assertSequenceEqual(tree._to_string(), recursive_to_string(tree))
+            visitor1, visitor2 = RecordingVisitor(), RecordingVisitor()
+            tree.visit_RL(visitor1)
+            recursive_visit_RL(tree, visitor2)
+            self.assertSequenceEqual(visitor1.visits, visitor2.visits)
+            v = random.randint(0, 20)
+            self.assertEqual(tree.insert_persistent(v).to_string(), recursive_insert_persistent(tree, None, v).to_string())
+            reference = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            for v in random_values[1:]:
+                delete_all = random.choice([False, True])
+                if tree.size() == (tree.count(v) if delete_all else 1):
+                    continue
+                self.assertEqual(tree.delete(v, delete_all), recursive_delete(reference, v, delete_all))
+                self.assertEqual(tree.to_string(), reference.to_string())
+                self.assert_left_duplicates_invariant(tree)
+                self.assert_subtree_sizes(tree)
+
+    def test_operations_on_degenerate_trees_do_not_recurse(self):
+        N = 100000
+        tree = degenerate_tree(N)
+        self.assertEqual(tree.size(), N)
+        self.assertTrue(tree.find(N-1))
+        self.assertEqual(tree.count(N-1), 1)
+        self.assertEqual(tree.max(), N-1)
+        self.assertEqual(tree.min(), 0)
+        self.assertEqual(tree.depth(), N-1)
+        self.assertEqual(tree.select(N-1), N-1)
+        self.assertEqual(len(list(tree.preorder_traversal_yield())), N)
+        visitor = RecordingVisitor()
+        tree.visit_RL(visitor)
+        self.assertEqual(visitor.visits[-1][1], N-1)
+        tree2 = tree.insert_persistent(N)
+        self.assertEqual(tree2.max(), N)
+        self.assertEqual(tree.max(), N-1)
+        self.assertEqual(tree.delete(0, False), 1)
+        self.assertEqual(tree.delete(N-1, True), 1)
+        self.assertEqual(tree.size(), N-2)
+        self.assertEqual(len(degenerate_tree(2000).to_string().split('\n')), 2*2000-1)
+
+    def test_traversals(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 61):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            for tree in (BSTNode.createTreeUsingRecursiveInsert(random_values), BSTNode.createTreeUsingBulkLoad(random_values)):
+                before = tree.to_string()
+                preorder = list(recursive_preorder(tree))
+                inorder = list(recursive_inorder(tree))
+                postorder = list(recursive_postorder(tree))
+                visited1, visited2 = [], []
+                tree.preorder_traversal(visited1.append)
+                tree.preorder_traversal_nonrecur(visited2.append)
+                self.assertSequenceEqual(visited1, preorder)
+                self.assertSequenceEqual(visited2, preorder)
+                self.assertSequenceEqual(list(tree.preorder_traversal_morris()), preorder)
+                self.assertSequenceEqual([x.v for x in inorder], sorted(random_values))
+                self.assertSequenceEqual(list(tree.inorder_traversal_yield()), inorder)
+                self.assertSequenceEqual(list(tree.inorder_traversal_morris()), inorder)
+                self.assertSequenceEqual(list(tree.reverse_inorder_traversal_yield()), inorder[::-1])
+                self.assertSequenceEqual(list(tree.reverse_inorder_traversal_morris()), inorder[::-1])
+                self.assertSequenceEqual(list(tree.postorder_traversal_yield()), postorder)
+                self.assertSequenceEqual(list(tree.postorder_traversal_morris()), postorder)
+                levelorder = list(tree.levelorder_traversal_yield())
+                self.assertSequenceEqual(levelorder, levelorder_by_depth(tree))
+                self.assertSequenceEqual(list(tree.levelorder_traversal_morris()), levelorder)
+                self.assertEqual(tree.to_string(), before)
+
+    def test_abandoned_morris_traversals_leave_the_tree_intact(self):
+        random.seed(0)
+        tree = BSTNode.createTreeUsingRecursiveInsert([random.randint(0, 30) for _ in range(0, 40)])
+        before = tree.to_string()
+        for traversal in (tree.inorder_traversal_morris, tree.reverse_inorder_traversal_morris,
+                          tree.preorder_traversal_morris, tree.postorder_traversal_morris,
+                          tree.levelorder_traversal_morris):
+            for n in range(0, 40):
+                walk = traversal()
+                for _ in range(0, n):
+                    next(walk)
+                walk.close()
+                self.assertEqual(tree.to_string(), before)
+            for node in traversal():
+                break
+            self.assertEqual(tree.to_string(), before)
+
+    def test_traversals_of_degenerate_trees(self):
+        N = 100000
+        tree = degenerate_tree(N)
+        self.assertSequenceEqual([x.v for x in tree.inorder_traversal_yield()], range(0, N))
+        self.assertSequenceEqual([x.v for x in tree.inorder_traversal_morris()], range(0, N))
+        self.assertSequenceEqual([x.v for x in tree.reverse_inorder_traversal_morris()], range(N-1, -1, -1))
+        self.assertSequenceEqual([x.v for x in tree.postorder_traversal_yield()], range(N-1, -1, -1))
+        self.assertSequenceEqual([x.v for x in tree.postorder_traversal_morris()], range(N-1, -1, -1))
+        self.assertSequenceEqual([x.v for x in tree.levelorder_traversal_yield()], range(0, N))
+        left_leaning = BSTNode.createTreeUsingRecursiveInsert([3]*500)
+        self.assertEqual(len(list(left_leaning.levelorder_traversal_morris())), 500)
+        self.assertEqual(len(list(left_leaning.postorder_traversal_morris())), 500)
+
+    def test_floor_ceiling_successor_predecessor(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 61):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            for tree in (BSTNode.createTreeUsingRecursiveInsert(random_values), BSTNode.createTreeUsingBulkLoad(random_values)):
+                for v in range(-1, 23):
+                    below = [x for x in random_values if x < v]
+                    above = [x for x in random_values if x > v]
+                    self.assertEqual(tree.floor(v), max(below + [x for x in random_values if x == v]) if (below or v in random_values) else None)
+                    self.assertEqual(tree.ceiling(v), min(above + [x for x in random_values if x == v]) if (above or v in random_values) else None)
+                    self.assertEqual(tree.predecessor(v), max(below) if below else None)
+                    self.assertEqual(tree.successor(v), min(above) if above else None)
+
+    def test_range_and_cursors(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 61):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            for v in random_values[:num_of_nodes/3]:
+                if tree.size() > 1:
+                    tree.delete(v, False)
+            inorder = list(tree.inorder_traversal_yield())
+            for lo in range(-1, 22):
+                for hi in range(lo-1, 23):
+                    self.assertSequenceEqual(list(tree.range(lo, hi)), [x for x in inorder if lo <= x.v < hi])
+                node = tree.ceiling_node(lo)
+                self.assertIs(node, ([x for x in inorder if x.v >= lo] + [None])[0])
+                node = tree.floor_node(lo)
+                self.assertIs(node, ([None] + [x for x in inorder if x.v <= lo])[-1])
+            cursor, visited = inorder[0], []
+            while cursor is not None:
+                visited.append(cursor)
+                cursor = cursor.next_inorder()
+            self.assertSequenceEqual(visited, inorder)
+            cursor, visited = inorder[-1], []
+            while cursor is not None:
+                visited.append(cursor)
+                cursor = cursor.prev_inorder()
+            self.assertSequenceEqual(visited, inorder[::-1])
+
+    def test_streamed_and_truncated_rendering(self):
+        import io
+        random.seed(0)
+        for num_of_nodes in range(1, 80):
+            random_values = [random.randint(0, 30) for _ in range(0, num_of_nodes)]
+            tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            f = io.StringIO()
+            tree.write_to(f)
+            self.assertEqual(f.getvalue(), tree.to_string())
+            depth = tree.depth()
+            for max_depth in range(0, depth+1):
+                lines = to_string_lines(tree, max_depth=max_depth)
+                shown = [x for x in lines if not x.endswith('nil') and 'values below' not in x]
+                elided = sum(int(x.split('(')[-1].split()[0]) for x in lines if 'values below' in x)
+                self.assertEqual(len(shown) + elided, num_of_nodes)
+                self.assertEqual(max_depth == depth, elided == 0)
+            for max_nodes in range(0, num_of_nodes+1):
+                lines = to_string_lines(tree, max_nodes=max_nodes)
+                shown = [x for x in lines[:-1] if not x.endswith('nil')]
+                if max_nodes == num_of_nodes:
+                    self.assertEqual(lines, tree._to_string())
+                else:
+                    self.assertEqual(lines[:-1], tree._to_string()[:len(lines)-1])
+                    self.assertEqual(len(shown), max_nodes)
+                    self.assertEqual(lines[-1], '... ({} more values not shown)'.format(num_of_nodes-max_nodes))
+
+    def test_batch_operations(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 61):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            for batch_size in (0, 1, 5, num_of_nodes, 3*num_of_nodes):
+                batch = [random.randint(-1, 22) for _ in range(0, batch_size)]
+                tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+                self.assertEqual(tree.find_many(batch), [tree.find(v) for v in batch])
+                self.assertEqual(tree.count_many(iter(batch)), [tree.count(v) for v in batch])
+                tree.insert_many(batch)
+                self.assertSequenceEqual([x.v for x in tree.inorder_traversal_yield()], sorted(random_values+batch))
+                self.assert_left_duplicates_invariant(tree)
+                self.assert_subtree_sizes(tree)
+                self.assertIs(tree.parent, None)
+                for delete_all in (False, True):
+                    tree1 = BSTNode.createTreeUsingRecursiveInsert(random_values)
+                    tree2 = BSTNode.createTreeUsingRecursiveInsert(random_values)
+                    distinct = set(batch)
+                    if delete_all:
+                        total = sum(tree1.count_many(distinct))
+                    else:
+                        total = sum(min(c, batch.count(v)) for v, c in zip(distinct, tree1.count_many(distinct)))
+                    if total == num_of_nodes:
+                        self.assertRaises(Exception, tree1.delete_many, batch, delete_all)
+                        continue
+                    self.assertEqual(tree1.delete_many(batch, delete_all), [tree2.delete(v, delete_all) for v in batch])
+                    self.assertSequenceEqual([x.v for x in tree1.inorder_traversal_yield()],
+                                             [x.v for x in tree2.inorder_traversal_yield()])
+                    self.assert_left_duplicates_invariant(tree1)
+                    self.assert_subtree_sizes(tree1)
+
+    def test_bulk_load_yields_minimum_height_on_distinct_keys(self):
+        for num_of_nodes in [1, 2, 3, 4, 7, 8, 1000, 1023, 1024, 200000]:
+            tree = BSTNode.createTreeUsingBulkLoad(range(0, num_of_nodes))
+            self.assertEqual(tree.depth(), num_of_nodes.bit_length()-1)
+        self.assert_left_duplicates_invariant(tree)
+        self.assertEqual(tree.min(), 0)
+        self.assertEqual(tree.max(), num_of_nodes-1)
+        self.assertEqual(tree.count(num_of_nodes/2), 1)
+        self.assertSequenceEqual([x.v for x in BSTNode.createTreeUsingBulkLoad([5]*4).preorder_traversal_yield()], [5]*4)
+
         
 
 
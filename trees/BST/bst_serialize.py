@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+'''
+Binary serialization of BSTNode trees, and read-only access to a serialized tree
+through a memory-mapped file.
+
+The format is a flat node array in preorder, so that node 0 is the root and the
+left child of node i, if any, is node i+1. After a 16-byte header:
+
+    magic      4 bytes   b'BST1'
+    key type   1 byte    b'q' (64-bit signed integers) or b'd' (64-bit floats)
+    padding    3 bytes
+    nodes      8 bytes   unsigned, the number of nodes N
+
+come N records of 20 bytes each:
+
+    key        8 bytes   of the key type
+    left       4 bytes   signed, index of the left child or -1
+    right      4 bytes   signed, index of the right child or -1
+    size       4 bytes   signed, size of the subtree rooted at the node
+
+Everything is little-endian whatever the platform. Only trees with int or float keys
+can be serialized as keys are stored unboxed: the keys of a tree that has any float
+key are all stored as floats, so its int keys must be exactly representable as such.
+A tree is read back either with load (which rebuilds the BSTNode objects) or with
+MappedBST (which builds nothing and runs the lookups straight off the mapped file,
+so "opening" a tree of any size takes constant time).
+'''
+from __future__ import unicode_literals
+
+
+import io
+import mmap
+import numbers
+import os
+import random
+import struct
+import tempfile
+
+from bst import BSTNode
+
+
+MAGIC = b'BST1'
+HEADER = struct.Struct(str('<4sc3xQ'))
+RECORDS = {b'q': struct.Struct(str('<qiii')), b'd': struct.Struct(str('<diii'))}
+NIL = -1
+
+
+def _key_type(tree):
+    '''
+    Returns the key type the keys of the tree are stored as, once all of them have
+    been checked: b'q' if they are all ints, which must then fit in 64 bits, or b'd'
+    if any of them is a float, in which case the int keys must be exactly
+    representable as doubles (mixing floats with ints beyond 2**53 is refused rather
+    than rounded)
+    '''
+    has_floats = False
+    # the int keys a double may not hold exactly
+    wide = []
+    for node in tree.preorder_traversal_nonrecur_yield():
+        if isinstance(node.v, bool) or not isinstance(node.v, numbers.Real):
+            raise TypeError('only trees with int or float keys can be serialized, not {!r}'.format(node.v))
+        if not isinstance(node.v, numbers.Integral):
+            has_floats = True
+        elif not -2**53 <= node.v <= 2**53:
+            wide.append(node.v)
+    if not has_floats:
+        for v in wide:
+            if not -2**63 <= v < 2**63:
+                raise OverflowError('integer key {} does not fit in 64 bits'.format(v))
+        return b'q'
+    for v in wide:
+        try:
+            exact = int(float(v)) == v
+        except OverflowError:
+            exact = False
+        if not exact:
+            raise ValueError('integer key {} cannot be stored exactly as a float, as the float keys of the tree require'.format(v))
+    return b'd'
+
+
+def dump(tree, f):
+    '''
+    Writes the tree (a BSTNode) to the binary file object f. The indices of the
+    children are derived from the cached subtree sizes: in preorder, the right child
+    of node i comes right after the left subtree, i.e. at i+1+size(left).
+    '''
+    if type(tree) is not BSTNode:
+        raise TypeError('only BSTNode trees can be serialized, not {}'.format(type(tree).__name__))
+    key_type = _key_type(tree)
+    record = RECORDS[key_type]
+    f.write(HEADER.pack(MAGIC, key_type, tree.size()))
+    buf = bytearray(record.size * tree.size())
+    for i, node in enumerate(tree.preorder_traversal_nonrecur_yield()):
+        left = NIL if node.left is None else i+1
+        if node.right is None:
+            right = NIL
+        else:
+            right = i+1 + (0 if node.left is None else node.left.subtree_size)
+        record.pack_into(buf, i*record.size, node.v, left, right, node.subtree_size)
+    f.write(buf)
+
+
+def dumps(tree):
+    '''
+    Returns the serialized tree as a byte string
+    '''
+    f = io.BytesIO()
+    dump(tree, f)
+    return f.getvalue()
+
+
+def _read_header(buf):
+    if len(buf) < HEADER.size:
+        raise ValueError('not a serialized tree: too short')
+    magic, key_type, N = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or key_type not in RECORDS:
+        raise ValueError('not a serialized tree: bad header')
+    record = RECORDS[key_type]
+    if N == 0 or len(buf) < HEADER.size + N*record.size:
+        raise ValueError('serialized tree is truncated')
+    return record, N
+
+
+def loads(data):
+    '''
+    Rebuilds the BSTNode tree from its serialized form (a byte string or any object
+    supporting the buffer protocol, e.g. an mmap). Nodes are created from the last
+    one back to the first so that the children of a node already exist when it is
+    created; nothing is recursive.
+    '''
+    record, N = _read_header(data)
+    nodes = [None]*N
+    offset = HEADER.size + (N-1)*record.size
+    for i in range(N-1, -1, -1):
+        v, left, right, _ = record.unpack_from(data, offset)
+        node = BSTNode(None, v, None if left == NIL else nodes[left], None if right == NIL else nodes[right])
+        if node.left is not None:
+            node.left.parent = node
+        if node.right is not None:
+            node.right.parent = node
+        nodes[i] = node
+        offset -= record.size
+    return nodes[0]
+
+
+def load(f):
+    '''
+    Reads a tree written by dump from the binary file object f
+    '''
+    return loads(f.read())
+
+
+class MappedBST(object):
+    '''
+    Read-only view of a serialized tree that memory-maps the file and answers
+    queries by decoding just the records on the search path; the operating system
+    pages in only the parts of the file that are actually touched. The semantics
+    are those of BSTNode: duplicates are allowed and live in the left subtree.
+
+    Use as a context manager, or call close when done:
+
+        with MappedBST('tree.bin') as tree:
+            tree.find(42)
+    '''
+
+    __slots__ = ('_file', '_map', '_record', '_N')
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._record, self._N = _read_header(self._map)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _node(self, i):
+        '''
+        Returns the (key, left, right, size) record of node i
+        '''
+        return self._record.unpack_from(self._map, HEADER.size + i*self._record.size)
+
+    def find(self, v):
+        i = 0
+        while i != NIL:
+            k, left, right, _ = self._node(i)
+            if k == v:
+                return True
+            i = left if k > v else right
+        return False
+
+    def count(self, v):
+        rv = 0
+        i = 0
+        while i != NIL:
+            k, left, right, _ = self._node(i)
+            if k == v:
+                rv += 1
+                i = left
+            else:
+                i = left if k > v else right
+        return rv
+
+    def size(self):
+        return self._N
+
+    __len__ = size
+
+    def min(self):
+        i = 0
+        while True:
+            k, left, _, _ = self._node(i)
+            if left == NIL:
+                return k
+            i = left
+
+    def max(self):
+        i = 0
+        while True:
+            k, _, right, _ = self._node(i)
+            if right == NIL:
+                return k
+            i = right
+
+    def rank(self, v):
+        '''
+        Returns the number of values in the tree that are smaller than v
+        '''
+        rv = 0
+        i = 0
+        while i != NIL:
+            k, left, right, size = self._node(i)
+            if k >= v:
+                i = left
+            else:
+                rv += size - (0 if right == NIL else self._node(right)[3])
+                i = right
+        return rv
+
+    def __iter__(self):
+        '''
+        Yields the values in sorted order
+        '''
+        stack = []
+        i = 0
+        while stack or i != NIL:
+            if i != NIL:
+                stack.append(i)
+                i = self._node(i)[1]
+            else:
+                k, _, i, _ = self._node(stack.pop())
+                yield k
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 61):
+            for random_values in ([random.randint(-20, 20) for _ in range(0, num_of_nodes)],
+                                  [random.uniform(-1, 1) for _ in range(0, num_of_nodes)]):
+                tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+                data = dumps(tree)
+                self.assertEqual(len(data), HEADER.size + 20*num_of_nodes)
+                loaded = loads(data)
+                self.assertEqual(loaded.to_string(), tree.to_string())
+                self.assertIs(loaded.parent, None)
+                for node in loaded.preorder_traversal_yield():
+                    for child in (node.left, node.right):
+                        self.assertTrue(child is None or child.parent is node)
+                    self.assertEqual(node.subtree_size, len(list(node.preorder_traversal_yield())))
+
+    def test_mapped_tree(self):
+        random.seed(0)
+        for num_of_nodes in (1, 2, 7, 100, 1000):
+            random_values = [random.randint(0, 50) for _ in range(0, num_of_nodes)]
+            tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            with open(self.path, 'wb') as f:
+                dump(tree, f)
+            with open(self.path, 'rb') as f:
+                self.assertEqual(load(f).to_string(), tree.to_string())
+            with MappedBST(self.path) as mapped:
+                self.assertEqual(len(mapped), num_of_nodes)
+                self.assertSequenceEqual(list(mapped), sorted(random_values))
+                self.assertEqual(mapped.min(), min(random_values))
+                self.assertEqual(mapped.max(), max(random_values))
+                for v in range(-1, 53):
+                    self.assertEqual(mapped.find(v), v in random_values)
+                    self.assertEqual(mapped.count(v), random_values.count(v))
+                    self.assertEqual(mapped.rank(v), tree.rank(v))
+
+    def test_mixed_int_and_float_keys(self):
+        # the key type is chosen once the whole tree has been seen: an int key that
+        # only fits in a float is fine if a float key comes later
+        for values in ([2**63, 0.5], [0.5, 2**63], [1, 2**53, -2**60, 0.5]):
+            tree = BSTNode.createTreeUsingRecursiveInsert(values)
+            data = dumps(tree)
+            self.assertEqual(HEADER.unpack_from(data)[1], b'd')
+            # the int keys come back as floats of the same value
+            self.assertSequenceEqual([node.v for node in loads(data).preorder_traversal_yield()],
+                                     [node.v for node in tree.preorder_traversal_yield()])
+        self.assertEqual(HEADER.unpack_from(dumps(BSTNode.createTreeUsingRecursiveInsert([2**63-1, 2])))[1], b'q')
+        # an int key that a float would round is refused rather than silently altered,
+        # before or after the first float key
+        for values in ([2**53+1, 0.5], [0.5, 2**53+1], [1, 0.5, -(2**60+1)], [0.5, 10**400]):
+            self.assertRaises(ValueError, dumps, BSTNode.createTreeUsingRecursiveInsert(values))
+
+    def test_deep_trees_do_not_recurse(self):
+        N = 5000
+        tree = BSTNode.createTreeUsingRecursiveInsert([0])
+        for v in range(1, N):
+            tree.insert_non_recursive(v)
+        loaded = loads(dumps(tree))
+        self.assertEqual(loaded.depth(), N-1)
+        with open(self.path, 'wb') as f:
+            dump(tree, f)
+        with MappedBST(self.path) as mapped:
+            self.assertTrue(mapped.find(N-1))
+            self.assertEqual(list(mapped), list(range(0, N)))
+
+    def test_bad_input(self):
+        self.assertRaises(TypeError, dumps, BSTNode.createTreeUsingRecursiveInsert(['a', 'b']))
+        self.assertRaises(OverflowError, dumps, BSTNode.createTreeUsingRecursiveInsert([2**70]))
+        self.assertRaises(OverflowError, dumps, BSTNode.createTreeUsingRecursiveInsert([0, -2**63-1]))
+        self.assertRaises(ValueError, loads, b'BST0' + b'\0'*30)
+        self.assertRaises(ValueError, loads, dumps(BSTNode.createTreeUsingRecursiveInsert([1, 2, 3]))[:-1])
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertRaises(ValueError, MappedBST, self.path)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+from bst import BSTNode
+
+
+class BSTSet(object):
+    '''
+    Adapter that gives a BSTNode tree the interface of the ordered set engines
+    (SkipList, Treap and BTree; see ordered_set_unittests.py) so that it can be
+    tested and benchmarked alongside them. Unlike a BSTNode, a BSTSet may be empty.
+    '''
+
+    __slots__ = ('root',)
+
+    def __init__(self, values=()):
+        self.root = None
+        for v in values:
+            self.insert(v)
+
+    def insert(self, v):
+        if self.root is None:
+            self.root = BSTNode(None, v)
+        else:
+            self.root.insert_non_recursive(v)
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        if self.root is None:
+            return 0
+        howManyWereDeleted = self.root.count(v) if delete_all else int(self.root.find(v))
+        if howManyWereDeleted > 0 and howManyWereDeleted == self.root.size():
+            # BSTNode cannot delete its last value
+            self.root = None
+            return howManyWereDeleted
+        return self.root.delete(v, delete_all)
+
+    def find(self, v):
+        return self.root is not None and self.root.find(v)
+
+    def count(self, v):
+        return 0 if self.root is None else self.root.count(v)
+
+    def size(self):
+        return 0 if self.root is None else self.root.size()
+
+    __len__ = size
+
+    def min(self):
+        if self.root is None:
+            raise ValueError('min of an empty tree')
+        return self.root.min()
+
+    def max(self):
+        if self.root is None:
+            raise ValueError('max of an empty tree')
+        return self.root.max()
+
+    def __iter__(self):
+        if self.root is None:
+            return iter([])
+        return (node.v for node in self.root.inorder_traversal_yield())
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import ordered_set_unittests
+
+class UnitTests(ordered_set_unittests.AbstractOrderedSetUnitTestCases):
+    def engine(self):
+        return BSTSet
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,652 @@
+# -*- coding: utf-8 -*-
+'''
+Opt-in instrumentation of BSTNode, to tell from the outside whether a tree has
+degenerated.
+
+While instrumentation is enabled, find, count, insert, insert_non_recursive and
+delete record into a BSTStats object how many times they were called, how many
+keys they compared and how many nodes they visited; so do the batch operations
+find_many, count_many, insert_many and delete_many, under their own names, for
+all the work they do (but for the key comparisons, which they leave to bisect).
+delete also records how many times a node took over the value of its in-order
+predecessor or successor, and how many duplicates it moved from a right subtree to
+a left one.
+
+Enabling instrumentation installs counting versions of those methods on the
+BSTNode class, for the whole process; they do exactly what the originals do, down
+to the shape of the tree, and count as they go. Disabling it puts the originals
+back, so while it is disabled BSTNode runs its own, counter-free code and
+instrumentation costs nothing at all.
+
+    with bst_stats.instrumented() as stats:
+        ... use the trees ...
+    print stats.report()
+
+Methods that subclasses such as AVLNode and CountedBSTNode override are not
+instrumented.
+
+The shape of a tree is measured, whether instrumentation is enabled or not, by
+height, depth_histogram, average_depth and degeneration: the last one compares the
+average depth of the nodes with that of a perfectly balanced tree of the same size
+and is meant for alerting when the average path length drifts away from log n.
+'''
+from __future__ import unicode_literals
+
+
+import bisect
+import contextlib
+import random
+
+from bst import BSTNode
+
+
+class BSTStats(object):
+    '''
+    Counters recorded by the instrumented BSTNode methods
+    * calls, comparisons, nodes_visited: dicts keyed by operation name (comparisons
+      are not counted for the batch operations)
+    * predecessor_replacements, successor_replacements: how many times delete made a
+      node take over the largest value of its left subtree, or the smallest value of
+      its right subtree
+    * duplicates_moved: how many values delete moved from a right subtree to a left
+      one, after a node took over the smallest value of its right subtree
+    '''
+
+    OPERATIONS = ('find', 'count', 'insert', 'delete')
+    BATCH_OPERATIONS = ('find_many', 'count_many', 'insert_many', 'delete_many')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        operations = BSTStats.OPERATIONS + BSTStats.BATCH_OPERATIONS
+        self.calls = dict.fromkeys(operations, 0)
+        self.comparisons = dict.fromkeys(operations, 0)
+        self.nodes_visited = dict.fromkeys(operations, 0)
+        self.predecessor_replacements = 0
+        self.successor_replacements = 0
+        self.duplicates_moved = 0
+
+    def _record(self, operation, calls, comparisons, nodes_visited):
+        self.calls[operation] += calls
+        self.comparisons[operation] += comparisons
+        self.nodes_visited[operation] += nodes_visited
+
+    def average_nodes_visited(self, operation):
+        calls = self.calls[operation]
+        return float(self.nodes_visited[operation])/calls if calls else 0.0
+
+    def report(self):
+        rv = ['{:<12}{:>12}{:>14}{:>14}{:>16}'.format('operation', 'calls', 'comparisons', 'nodes visited', 'visited / call')]
+        for operation in BSTStats.OPERATIONS + BSTStats.BATCH_OPERATIONS:
+            comparisons = '-' if operation in BSTStats.BATCH_OPERATIONS else self.comparisons[operation]
+            rv.append('{:<12}{:>12}{:>14}{:>14}{:>16.2f}'.format(operation, self.calls[operation], comparisons,
+                                                                 self.nodes_visited[operation], self.average_nodes_visited(operation)))
+        rv.append('predecessor replacements: {}'.format(self.predecessor_replacements))
+        rv.append('successor replacements: {}'.format(self.successor_replacements))
+        rv.append('duplicates moved: {}'.format(self.duplicates_moved))
+        return '\n'.join(rv)
+
+
+# The BSTStats recorded into while instrumentation is enabled
+_stats = None
+
+# The originals of the BSTNode methods replaced while instrumentation is enabled
+_originals = {}
+
+
+# The counting versions of the BSTNode methods. Each of them is a copy of the
+# original that also counts the nodes it visits, and they call one another's
+# counting helpers rather than the methods of the class, so that every node is
+# counted once, under the operation that was called.
+
+def _find(self, v):
+    visited = 0
+    node = self
+    while node is not None:
+        visited += 1
+        if node.v == v:
+            break
+        node = node.left if node.v > v else node.right
+    # an equality test at every node, and a direction test at all but the last
+    _stats._record('find', 1, 2*visited - (node is not None), visited)
+    return node is not None
+
+
+def _count(self, v):
+    rv = visited = 0
+    node = self
+    while node is not None:
+        visited += 1
+        if node.v == v:
+            rv += 1
+            node = node.left
+        else:
+            node = node.left if node.v > v else node.right
+    _stats._record('count', 1, 2*visited - rv, visited)
+    return rv
+
+
+def _insert(self, v):
+    visited = _insert_below(self, v)
+    _stats._record('insert', 1, visited, visited)
+
+
+def _insert_below(node, v):
+    '''
+    The recursion of insert; returns the number of nodes visited
+    '''
+    node.subtree_size += 1
+    if node.v>=v:
+        if node.left==None:
+            node.left = BSTNode(node, v)
+            return 1
+        return 1 + _insert_below(node.left, v)
+    else:
+        if node.right==None:
+            node.right = BSTNode(node, v)
+            return 1
+        return 1 + _insert_below(node.right, v)
+
+
+def _insert_non_recursive(self, v):
+    visited = _insert_loop(self, v)
+    _stats._record('insert', 1, visited, visited)
+
+
+def _insert_loop(node, v):
+    '''
+    The loop of insert_non_recursive; returns the number of nodes visited
+    '''
+    p = node
+    parent = None
+    left_child = None
+    visited = 0
+    while p is not None:
+        visited += 1
+        p.subtree_size += 1
+        if p.v >= v:
+            parent = p
+            p = p.left
+            left_child = True
+        else:
+            parent = p
+            p = p.right
+            left_child = False
+    if left_child:
+        parent.left = BSTNode(parent, v)
+    else:
+        parent.right = BSTNode(parent, v)
+    return visited
+
+
+def _delete(self, v, delete_all):
+    assert delete_all is True or delete_all is False
+    howManyWereDeleted = 0
+    while True:
+        deleted, comparisons, visited = _delete_one(self, v)
+        # one call per deletion, and one more for the search that finds no v
+        _stats._record('delete', 1, comparisons, visited)
+        if not deleted:
+            break
+        howManyWereDeleted += 1
+        if not delete_all:
+            break
+    return howManyWereDeleted
+
+
+def _delete_one(tree, v):
+    '''
+    BSTNode._delete_one; returns whether a node was deleted, the number of keys
+    compared and the number of nodes visited
+    '''
+    node, parent, visited = _topmost_node(tree, v)
+    comparisons = 2*visited - (node is not None)
+    if node is None:
+        return False, comparisons, visited
+    if node.left is None and node.right is None and node.parent is None:
+        raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+    tasks = []
+    visited += _remove(node, parent, tasks)
+    while tasks:
+        insert, node, v = tasks.pop()
+        if insert:
+            inserted = _insert_loop(node, v)
+            comparisons += inserted
+            visited += inserted
+            tasks.append((False, node, v))
+            continue
+        if node.right is None:
+            continue
+        duplicate, parent, searched = _topmost_node(node.right, v)
+        comparisons += 2*searched - (duplicate is not None)
+        visited += searched
+        if duplicate is not None:
+            _stats.duplicates_moved += 1
+            node.subtree_size -= 1
+            tasks.append((True, node, v))
+            visited += _remove(duplicate, node if parent is None else parent, tasks)
+    return True, comparisons, visited
+
+
+def _topmost_node(tree, v):
+    '''
+    BSTNode._topmost_node; also returns the number of nodes visited
+    '''
+    path = []
+    node = tree
+    while node is not None and node.v != v:
+        path.append(node)
+        node = node.left if node.v > v else node.right
+    if node is None:
+        return None, None, len(path)
+    for p in path:
+        p.subtree_size -= 1
+    return node, (path[-1] if path else None), len(path)+1
+
+
+def _remove(node, parent, tasks):
+    '''
+    BSTNode._remove; returns the number of nodes visited below node
+    '''
+    visited = 0
+    while True:
+        node.subtree_size -= 1
+        if node.left is not None:
+            parent = node
+            child = node.left
+            visited += 1
+            while child.right is not None:
+                child.subtree_size -= 1
+                parent = child
+                child = child.right
+                visited += 1
+            _stats.predecessor_replacements += 1
+        elif node.right is not None:
+            spine = [node.right]
+            while spine[-1].left is not None:
+                spine.append(spine[-1].left)
+            visited += len(spine)
+            m = spine[-1].v
+            parent = node
+            for child in spine:
+                if child.v == m:
+                    break
+                child.subtree_size -= 1
+                parent = child
+            tasks.append((False, node, m))
+            _stats.successor_replacements += 1
+        else:
+            parent = node.parent if parent is None else parent
+            if parent.right is node:
+                parent.right = None
+            else:
+                parent.left = None
+            return visited
+        node.v = child.v
+        node = child
+
+
+def _count_sorted(tree, keys, all_occurrences):
+    '''
+    BSTNode._count_sorted; also returns the number of nodes visited
+    '''
+    more_left = all_occurrences and tree._DUPLICATES_LEFT
+    more_right = all_occurrences and tree._DUPLICATES_RIGHT
+    counts = [0]*len(keys)
+    visited = 0
+    stack = [(tree, 0, len(keys))] if keys else []
+    while stack:
+        node, lo, hi = stack.pop()
+        if hi-lo == 1:
+            k = keys[lo]
+            while node is not None:
+                visited += 1
+                if node.v == k:
+                    counts[lo] += node._occurrences()
+                    if more_right and node.right is not None:
+                        stack.append((node.right, lo, hi))
+                    node = node.left if more_left else None
+                else:
+                    node = node.left if node.v > k else node.right
+            continue
+        visited += 1
+        i = bisect.bisect_left(keys, node.v, lo, hi)
+        j = i
+        if i < hi and keys[i] == node.v:
+            counts[i] += node._occurrences()
+            j = i+1
+        left_hi = j if more_left else i
+        right_lo = i if more_right else j
+        if node.left is not None and lo < left_hi:
+            stack.append((node.left, lo, left_hi))
+        if node.right is not None and right_lo < hi:
+            stack.append((node.right, right_lo, hi))
+    return counts, visited
+
+
+def _find_many(self, values):
+    values = list(values)
+    keys, slots = BSTNode._sorted_distinct(values)
+    found, visited = _count_sorted(self, keys, False)
+    _stats._record('find_many', 1, 0, visited)
+    return [found[slot] > 0 for slot in slots]
+
+
+def _count_many(self, values):
+    values = list(values)
+    keys, slots = BSTNode._sorted_distinct(values)
+    counts, visited = _count_sorted(self, keys, True)
+    _stats._record('count_many', 1, 0, visited)
+    return [counts[slot] for slot in slots]
+
+
+def _insert_many(self, values):
+    values = sorted(values)
+    if not values:
+        return
+    if len(values) >= self.subtree_size:
+        merged = [node.v for node in self.inorder_traversal_yield()]
+        _stats._record('insert_many', 1, 0, len(merged))
+        merged.extend(values)
+        merged.sort()
+        self._take_over(BSTNode._bulk_build(merged, 0, len(merged), self.parent))
+        return
+    visited = 0
+    stack = [(self, 0, len(values))]
+    while stack:
+        node, lo, hi = stack.pop()
+        if hi-lo == 1:
+            visited += _insert_loop(node, values[lo])
+            continue
+        visited += 1
+        node.subtree_size += hi-lo
+        i = bisect.bisect_right(values, node.v, lo, hi)
+        if lo < i:
+            if node.left is None:
+                node.left = BSTNode._bulk_build(values, lo, i, node)
+            else:
+                stack.append((node.left, lo, i))
+        if i < hi:
+            if node.right is None:
+                node.right = BSTNode._bulk_build(values, i, hi, node)
+            else:
+                stack.append((node.right, i, hi))
+    _stats._record('insert_many', 1, 0, visited)
+
+
+def _delete_many(self, values, delete_all):
+    assert delete_all is True or delete_all is False
+    values = list(values)
+    keys, slots = BSTNode._sorted_distinct(values)
+    present, visited = _count_sorted(self, keys, True)
+    to_delete = [0]*len(keys)
+    rv = [0]*len(values)
+    for i, slot in enumerate(slots):
+        if delete_all:
+            howMany = present[slot] - to_delete[slot]
+        else:
+            howMany = 1 if to_delete[slot] < present[slot] else 0
+        to_delete[slot] += howMany
+        rv[i] = howMany
+    total = sum(to_delete)
+    if total == self.subtree_size:
+        raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+    if 2*total >= self.subtree_size:
+        visited += self.subtree_size
+        survivors = []
+        k = 0
+        for node in self.inorder_traversal_yield():
+            while k < len(keys) and keys[k] < node.v:
+                k += 1
+            if k < len(keys) and keys[k] == node.v and to_delete[k] > 0:
+                to_delete[k] -= 1
+            else:
+                survivors.append(node.v)
+        self._take_over(BSTNode._bulk_build(survivors, 0, len(survivors), self.parent))
+    else:
+        for key, howMany in zip(keys, to_delete):
+            for _ in range(0, howMany):
+                visited += _delete_one(self, key)[2]
+    _stats._record('delete_many', 1, 0, visited)
+    return rv
+
+
+_INSTRUMENTED = {'find': _find,
+                 'count': _count,
+                 'insert': _insert,
+                 'insert_non_recursive': _insert_non_recursive,
+                 'delete': _delete,
+                 'find_many': _find_many,
+                 'count_many': _count_many,
+                 'insert_many': _insert_many,
+                 'delete_many': _delete_many}
+
+
+def is_enabled():
+    return _stats is not None
+
+
+def enable(stats=None):
+    '''
+    Installs the counting methods on BSTNode; they record into stats (a new
+    BSTStats if None), which is returned
+    '''
+    global _stats
+    if _stats is not None:
+        raise RuntimeError('instrumentation is already enabled')
+    _stats = BSTStats() if stats is None else stats
+    for name, method in _INSTRUMENTED.items():
+        _originals[name] = BSTNode.__dict__[name]
+        setattr(BSTNode, name, method)
+    return _stats
+
+
+def disable():
+    '''
+    Puts back the original methods of BSTNode
+    '''
+    global _stats
+    for name, original in _originals.items():
+        setattr(BSTNode, name, original)
+    _originals.clear()
+    _stats = None
+
+
+@contextlib.contextmanager
+def instrumented(stats=None):
+    '''
+    Enables instrumentation for the duration of a with block
+    '''
+    stats = enable(stats)
+    try:
+        yield stats
+    finally:
+        disable()
+
+
+def height(tree):
+    return tree.depth()
+
+
+def depth_histogram(tree):
+    '''
+    Returns a list whose d-th item is the number of nodes at depth d
+    '''
+    rv = []
+    stack = [(tree, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth == len(rv):
+            rv.append(0)
+        rv[depth] += 1
+        if node.left is not None:
+            stack.append((node.left, depth+1))
+        if node.right is not None:
+            stack.append((node.right, depth+1))
+    return rv
+
+
+def average_depth(tree):
+    histogram = depth_histogram(tree)
+    return float(sum(d*n for d, n in enumerate(histogram)))/sum(histogram)
+
+
+def balanced_average_depth(n):
+    '''
+    Returns the average depth of the nodes of a minimum-height tree of n nodes
+    '''
+    rv = 0
+    depth = 0
+    while n > 0:
+        level = min(n, 2**depth)
+        rv += depth*level
+        n -= level
+        depth += 1
+    return rv
+
+
+def degeneration(tree):
+    '''
+    Returns the average depth of the nodes of the tree over that of a minimum-height
+    tree of the same size (about log2(n) - 1): 1 for a perfectly balanced tree,
+    about 1.39 on average for a tree built by random insertions, and n/(2 log2(n))
+    for a tree that has degenerated into a list
+    '''
+    n = tree.size()
+    ideal = float(balanced_average_depth(n))/n
+    return average_depth(tree)/ideal if ideal else 1.0
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def tearDown(self):
+        disable()
+
+    def test_enable_and_disable(self):
+        methods = dict(BSTNode.__dict__)
+        tree = BSTNode.createTreeUsingBulkLoad(range(0, 7))
+        with instrumented() as stats:
+            self.assertTrue(is_enabled())
+            self.assertRaises(RuntimeError, enable)
+            for name in _INSTRUMENTED:
+                self.assertIsNot(BSTNode.__dict__[name], methods[name])
+            tree.find(3)
+        self.assertFalse(is_enabled())
+        tree.find(3)
+        self.assertEqual(stats.calls['find'], 1)
+        # the original, counter-free methods are back
+        self.assertEqual(dict(BSTNode.__dict__), methods)
+
+    def test_results_are_unchanged(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 51):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            reference = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            with instrumented() as stats:
+                tree = BSTNode.createTreeUsingRecursiveInsert(random_values)
+                self.assertEqual(tree.to_string(), reference.to_string())
+                for f in range(-1, 22):
+                    self.assertEqual(tree.find(f), f in random_values)
+                    self.assertEqual(tree.count(f), random_values.count(f))
+                # the reference is updated by the original methods
+                for v in random_values[1::2]:
+                    tree.insert_non_recursive(v)
+                    _originals['insert_non_recursive'](reference, v)
+                for v in random_values[::3]:
+                    if tree.size() > tree.count(v):
+                        self.assertEqual(tree.delete(v, True), _originals['delete'](reference, v, True))
+            self.assertEqual(tree.to_string(), reference.to_string())
+            self.assertEqual(stats.calls['find'], 23)
+            self.assertEqual(stats.calls['insert'], num_of_nodes-1 + num_of_nodes//2)
+            with instrumented():
+                self.assertEqual(tree.count_many(range(-1, 22)), reference.count_many(range(-1, 22)))
+                tree.insert_many(random_values[::2])
+                _originals['insert_many'](reference, random_values[::2])
+                self.assertEqual(tree.delete_many(random_values[::4], False), _originals['delete_many'](reference, random_values[::4], False))
+            self.assertEqual(tree.to_string(), reference.to_string())
+
+    def test_counts(self):
+        tree = BSTNode.createTreeUsingRecursiveInsert([4, 2, 6, 1, 3, 5, 7])
+        with instrumented() as stats:
+            tree.find(7)   # 4, 6, 7: two comparisons at 4 and 6, one at 7
+            tree.find(0)   # 4, 2, 1
+            tree.count(1)  # 4, 2, 1 and then on to the empty left subtree of 1
+            tree.insert(5) # 4, 6, 5
+            tree.delete(4, False) # found at the root which has two children; its predecessor is 3
+        self.assertEqual((stats.calls['find'], stats.nodes_visited['find'], stats.comparisons['find']), (2, 6, 11))
+        self.assertEqual((stats.calls['count'], stats.nodes_visited['count'], stats.comparisons['count']), (1, 3, 5))
+        self.assertEqual((stats.calls['insert'], stats.nodes_visited['insert'], stats.comparisons['insert']), (1, 3, 3))
+        self.assertEqual((stats.calls['delete'], stats.nodes_visited['delete'], stats.comparisons['delete']), (1, 3, 1))
+        self.assertEqual(stats.predecessor_replacements, 1)
+        self.assertEqual(stats.average_nodes_visited('find'), 3.0)
+        self.assertTrue('predecessor replacements: 1' in stats.report())
+
+    def test_delete_counts(self):
+        # 1 has no left subtree: it takes over the smallest value of its right subtree
+        # (the upper 2, which takes over the lower one), and the other 2 is moved left
+        tree = BSTNode.createTreeUsingRecursiveInsert([1, 3, 2, 2])
+        with instrumented() as stats:
+            self.assertEqual(tree.delete(1, False), 1)
+        self.assertEqual(tree.to_string(), BSTNode.createTreeUsingRecursiveInsert([2, 3, 2]).to_string())
+        self.assertEqual((stats.successor_replacements, stats.predecessor_replacements, stats.duplicates_moved), (1, 1, 1))
+        self.assertEqual(stats.calls['insert'], 0)
+        # the search (1 node), the left spine of 3 (3), the predecessor of the upper 2 (1),
+        # the search for the other 2 (2), its insert (1) and a last search for a 2 (1)
+        self.assertEqual((stats.calls['delete'], stats.nodes_visited['delete'], stats.comparisons['delete']), (1, 9, 7))
+        tree = BSTNode.createTreeUsingRecursiveInsert([5, 5, 5, 7])
+        with instrumented() as stats:
+            self.assertEqual(tree.delete(5, True), 3)
+        # one call per deletion, and one more that finds no 5
+        self.assertEqual(stats.calls['delete'], 4)
+
+    def test_batch_counts(self):
+        tree = BSTNode.createTreeUsingBulkLoad(range(0, 100))
+        with instrumented() as stats:
+            self.assertEqual(tree.find_many([1, 50, 200]), [True, True, False])
+            self.assertEqual(tree.count_many([1, 2]), [1, 1])
+            tree.insert_many([3, 60])
+            self.assertEqual(tree.delete_many([1, 2, 3], False), [1, 1, 1])
+        for operation in BSTStats.OPERATIONS:
+            self.assertEqual((stats.calls[operation], stats.nodes_visited[operation]), (0, 0))
+        for operation in BSTStats.BATCH_OPERATIONS:
+            self.assertEqual(stats.calls[operation], 1)
+            self.assertTrue(stats.nodes_visited[operation] > 0)
+            self.assertEqual(stats.average_nodes_visited(operation), stats.nodes_visited[operation])
+        # the three searches share the path to 50, the root
+        self.assertTrue(stats.nodes_visited['find_many'] < 3*tree.depth())
+        self.assertTrue('find_many' in stats.report())
+
+    def test_shape_metrics(self):
+        balanced = BSTNode.createTreeUsingBulkLoad(range(0, 15))
+        self.assertEqual(depth_histogram(balanced), [1, 2, 4, 8])
+        self.assertEqual(height(balanced), 3)
+        self.assertAlmostEqual(degeneration(balanced), 1.0)
+        N = 200
+        degenerate = BSTNode.createTreeUsingBulkLoad([0])
+        for v in range(1, N):
+            degenerate.insert_non_recursive(v)
+        self.assertEqual(depth_histogram(degenerate), [1]*N)
+        self.assertAlmostEqual(average_depth(degenerate), (N-1)/2.0)
+        self.assertTrue(degeneration(degenerate) > 10)
+        random.seed(0)
+        values = list(range(0, 5000))
+        random.shuffle(values)
+        tree = BSTNode(None, values[0])
+        for v in values[1:]:
+            tree.insert_non_recursive(v)
+        self.assertTrue(1.1 < degeneration(tree) < 1.8)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import bisect
+import random
+
+
+class _Leaf(object):
+
+    __slots__ = ('keys', 'counts', 'next')
+
+    def __init__(self, keys, counts, next=None):
+        self.keys = keys
+        self.counts = counts
+        self.next = next
+
+
+class _Internal(object):
+
+    __slots__ = ('keys', 'children')
+
+    def __init__(self, keys, children):
+        self.keys = keys
+        self.children = children
+
+
+class BTree(object):
+    '''
+    Ordered multiset kept in a high-fanout B+ tree whose nodes are plain Python
+    lists: a node holds up to fanout-1 keys, so a tree of a million values is only
+    three or four levels deep, and most of the work of a search is done by bisect
+    on a list, in C, rather than by following one pointer per comparison.
+
+    * the leaves hold the distinct values in sorted order, each with its
+      multiplicity in a parallel list, and are chained left to right for iteration
+    * an internal node holds keys k[0] < k[1] < ... and one more child than keys;
+      child i holds the values v with k[i-1] <= v < k[i]
+    * every node but the root holds at least (fanout-1)//2 keys: a node that grows
+      past fanout-1 keys is split in two, and one that shrinks below the minimum
+      borrows a key from a sibling or is merged with it
+    * all the leaves are at the same depth
+
+    The interface is that of the ordered set engines (see ordered_set_unittests.py).
+    Nothing is recursive.
+    '''
+
+    __slots__ = ('_root', '_size', '_max_keys', '_min_keys')
+
+    def __init__(self, values=(), fanout=64):
+        assert fanout >= 4
+        self._root = _Leaf([], [])
+        self._size = 0
+        self._max_keys = fanout-1
+        self._min_keys = (fanout-1)//2
+        for v in values:
+            self.insert(v)
+
+    def _leaf_path(self, v):
+        '''
+        Returns the leaf where v belongs, and the (node, child index) pairs of the
+        internal nodes on the way down to it
+        '''
+        path = []
+        node = self._root
+        while type(node) is _Internal:
+            i = bisect.bisect_right(node.keys, v)
+            path.append((node, i))
+            node = node.children[i]
+        return node, path
+
+    def insert(self, v):
+        leaf, path = self._leaf_path(v)
+        self._size += 1
+        j = bisect.bisect_left(leaf.keys, v)
+        if j < len(leaf.keys) and leaf.keys[j] == v:
+            leaf.counts[j] += 1
+            return
+        leaf.keys.insert(j, v)
+        leaf.counts.insert(j, 1)
+        node = leaf
+        while len(node.keys) > self._max_keys:
+            mid = len(node.keys)//2
+            if type(node) is _Leaf:
+                right = _Leaf(node.keys[mid:], node.counts[mid:], node.next)
+                separator = right.keys[0]
+                del node.keys[mid:], node.counts[mid:]
+                node.next = right
+            else:
+                right = _Internal(node.keys[mid+1:], node.children[mid+1:])
+                separator = node.keys[mid]
+                del node.keys[mid:], node.children[mid+1:]
+            if path:
+                parent, i = path.pop()
+                parent.keys.insert(i, separator)
+                parent.children.insert(i+1, right)
+                node = parent
+            else:
+                self._root = _Internal([separator], [node, right])
+                break
+
+    def _find_in_leaf(self, v):
+        node = self._root
+        while type(node) is _Internal:
+            node = node.children[bisect.bisect_right(node.keys, v)]
+        j = bisect.bisect_left(node.keys, v)
+        return node, (j if j < len(node.keys) and node.keys[j] == v else None)
+
+    def find(self, v):
+        return self._find_in_leaf(v)[1] is not None
+
+    def count(self, v):
+        leaf, j = self._find_in_leaf(v)
+        return 0 if j is None else leaf.counts[j]
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        leaf, path = self._leaf_path(v)
+        j = bisect.bisect_left(leaf.keys, v)
+        if j == len(leaf.keys) or leaf.keys[j] != v:
+            return 0
+        howManyWereDeleted = leaf.counts[j] if delete_all else 1
+        self._size -= howManyWereDeleted
+        if howManyWereDeleted < leaf.counts[j]:
+            leaf.counts[j] -= howManyWereDeleted
+            return howManyWereDeleted
+        # a separator equal to v may remain in an internal node; it still separates
+        # correctly as all the values to its right are >= v
+        del leaf.keys[j], leaf.counts[j]
+        self._rebalance(leaf, path)
+        return howManyWereDeleted
+
+    def _rebalance(self, node, path):
+        '''
+        Restores the minimum fill of node, and then of its ancestors in turn
+        '''
+        while path and len(node.keys) < self._min_keys:
+            parent, i = path.pop()
+            left = parent.children[i-1] if i > 0 else None
+            right = parent.children[i+1] if i+1 < len(parent.children) else None
+            if left is not None and len(left.keys) > self._min_keys:
+                if type(node) is _Leaf:
+                    node.keys.insert(0, left.keys.pop())
+                    node.counts.insert(0, left.counts.pop())
+                    parent.keys[i-1] = node.keys[0]
+                else:
+                    node.keys.insert(0, parent.keys[i-1])
+                    node.children.insert(0, left.children.pop())
+                    parent.keys[i-1] = left.keys.pop()
+                return
+            if right is not None and len(right.keys) > self._min_keys:
+                if type(node) is _Leaf:
+                    node.keys.append(right.keys.pop(0))
+                    node.counts.append(right.counts.pop(0))
+                    parent.keys[i] = right.keys[0]
+                else:
+                    node.keys.append(parent.keys[i])
+                    node.children.append(right.children.pop(0))
+                    parent.keys[i] = right.keys.pop(0)
+                return
+            # neither sibling can spare a key: merge with one of them
+            if left is not None:
+                i -= 1
+                node, right = left, node
+            if type(node) is _Leaf:
+                node.keys.extend(right.keys)
+                node.counts.extend(right.counts)
+                node.next = right.next
+            else:
+                node.keys.append(parent.keys[i])
+                node.keys.extend(right.keys)
+                node.children.extend(right.children)
+            del parent.keys[i], parent.children[i+1]
+            node = parent
+        if type(self._root) is _Internal and not self._root.keys:
+            self._root = self._root.children[0]
+
+    def size(self):
+        return self._size
+
+    __len__ = size
+
+    def min(self):
+        if self._size == 0:
+            raise ValueError('min of an empty tree')
+        node = self._root
+        while type(node) is _Internal:
+            node = node.children[0]
+        return node.keys[0]
+
+    def max(self):
+        if self._size == 0:
+            raise ValueError('max of an empty tree')
+        node = self._root
+        while type(node) is _Internal:
+            node = node.children[-1]
+        return node.keys[-1]
+
+    def depth(self):
+        rv = 0
+        node = self._root
+        while type(node) is _Internal:
+            node = node.children[0]
+            rv += 1
+        return rv
+
+    def __iter__(self):
+        node = self._root
+        while type(node) is _Internal:
+            node = node.children[0]
+        while node is not None:
+            for v, count in zip(node.keys, node.counts):
+                for _ in range(0, count):
+                    yield v
+            node = node.next
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import ordered_set_unittests
+
+class UnitTests(ordered_set_unittests.AbstractOrderedSetUnitTestCases):
+    def engine(self):
+        # a small fanout so that the tests exercise splits, borrows and merges
+        return lambda values=(): BTree(values, fanout=4)
+
+    def check_invariants(self, tree):
+        leaves = []
+        stack = [(tree._root, None, None, 0)]
+        while stack:
+            node, lo, hi, depth = stack.pop()
+            self.assertTrue(len(node.keys) <= tree._max_keys)
+            if node is not tree._root:
+                self.assertTrue(len(node.keys) >= tree._min_keys)
+            self.assertSequenceEqual(node.keys, sorted(set(node.keys)))
+            self.assertTrue(all(lo is None or k >= lo for k in node.keys))
+            self.assertTrue(all(hi is None or k < hi for k in node.keys))
+            if type(node) is _Leaf:
+                self.assertEqual(len(node.counts), len(node.keys))
+                self.assertTrue(all(c >= 1 for c in node.counts))
+                leaves.append((node, depth))
+            else:
+                self.assertEqual(len(node.children), len(node.keys)+1)
+                bounds = [lo] + node.keys + [hi]
+                # pushed in reverse order so that the leaves are collected left to right
+                for i in range(len(node.children)-1, -1, -1):
+                    stack.append((node.children[i], bounds[i], bounds[i+1], depth+1))
+        self.assertEqual(len(set(depth for _, depth in leaves)), 1)
+        for (leaf, _), (next_leaf, _) in zip(leaves, leaves[1:]+[(None, None)]):
+            self.assertIs(leaf.next, next_leaf)
+        self.assertEqual(sum(sum(leaf.counts) for leaf, _ in leaves), tree.size())
+
+    def test_high_fanout_is_shallow(self):
+        tree = BTree(range(0, 100000))
+        self.assertTrue(tree.depth() <= 3)
+        self.check_invariants(tree)
+        random.seed(0)
+        values = list(range(0, 100000))
+        random.shuffle(values)
+        for v in values[:90000]:
+            self.assertEqual(tree.delete(v, False), 1)
+        self.check_invariants(tree)
+        self.assertSequenceEqual(list(tree), sorted(values[90000:]))
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
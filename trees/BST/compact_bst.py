@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import array
+import random
+
+from bst import BSTNode, bulk_load_split_point
+
+
+NIL = -1
+
+
+class CompactBST(object):
+    '''
+    Array-backed ("struct of arrays") counterpart of BSTNode for very large trees.
+
+    Instead of one Python object per node, the tree is stored in a handful of flat
+    buffers indexed by node number:
+    * keys         : a list, or an array.array of the given typecode (e.g. 'l' or 'd')
+                     in which case the keys are stored unboxed
+    * left, right,
+      parent       : array.array('i') of node indices (NIL, i.e. -1, for "no node")
+    * sizes        : array.array('i') with the size of the subtree rooted at each node
+
+    That comes to 16 bytes per node for the structure (plus 8 bytes for a typed
+    key) whereas a BSTNode object weighs several times that. Node indices are C
+    ints so a tree can hold up to 2**31-1 nodes. The slots of deleted nodes are kept
+    in a free list (threaded through the right array) and re-used by later inserts.
+
+    The semantics are those of BSTNode: duplicates are allowed and live in the
+    left subtree. Unlike BSTNode, the tree is a container object and may be empty.
+    All operations are loops over integer indices; nothing is recursive.
+    '''
+
+    __slots__ = ('keys', 'left', 'right', 'parent', 'sizes', 'root', 'free')
+
+    def __init__(self, typecode=None):
+        self.keys = [] if typecode is None else array.array(str(typecode))
+        self.left = array.array(str('i'))
+        self.right = array.array(str('i'))
+        self.parent = array.array(str('i'))
+        self.sizes = array.array(str('i'))
+        self.root = NIL
+        self.free = NIL
+
+    @staticmethod
+    def createTreeUsingBulkLoad(values, typecode=None):
+        '''
+        Builds a minimum-height tree the same way BSTNode.createTreeUsingBulkLoad
+        does. The node of the i-th smallest value is given index i, so the keys
+        buffer is simply the sorted values.
+        '''
+        values = sorted(values)
+        tree = CompactBST(typecode)
+        N = len(values)
+        if N == 0:
+            return tree
+        tree.keys.extend(values)
+        for buf in (tree.left, tree.right, tree.parent, tree.sizes):
+            buf.extend([NIL]*N)
+        stack = [(0, N, NIL, True)]
+        while stack:
+            lo, hi, parent, left_child = stack.pop()
+            if lo == hi:
+                continue
+            i = bulk_load_split_point(values, lo, hi)
+            tree.sizes[i] = hi-lo
+            tree.parent[i] = parent
+            if parent == NIL:
+                tree.root = i
+            elif left_child:
+                tree.left[parent] = i
+            else:
+                tree.right[parent] = i
+            stack.append((lo, i, i, True))
+            stack.append((i+1, hi, i, False))
+        return tree
+
+    def _new_node(self, v, parent):
+        i = self.free
+        if i == NIL:
+            i = len(self.sizes)
+            self.keys.append(v)
+            self.left.append(NIL)
+            self.right.append(NIL)
+            self.parent.append(parent)
+            self.sizes.append(1)
+        else:
+            self.free = self.right[i]
+            self.keys[i] = v
+            self.left[i] = NIL
+            self.right[i] = NIL
+            self.parent[i] = parent
+            self.sizes[i] = 1
+        return i
+
+    def _free_node(self, i):
+        if type(self.keys) is list:
+            self.keys[i] = None # do not keep the key object alive
+        self.right[i] = self.free
+        self.free = i
+
+    def insert(self, v):
+        if self.root == NIL:
+            self.root = self._new_node(v, NIL)
+            return
+        keys, left, right, sizes = self.keys, self.left, self.right, self.sizes
+        i = self.root
+        while True:
+            sizes[i] += 1
+            if keys[i] >= v:
+                if left[i] == NIL:
+                    left[i] = self._new_node(v, i)
+                    return
+                i = left[i]
+            else:
+                if right[i] == NIL:
+                    right[i] = self._new_node(v, i)
+                    return
+                i = right[i]
+
+    def find(self, v):
+        keys, left, right = self.keys, self.left, self.right
+        i = self.root
+        while i != NIL:
+            k = keys[i]
+            if k == v:
+                return True
+            i = left[i] if k > v else right[i]
+        return False
+
+    def count(self, v):
+        keys, left, right = self.keys, self.left, self.right
+        rv = 0
+        i = self.root
+        while i != NIL:
+            k = keys[i]
+            if k == v:
+                rv += 1
+                i = left[i]
+            else:
+                i = left[i] if k > v else right[i]
+        return rv
+
+    def size(self):
+        return 0 if self.root == NIL else self.sizes[self.root]
+
+    __len__ = size
+
+    def min(self):
+        if self.root == NIL:
+            raise ValueError('min of an empty tree')
+        left = self.left
+        i = self.root
+        while left[i] != NIL:
+            i = left[i]
+        return self.keys[i]
+
+    def max(self):
+        if self.root == NIL:
+            raise ValueError('max of an empty tree')
+        right = self.right
+        i = self.root
+        while right[i] != NIL:
+            i = right[i]
+        return self.keys[i]
+
+    def depth(self):
+        if self.root == NIL:
+            raise ValueError('depth of an empty tree')
+        left, right = self.left, self.right
+        rv = 0
+        stack = [(self.root, 0)]
+        while stack:
+            i, d = stack.pop()
+            if d > rv:
+                rv = d
+            if left[i] != NIL:
+                stack.append((left[i], d+1))
+            if right[i] != NIL:
+                stack.append((right[i], d+1))
+        return rv
+
+    def _replace_in_parent(self, i, child):
+        p = self.parent[i]
+        if p == NIL:
+            self.root = child
+        elif self.left[p] == i:
+            self.left[p] = child
+        else:
+            self.right[p] = child
+        if child != NIL:
+            self.parent[child] = p
+
+    def _delete(self, v):
+        keys, left, right, sizes = self.keys, self.left, self.right, self.sizes
+        path = []
+        i = self.root
+        while i != NIL:
+            k = keys[i]
+            if k == v:
+                break
+            path.append(i)
+            i = left[i] if k > v else right[i]
+        if i == NIL:
+            return 0
+        for p in path:
+            sizes[p] -= 1
+        sizes[i] -= 1
+        if left[i] != NIL and right[i] != NIL:
+            # replace by the in-order predecessor which, having no right child, is spliced out
+            predecessor = left[i]
+            while right[predecessor] != NIL:
+                sizes[predecessor] -= 1
+                predecessor = right[predecessor]
+            keys[i] = keys[predecessor]
+            self._replace_in_parent(predecessor, left[predecessor])
+            self._free_node(predecessor)
+        else:
+            self._replace_in_parent(i, left[i] if left[i] != NIL else right[i])
+            self._free_node(i)
+        return 1
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        if not delete_all:
+            return self._delete(v)
+        howManyWereDeleted = 0
+        while self._delete(v) == 1:
+            howManyWereDeleted += 1
+        return howManyWereDeleted
+
+    def __iter__(self):
+        '''
+        Yields the keys in sorted order
+        '''
+        keys, left, right = self.keys, self.left, self.right
+        stack = []
+        i = self.root
+        while stack or i != NIL:
+            if i != NIL:
+                stack.append(i)
+                i = left[i]
+            else:
+                i = stack.pop()
+                yield keys[i]
+                i = right[i]
+
+    def preorder_values(self):
+        '''
+        Yields the keys in the order in which BSTNode.preorder_traversal_yield would
+        visit the corresponding nodes
+        '''
+        if self.root == NIL:
+            return
+        keys, left, right = self.keys, self.left, self.right
+        stack = [self.root]
+        while stack:
+            i = stack.pop()
+            yield keys[i]
+            if right[i] != NIL:
+                stack.append(right[i])
+            if left[i] != NIL:
+                stack.append(left[i])
+
+    def memory_usage(self):
+        '''
+        Returns the number of bytes used by the buffers (not counting the key objects
+        themselves when the keys are stored in a list)
+        '''
+        rv = 0
+        for buf in (self.left, self.right, self.parent, self.sizes):
+            rv += buf.buffer_info()[1]*buf.itemsize
+        if type(self.keys) is list:
+            rv += len(self.keys)*array.array(str('l')).itemsize
+        else:
+            rv += self.keys.buffer_info()[1]*self.keys.itemsize
+        return rv
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def assert_sizes_and_parents(self, tree):
+        stack = [] if tree.root == NIL else [tree.root]
+        self.assertEqual(tree.parent[tree.root] if stack else NIL, NIL)
+        while stack:
+            i = stack.pop()
+            size = 1
+            for child in (tree.left[i], tree.right[i]):
+                if child != NIL:
+                    self.assertEqual(tree.parent[child], i)
+                    size += tree.sizes[child]
+                    stack.append(child)
+            self.assertEqual(tree.sizes[i], size)
+
+    def test_same_shape_as_BSTNode(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 51):
+            random_values = [random.randint(0, 25) for _ in range(0, num_of_nodes)]
+            reference = BSTNode.createTreeUsingRecursiveInsert(random_values)
+            tree = CompactBST()
+            for v in random_values:
+                tree.insert(v)
+            self.assertSequenceEqual(list(tree.preorder_values()), [x.v for x in reference.preorder_traversal_yield()])
+            self.assertEqual(tree.depth(), reference.depth())
+            bulk_reference = BSTNode.createTreeUsingBulkLoad(random_values)
+            bulk_loaded = CompactBST.createTreeUsingBulkLoad(random_values, 'l')
+            self.assertSequenceEqual(list(bulk_loaded.preorder_values()), [x.v for x in bulk_reference.preorder_traversal_yield()])
+            self.assert_sizes_and_parents(bulk_loaded)
+
+    def test_find_count_and_delete(self):
+        random.seed(0)
+        for typecode in (None, 'l', 'd'):
+            for num_of_nodes in range(0, 80):
+                random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+                tree = CompactBST(typecode)
+                for v in random_values:
+                    tree.insert(v)
+                self.assertEqual(len(tree), num_of_nodes)
+                self.assertSequenceEqual(list(tree), sorted(random_values))
+                for f in range(-1, 22):
+                    self.assertEqual(tree.find(f), f in random_values)
+                    self.assertEqual(tree.count(f), random_values.count(f))
+                remaining = random_values[:]
+                for v in random_values[::2]:
+                    delete_all = random.choice([False, True])
+                    if delete_all:
+                        expected = remaining.count(v)
+                        remaining = [x for x in remaining if x != v]
+                    else:
+                        expected = 1 if v in remaining else 0
+                        if expected:
+                            remaining.remove(v)
+                    self.assertEqual(tree.delete(v, delete_all), expected)
+                    self.assertSequenceEqual(list(tree), sorted(remaining))
+                    self.assert_sizes_and_parents(tree)
+                if remaining:
+                    self.assertEqual(tree.min(), min(remaining))
+                    self.assertEqual(tree.max(), max(remaining))
+                # freed slots are re-used
+                slots = len(tree.sizes)
+                for v in random_values[::2]:
+                    tree.insert(v)
+                self.assertEqual(len(tree.sizes), max(slots, len(tree)))
+                self.assertSequenceEqual(list(tree), sorted(remaining+random_values[::2]))
+
+    def test_delete_everything(self):
+        tree = CompactBST.createTreeUsingBulkLoad([3, 1, 2, 2, 5])
+        for v in [2, 5, 1, 3, 2]:
+            self.assertEqual(tree.delete(v, False), 1)
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(list(tree), [])
+        self.assertRaises(ValueError, tree.min)
+        tree.insert(42)
+        self.assertSequenceEqual(list(tree), [42])
+
+    def test_deep_trees_do_not_recurse(self):
+        tree = CompactBST('l')
+        N = 3000
+        for v in range(0, N):
+            tree.insert(-v)
+        self.assertEqual(tree.depth(), N-1)
+        self.assertEqual(tree.min(), -(N-1))
+        self.assertEqual(tree.delete(0, False), 1)
+        self.assertEqual(len(list(tree)), N-1)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+'''
+Trees that can be shared between threads. All three have the same interface
+(insert, delete, find, count, size, min, max) and, unlike BSTNode, may be empty:
+
+* LockedBST     : a BSTNode behind a single lock; every operation excludes every
+                  other one. This is the baseline.
+* RWLockedBST   : a BSTNode behind a readers-writer lock; reads run concurrently
+                  with each other but not with a write.
+* ConcurrentBST : copy-on-write. The tree is a PersistentBST version that is never
+                  modified; a write builds the next version (sharing all but the
+                  O(height) nodes on the updated path) and publishes it by swapping a
+                  single reference. Reads take no lock at all and never see a
+                  half-done update, and snapshot() gives a consistent view for as
+                  long as needed.
+
+Writes are serialized by a lock in all three.
+'''
+from __future__ import unicode_literals
+
+
+import contextlib
+import random
+import threading
+
+from bst import BSTNode
+from persistent_bst import PersistentBST
+
+
+class RWLock(object):
+    '''
+    Readers-writer lock: held by any number of readers or by a single writer.
+    Writers take precedence: once a writer waits, new readers wait behind it, so
+    that a steady stream of readers cannot starve the writers.
+    '''
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class LockedBST(object):
+    '''
+    A BSTNode shared between threads behind a single lock
+    '''
+
+    def __init__(self, values=()):
+        values = list(values)
+        self._root = BSTNode.createTreeUsingBulkLoad(values) if values else None
+        self._lock = threading.Lock()
+
+    def _reading(self):
+        return self._lock
+
+    def _writing(self):
+        return self._lock
+
+    def insert(self, v):
+        with self._writing():
+            if self._root is None:
+                self._root = BSTNode(None, v)
+            else:
+                self._root.insert_non_recursive(v)
+
+    def delete(self, v, delete_all):
+        '''
+        Returns the number of values deleted; deleting the last values empties the tree
+        '''
+        assert delete_all is True or delete_all is False
+        with self._writing():
+            if self._root is None:
+                return 0
+            howManyWereDeleted = self._root.count(v) if delete_all else int(self._root.find(v))
+            if howManyWereDeleted > 0 and howManyWereDeleted == self._root.size():
+                self._root = None
+                return howManyWereDeleted
+            return self._root.delete(v, delete_all)
+
+    def find(self, v):
+        with self._reading():
+            return self._root is not None and self._root.find(v)
+
+    def count(self, v):
+        with self._reading():
+            return 0 if self._root is None else self._root.count(v)
+
+    def size(self):
+        with self._reading():
+            return 0 if self._root is None else self._root.size()
+
+    __len__ = size
+
+    def min(self):
+        with self._reading():
+            if self._root is None:
+                raise ValueError('min of an empty tree')
+            return self._root.min()
+
+    def max(self):
+        with self._reading():
+            if self._root is None:
+                raise ValueError('max of an empty tree')
+            return self._root.max()
+
+
+class RWLockedBST(LockedBST):
+    '''
+    A BSTNode shared between threads behind a readers-writer lock
+    '''
+
+    def __init__(self, values=()):
+        LockedBST.__init__(self, values)
+        self._lock = RWLock()
+
+    def _reading(self):
+        return self._lock.read_locked()
+
+    def _writing(self):
+        return self._lock.write_locked()
+
+
+class ConcurrentBST(object):
+    '''
+    A copy-on-write tree for one or more writers and any number of lock-free readers.
+
+    The current version is a PersistentBST held in a single attribute. Readers
+    just dereference it once and then work on an immutable tree; writers, one at a
+    time, derive the next version and assign it to the attribute, which is atomic.
+    A reader therefore sees either the version before a write or the one after it.
+    '''
+
+    def __init__(self, values=()):
+        self._version = PersistentBST.createTreeUsingBulkLoad(values)
+        self._write_lock = threading.Lock()
+
+    def snapshot(self):
+        '''
+        Returns the current version: an immutable PersistentBST that later writes do
+        not affect, for reads that must be consistent with one another
+        '''
+        return self._version
+
+    def insert(self, v):
+        with self._write_lock:
+            self._version = self._version.insert(v)
+
+    def delete(self, v, delete_all):
+        '''
+        Returns the number of values deleted
+        '''
+        with self._write_lock:
+            self._version, howManyWereDeleted = self._version.delete(v, delete_all)
+            return howManyWereDeleted
+
+    def find(self, v):
+        return self._version.find(v)
+
+    def count(self, v):
+        return self._version.count(v)
+
+    def size(self):
+        return self._version.size()
+
+    __len__ = size
+
+    def min(self):
+        return self._version.min()
+
+    def max(self):
+        return self._version.max()
+
+    def __iter__(self):
+        '''
+        Yields the values of the version current at the time of the call, in sorted order
+        '''
+        return iter(self._version)
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def test_sequential_semantics(self):
+        random.seed(0)
+        for cls in (LockedBST, RWLockedBST, ConcurrentBST):
+            initial = [random.randint(0, 20) for _ in range(0, 10)]
+            tree = cls(initial)
+            content = initial[:]
+            for _ in range(0, 500):
+                v = random.randint(0, 20)
+                if random.random() < 0.45:
+                    tree.insert(v)
+                    content.append(v)
+                else:
+                    delete_all = random.choice([False, True])
+                    expected = content.count(v) if delete_all else int(v in content)
+                    self.assertEqual(tree.delete(v, delete_all), expected)
+                    for _ in range(0, expected):
+                        content.remove(v)
+                self.assertEqual(tree.size(), len(content))
+                self.assertEqual(tree.find(v), v in content)
+                self.assertEqual(tree.count(v), content.count(v))
+                if content:
+                    self.assertEqual((tree.min(), tree.max()), (min(content), max(content)))
+                else:
+                    self.assertRaises(ValueError, tree.min)
+
+    def stress(self, cls, num_of_readers=4, num_of_writes=1000):
+        '''
+        A writer inserts 0, 1, 2, ... in order and deletes odd values behind itself,
+        while readers check that they only ever observe states the writer went through
+        '''
+        tree = cls([-1])
+        errors = []
+        done = threading.Event()
+        def writer():
+            try:
+                for v in range(0, num_of_writes):
+                    tree.insert(v)
+                    if v % 2:
+                        tree.delete(v, False)
+            finally:
+                done.set()
+        def reader():
+            try:
+                while not done.is_set():
+                    n = tree.size()
+                    # the tree holds -1, the even values up to some 2k and maybe 2k+1,
+                    # so at least the even values up to 2(n-3) have been inserted and,
+                    # as they are never deleted, must be found from now on
+                    for v in range(2*(n-3), -1, -64):
+                        if not tree.find(v):
+                            errors.append('{} missing after size() was {}'.format(v, n))
+                    if tree.count(-1) != 1 or tree.min() != -1:
+                        errors.append('-1 missing')
+                    if isinstance(tree, ConcurrentBST):
+                        snapshot = list(tree.snapshot())
+                        last = snapshot[-1]
+                        if snapshot != [-1] + [x for x in range(0, last+1) if x % 2 == 0 or x == last]:
+                            errors.append('inconsistent snapshot of {} values'.format(len(snapshot)))
+            except Exception as e:
+                errors.append(repr(e))
+        threads = [threading.Thread(target=reader) for _ in range(0, num_of_readers)]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(tree.size(), 1 + (num_of_writes+1)//2)
+        for v in range(-1, num_of_writes):
+            self.assertEqual(tree.count(v), 1 if v == -1 or v % 2 == 0 else 0)
+
+    def test_stress_locked(self):
+        self.stress(LockedBST)
+
+    def test_stress_rwlocked(self):
+        self.stress(RWLockedBST)
+
+    def test_stress_concurrent(self):
+        self.stress(ConcurrentBST)
+
+    def test_snapshots_are_unaffected_by_later_writes(self):
+        tree = ConcurrentBST([1, 2, 3])
+        snapshot = tree.snapshot()
+        tree.insert(4)
+        tree.delete(1, True)
+        self.assertEqual(list(snapshot), [1, 2, 3])
+        self.assertEqual(list(tree), [2, 3, 4])
+
+    def test_rwlock_lets_readers_share(self):
+        lock = RWLock()
+        lock.acquire_read()
+        acquired = threading.Event()
+        def second_reader():
+            with lock.read_locked():
+                acquired.set()
+        t = threading.Thread(target=second_reader)
+        t.start()
+        self.assertTrue(acquired.wait(5))
+        t.join()
+        # a writer waits for the remaining reader
+        written = threading.Event()
+        def writer():
+            with lock.write_locked():
+                written.set()
+        t = threading.Thread(target=writer)
+        t.start()
+        self.assertFalse(written.wait(0.1))
+        lock.release_read()
+        self.assertTrue(written.wait(5))
+        t.join()
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
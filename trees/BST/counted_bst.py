@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import itertools
+import random
+
+from bst import BSTNode, OneByOneBatchUpdates
+
+
+class CountedBSTNode(OneByOneBatchUpdates, BSTNode):
+    '''
+    Variant of BSTNode that stores every distinct key only once, together with the
+    number of times it occurs (its multiplicity), instead of keeping a chain of
+    duplicate nodes in the left subtree.
+
+    The observable multiset semantics are those of BSTNode (insert, find, count,
+    size, delete(v, delete_all), min / max) but as keys are distinct the tree obeys
+    the strict binary search property (left < node < right) and:
+    * count is O(height) as it no longer walks a chain of duplicates
+    * delete(v, True) is O(height) as it removes a single node
+    * delete never has to migrate duplicates around the tree
+    * heavily skewed key distributions need one node per distinct key
+
+    The traversals yield one node per distinct key; the multiplicity of a node is
+    available as node.multiplicity. In to_string, keys that occur more than once
+    are shown followed by their multiplicity, e.g. "16 (x5)".
+    '''
+
+    __slots__ = ('multiplicity',)
+
+    # there are no duplicate nodes to look for
+    _DUPLICATES_LEFT = False
+
+    def __init__(self, parent, v, left=None, right=None, multiplicity=1):
+        BSTNode.__init__(self, parent, v, left, right)
+        assert multiplicity >= 1
+        self.multiplicity = multiplicity
+        self.subtree_size += multiplicity-1
+
+    @staticmethod
+    def createTreeUsingRecursiveInsert(values):
+        root = CountedBSTNode(None, values[0])
+        for v in values[1:]:
+            root.insert(v)
+        assert root.size()==len(values)
+        return root
+
+    @staticmethod
+    def createTreeUsingBulkLoad(values):
+        '''
+        Builds a minimum-height tree out of the values of any (non-empty) iterable in
+        O(n log n) time, or O(n) if the values are already sorted: the sorted values
+        are grouped into (key, multiplicity) pairs, which are split at the middle.
+        '''
+        keys = [(v, len(list(group))) for v, group in itertools.groupby(sorted(values))]
+        assert len(keys) > 0
+        return CountedBSTNode._bulk_build(keys, 0, len(keys), None)
+
+    @staticmethod
+    def _bulk_build(keys, lo, hi, parent):
+        '''
+        Builds a minimum-height tree out of the sorted (key, multiplicity) pairs
+        keys[lo:hi] (with lo < hi) and returns its root, whose parent pointer is set to
+        parent; the recursion is only O(log n) deep
+        '''
+        mid = (lo+hi)//2
+        v, multiplicity = keys[mid]
+        node = CountedBSTNode(parent, v, multiplicity=multiplicity)
+        if lo < mid:
+            node.left = CountedBSTNode._bulk_build(keys, lo, mid, node)
+            node.subtree_size += node.left.subtree_size
+        if mid+1 < hi:
+            node.right = CountedBSTNode._bulk_build(keys, mid+1, hi, node)
+            node.subtree_size += node.right.subtree_size
+        return node
+
+
+    def insert(self, v):
+        p = self
+        while True:
+            p.subtree_size += 1
+            if p.v == v:
+                p.multiplicity += 1
+                return
+            elif p.v > v:
+                if p.left is None:
+                    p.left = CountedBSTNode(p, v)
+                    return
+                p = p.left
+            else:
+                if p.right is None:
+                    p.right = CountedBSTNode(p, v)
+                    return
+                p = p.right
+
+    # a single loop suffices for both flavours as there are no duplicate chains to descend
+    insert_non_recursive = insert
+
+    def insert_persistent(self, v):
+        '''
+        Insert a value without modifying the original tree: returns a new tree and leaves
+        the old one unmodified. This is to support persistent data structures.
+        '''
+        path = []
+        node = self
+        while node is not None and node.v != v:
+            path.append(node)
+            node = node.left if node.v > v else node.right
+        if node is None:
+            child = CountedBSTNode(None, v)
+        else:
+            child = CountedBSTNode(None, node.v, node.left, node.right, node.multiplicity+1)
+        for node in reversed(path):
+            if node.v > v:
+                copy = CountedBSTNode(None, node.v, child, node.right, node.multiplicity)
+            else:
+                copy = CountedBSTNode(None, node.v, node.left, child, node.multiplicity)
+            child.parent = copy
+            child = copy
+        child.parent = self.parent
+        return child
+
+    def _path_to(self, v):
+        '''
+        Returns the list of nodes from this node down to the node holding v, or None
+        if v is not in the tree
+        '''
+        rv = []
+        node = self
+        while node is not None:
+            rv.append(node)
+            if node.v == v:
+                return rv
+            node = node.left if node.v > v else node.right
+        return None
+
+    def _occurrences(self):
+        return self.multiplicity
+
+    def count(self, v):
+        node = self
+        while node is not None:
+            if node.v == v:
+                return node.multiplicity
+            node = node.left if node.v > v else node.right
+        return 0
+
+    def _remove_node(self):
+        if self.left is not None and self.right is not None:
+            predecessor = self.left
+            while predecessor.right is not None:
+                predecessor = predecessor.right
+            self.v, self.multiplicity = predecessor.v, predecessor.multiplicity
+            node = self.left
+            while node is not predecessor:
+                node.subtree_size -= predecessor.multiplicity
+                node = node.right
+            # the in-order predecessor has no right child so it can simply be spliced out
+            if predecessor.parent.left is predecessor:
+                predecessor.parent.left = predecessor.left
+            else:
+                predecessor.parent.right = predecessor.left
+            if predecessor.left is not None:
+                predecessor.left.parent = predecessor.parent
+        elif self.left is not None or self.right is not None:
+            # copy the only child into this node so that the root never changes identity
+            child = self.left if self.left is not None else self.right
+            self.v, self.multiplicity = child.v, child.multiplicity
+            self.subtree_size = child.subtree_size
+            self.left = child.left
+            self.right = child.right
+            if self.left is not None:
+                self.left.parent = self
+            if self.right is not None:
+                self.right.parent = self
+        else:
+            if self.is_right_child():
+                self.parent.right = None
+            else:
+                self.parent.left = None
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        path = self._path_to(v)
+        if path is None:
+            return 0
+        node = path[-1]
+        howManyWereDeleted = node.multiplicity if delete_all else 1
+        if howManyWereDeleted == node.multiplicity and node.left is None and node.right is None and node.parent is None:
+            raise Exception('cannot delete the root if it contains the sole key in the tree; set the root pointer to None instead')
+        for p in path:
+            p.subtree_size -= howManyWereDeleted
+        if howManyWereDeleted < node.multiplicity:
+            node.multiplicity -= howManyWereDeleted
+        else:
+            node._remove_node()
+        return howManyWereDeleted
+
+    def _label(self):
+        if self.multiplicity == 1:
+            return BSTNode._label(self)
+        else:
+            return '{} (x{})'.format(self.v, self.multiplicity)
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def assert_distinct_and_ordered(self, tree):
+        keys = [x.v for x in tree.preorder_traversal_nonrecur_yield()]
+        self.assertEqual(len(keys), len(set(keys)))
+        for node in tree.preorder_traversal_nonrecur_yield():
+            self.assertEqual(node.subtree_size, sum(x.multiplicity for x in node.preorder_traversal_nonrecur_yield()))
+        stack = [(tree, None, None)]
+        while stack:
+            node, lo, hi = stack.pop()
+            self.assertTrue(lo is None or node.v > lo)
+            self.assertTrue(hi is None or node.v < hi)
+            if node.left is not None:
+                self.assertIs(node.left.parent, node)
+                stack.append((node.left, lo, node.v))
+            if node.right is not None:
+                self.assertIs(node.right.parent, node)
+                stack.append((node.right, node.v, hi))
+
+    def test_tree_creation(self):
+        values = [2, 14, 18, 15, 13, 9, 9, 17, 11, 1, 16, 17, 15, 16, 16, 2, 17, 5, 4, 14, 16, 2, 13, 12, 18, 0, 16, 9, 20, 18]
+        expected_stringification = '''
+2 (x3)
+├─R──>14 (x2)
+|     ├─R──>18 (x3)
+|     |     ├─R──>20
+|     |     └─L──>15 (x2)
+|     |           ├─R──>17 (x3)
+|     |           |     ├─R──>nil
+|     |           |     └─L──>16 (x5)
+|     |           └─L──>nil
+|     └─L──>13 (x2)
+|           ├─R──>nil
+|           └─L──>9 (x3)
+|                 ├─R──>11
+|                 |     ├─R──>12
+|                 |     └─L──>nil
+|                 └─L──>5
+|                       ├─R──>nil
+|                       └─L──>4
+└─L──>1
+      ├─R──>nil
+      └─L──>0
+'''.strip()
+        tree = CountedBSTNode.createTreeUsingRecursiveInsert(values)
+        self.assertEqual(tree.to_string(), expected_stringification)
+        self.assertEqual(tree.size(), len(values))
+        self.assertEqual(tree.count(16), 5)
+        self.assert_distinct_and_ordered(tree)
+
+    def test_that_the_three_versions_of_insert_all_yield_identical_trees(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 51):
+            rootValue = random.randint(0, 25)
+            tree1 = CountedBSTNode(None, rootValue)
+            tree2 = CountedBSTNode(None, rootValue)
+            tree3 = CountedBSTNode(None, rootValue)
+            for j in range(0, num_of_nodes):
+                v = random.randint(0, 25)
+                tree1.insert(v)
+                tree2.insert_non_recursive(v)
+                tree3Old = tree3
+                tree3OldStr = tree3Old.to_string()
+                tree3 = tree3.insert_persistent(v)
+                self.assertEqual(tree3Old.to_string(), tree3OldStr)
+                self.assertEqual(tree1.to_string(), tree2.to_string())
+                self.assertEqual(tree1.to_string(), tree3.to_string())
+
+    def test_find_and_count(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = CountedBSTNode.createTreeUsingRecursiveInsert(random_values)
+            self.assert_distinct_and_ordered(tree)
+            for f in range(-1, 22):
+                self.assertEqual(tree.find(f), f in random_values)
+                self.assertEqual(tree.count(f), random_values.count(f))
+            self.assertEqual(tree.min(), min(random_values))
+            self.assertEqual(tree.max(), max(random_values))
+
+    def test_batch_operations(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = CountedBSTNode.createTreeUsingRecursiveInsert(random_values)
+            queries = [random.randint(-1, 21) for _ in range(0, 30)]
+            self.assertEqual(tree.find_many(queries), [v in random_values for v in queries])
+            self.assertEqual(tree.count_many(queries), [random_values.count(v) for v in queries])
+            more = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree.insert_many(more)
+            random_values.extend(more)
+            self.assert_distinct_and_ordered(tree)
+            self.assertEqual(tree.count_many(range(-1, 22)), [random_values.count(v) for v in range(-1, 22)])
+            to_delete = [v for v in range(0, 21) if v != random_values[0]]
+            self.assertEqual(tree.delete_many(to_delete, True), [random_values.count(v) for v in to_delete])
+            self.assertEqual(tree.size(), random_values.count(random_values[0]))
+            self.assert_distinct_and_ordered(tree)
+
+    def test_delete_and_size(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = CountedBSTNode.createTreeUsingRecursiveInsert(random_values)
+            indexOfOnlyValueToNotDelete = random.randint(0, len(random_values)-1)
+            deletionsSoFar = 0
+            for i in range(0, len(random_values)):
+                if i == indexOfOnlyValueToNotDelete:
+                    continue
+                self.assertIs(tree.delete(random_values[i], False), 1)
+                deletionsSoFar += 1
+                self.assertEqual(tree.size(), num_of_nodes-deletionsSoFar)
+                self.assert_distinct_and_ordered(tree)
+            self.assertEqual(tree.v, random_values[indexOfOnlyValueToNotDelete])
+            self.assertIs(tree.left  , None)
+            self.assertIs(tree.right , None)
+            self.assertIs(tree.parent, None)
+            self.assertEqual(tree.size(), 1)
+            self.assertRaises(Exception, tree.delete, tree.v, False)
+
+    def test_delete_all_and_size(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = CountedBSTNode.createTreeUsingRecursiveInsert(random_values)
+            deletionsSoFar = 0
+            valueToNotDelete = random.choice(random_values)
+            for v in set(random_values):
+                if v == valueToNotDelete:
+                    continue
+                elementsDeleted = tree.delete(v, True)
+                self.assertEqual(elementsDeleted, random_values.count(v))
+                deletionsSoFar += elementsDeleted
+                self.assertEqual(tree.size(), num_of_nodes-deletionsSoFar)
+                self.assert_distinct_and_ordered(tree)
+            self.assertEqual(tree.v, valueToNotDelete)
+            self.assertIs(tree.left  , None)
+            self.assertIs(tree.right , None)
+            self.assertEqual(tree.multiplicity, random_values.count(valueToNotDelete))
+
+    def test_rank_and_select(self):
+        random.seed(0)
+        random_values = [random.randint(0, 50) for _ in range(0, 300)]
+        tree = CountedBSTNode.createTreeUsingRecursiveInsert(random_values)
+        self.assertSequenceEqual([tree.select(k) for k in range(0, len(random_values))], sorted(random_values))
+        for v in range(-1, 53):
+            self.assertEqual(tree.rank(v), len([x for x in random_values if x < v]))
+            self.assertEqual(tree.count_range(v, v+1), random_values.count(v))
+
+    def test_bulk_load(self):
+        random.seed(0)
+        for values in ([5], range(0, 1000), [7]*100, [random.randint(0, 50) for _ in range(0, 1000)]):
+            tree = CountedBSTNode.createTreeUsingBulkLoad(iter(values))
+            self.assertTrue(all(isinstance(node, CountedBSTNode) for node in tree.preorder_traversal_nonrecur_yield()))
+            self.assert_distinct_and_ordered(tree)
+            self.assertEqual(tree.size(), len(values))
+            self.assertEqual(tree.depth(), len(set(values)).bit_length()-1)
+            for v in set(values):
+                self.assertEqual(tree.count(v), values.count(v))
+            tree.insert(values[0])
+            self.assertEqual(tree.count(values[0]), values.count(values[0])+1)
+
+    def test_skewed_distribution_uses_one_node_per_key(self):
+        values = [7]*10000 + [3]*5000 + [9]
+        tree = CountedBSTNode.createTreeUsingRecursiveInsert(values)
+        self.assertEqual(len(list(tree.preorder_traversal_yield())), 3)
+        self.assertEqual(tree.count(7), 10000)
+        self.assertEqual(tree.delete(7, True), 10000)
+        self.assertEqual(tree.size(), 5001)
+        self.assertEqual(tree.to_string(),
+'''
+3 (x5000)
+├─R──>9
+└─L──>nil
+'''.strip())
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,136 @@
+import random
+
+
+import unittest
+class AbstractOrderedSetUnitTestCases(unittest.TestCase):
+    '''
+    Conformance tests for the ordered (multi)set engines, derived from the tests of
+    BSTNode. An engine is a class whose constructor takes an optional iterable of
+    values and whose instances (which may be empty) support:
+    * insert(v)              : duplicates are allowed
+    * find(v), count(v)
+    * delete(v, delete_all)  : returns the number of values deleted
+    * size() / len()
+    * min(), max()           : raise ValueError on an empty tree
+    * iteration              : yields the values in sorted order, duplicates included
+    Subclasses implement engine, and may override check_invariants to verify the
+    internal structure of the engine after every update.
+    '''
+
+    def engine(self):
+        raise NotImplementedError()
+
+    def check_invariants(self, tree):
+        pass
+
+    def assert_contents(self, tree, values):
+        self.check_invariants(tree)
+        self.assertEqual(tree.size(), len(values))
+        self.assertEqual(len(tree), len(values))
+        self.assertSequenceEqual(list(tree), sorted(values))
+        if values:
+            self.assertEqual(tree.min(), min(values))
+            self.assertEqual(tree.max(), max(values))
+        else:
+            self.assertRaises(ValueError, tree.min)
+            self.assertRaises(ValueError, tree.max)
+
+    def test_empty(self):
+        tree = self.engine()()
+        self.assert_contents(tree, [])
+        self.assertFalse(tree.find(1))
+        self.assertEqual(tree.count(1), 0)
+        self.assertEqual(tree.delete(1, False), 0)
+        self.assertEqual(tree.delete(1, True), 0)
+        tree.insert(1)
+        self.assert_contents(tree, [1])
+        self.assertEqual(tree.delete(1, False), 1)
+        self.assert_contents(tree, [])
+
+    def test_construction_and_insert(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 51):
+            random_values = [random.randint(0, 25) for _ in range(0, num_of_nodes)]
+            self.assert_contents(self.engine()(random_values), random_values)
+            tree = self.engine()()
+            for i, v in enumerate(random_values):
+                tree.insert(v)
+                self.assert_contents(tree, random_values[:i+1])
+
+    def test_find_and_count(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = self.engine()(random_values)
+            for f in range(-1, 22):
+                self.assertEqual(tree.find(f), f in random_values)
+                self.assertEqual(tree.count(f), random_values.count(f))
+
+    def test_delete_and_size(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = self.engine()(random_values)
+            remaining = random_values[:]
+            for v in random_values:
+                self.assertIs(tree.delete(v, False), 1)
+                remaining.remove(v)
+                self.assert_contents(tree, remaining)
+            self.assertEqual(tree.delete(random_values[0], False), 0)
+
+    def test_delete_all_and_size(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 101):
+            random_values = [random.randint(0, 20) for _ in range(0, num_of_nodes)]
+            tree = self.engine()(random_values)
+            remaining = random_values[:]
+            for v in set(random_values):
+                self.assertEqual(tree.delete(v, True), random_values.count(v))
+                remaining = [x for x in remaining if x != v]
+                self.assert_contents(tree, remaining)
+
+    def test_random_operations(self):
+        random.seed(0)
+        tree = self.engine()()
+        content = []
+        for i in range(0, 3000):
+            v = random.randint(0, 200)
+            if random.random() < 0.55:
+                tree.insert(v)
+                content.append(v)
+            else:
+                delete_all = random.choice([False, True])
+                expected = content.count(v) if delete_all else int(v in content)
+                self.assertEqual(tree.delete(v, delete_all), expected)
+                content = [x for x in content if x != v] if delete_all else content
+                if expected and not delete_all:
+                    content.remove(v)
+            if i % 100 == 0:
+                self.assert_contents(tree, content)
+        self.assert_contents(tree, content)
+
+    def test_sorted_inputs_do_not_recurse(self):
+        N = 5000
+        for values in (range(0, N), range(N, 0, -1)):
+            tree = self.engine()()
+            for v in values:
+                tree.insert(v)
+            self.assert_contents(tree, list(values))
+            for v in values:
+                self.assertEqual(tree.delete(v, False), 1)
+            self.assert_contents(tree, [])
+
+    def test_skewed_distribution(self):
+        values = [7]*3000 + [3]*2000 + [9]
+        tree = self.engine()(values)
+        self.assertEqual(tree.count(7), 3000)
+        self.assertEqual(tree.delete(7, True), 3000)
+        self.assert_contents(tree, [3]*2000 + [9])
+
+    def test_other_key_types(self):
+        values = ['pear', 'apple', 'fig', 'apple', 'kiwi', 'date']
+        tree = self.engine()(values)
+        self.assert_contents(tree, values)
+        self.assertEqual(tree.count('apple'), 2)
+        self.assertEqual(tree.delete('apple', True), 2)
+        self.assertFalse(tree.find('apple'))
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import random
+
+from bst import BSTNode, bulk_load_split_point, iter_to_string_lines, to_string_lines, write_lines
+
+
+class PersistentBSTNode(object):
+    '''
+    Immutable node of a PersistentBST. There is no parent pointer: a node can be
+    shared by any number of versions of a tree, and so has no single parent.
+    '''
+
+    __slots__ = ('v', 'left', 'right', 'subtree_size')
+
+    def __init__(self, v, left=None, right=None):
+        self.v = v
+        self.left = left
+        self.right = right
+        self.subtree_size = 1 + (0 if left is None else left.subtree_size) + (0 if right is None else right.subtree_size)
+
+    def _label(self):
+        return str(self.v)
+
+
+class PersistentBST(object):
+    '''
+    A persistent (immutable) binary search tree with the multiset semantics of
+    BSTNode: duplicates are allowed and live in the left subtree.
+
+    A PersistentBST object is one version of the tree. insert and delete never modify
+    it; they return a new version that shares with it all the nodes that are not on
+    the path to the value inserted or deleted (path copying). An update therefore
+    allocates O(height) nodes, i.e. O(log n) on a balanced tree such as those built
+    by createTreeUsingBulkLoad, and taking a snapshot costs nothing: just keep a
+    reference to the version at hand.
+
+    Unlike BSTNode.insert_persistent, nodes carry no parent pointers, which could not
+    be right for a node shared by several versions. Unlike BSTNode, a PersistentBST
+    may be empty.
+    '''
+
+    __slots__ = ('root',)
+
+    def __init__(self, root=None):
+        self.root = root
+
+    @staticmethod
+    def createTreeUsingBulkLoad(values):
+        '''
+        Builds a minimum-height version out of the values of any iterable; see
+        BSTNode.createTreeUsingBulkLoad. The recursion is only O(log n) deep.
+        '''
+        values = sorted(values)
+        def build(lo, hi):
+            if lo == hi:
+                return None
+            i = bulk_load_split_point(values, lo, hi)
+            return PersistentBSTNode(values[i], build(lo, i), build(i+1, hi))
+        return PersistentBST(build(0, len(values)))
+
+    @staticmethod
+    def _rebuild_path(path, node):
+        '''
+        Given the path from the root down to (but excluding) some node, and a
+        replacement for that node, returns the root of the new version
+        '''
+        for parent, went_left in reversed(path):
+            if went_left:
+                node = PersistentBSTNode(parent.v, node, parent.right)
+            else:
+                node = PersistentBSTNode(parent.v, parent.left, node)
+        return node
+
+    def insert(self, v):
+        path = []
+        node = self.root
+        while node is not None:
+            went_left = node.v >= v
+            path.append((node, went_left))
+            node = node.left if went_left else node.right
+        return PersistentBST(PersistentBST._rebuild_path(path, PersistentBSTNode(v)))
+
+    def delete(self, v, delete_all):
+        '''
+        Returns a pair: the new version and the number of values deleted
+        '''
+        assert delete_all is True or delete_all is False
+        howManyWereDeleted = 0
+        version = self
+        while True:
+            path = []
+            node = version.root
+            while node is not None and node.v != v:
+                went_left = node.v > v
+                path.append((node, went_left))
+                node = node.left if went_left else node.right
+            if node is None:
+                break
+            if node.left is not None and node.right is not None:
+                # take over the value of the in-order predecessor and splice it out
+                spine = []
+                predecessor = node.left
+                while predecessor.right is not None:
+                    spine.append((predecessor, False))
+                    predecessor = predecessor.right
+                left = PersistentBST._rebuild_path(spine, predecessor.left)
+                replacement = PersistentBSTNode(predecessor.v, left, node.right)
+            else:
+                replacement = node.left if node.left is not None else node.right
+            version = PersistentBST(PersistentBST._rebuild_path(path, replacement))
+            howManyWereDeleted += 1
+            if not delete_all:
+                break
+        return version, howManyWereDeleted
+
+    def find(self, v):
+        node = self.root
+        while node is not None:
+            if node.v == v:
+                return True
+            node = node.left if node.v > v else node.right
+        return False
+
+    def count(self, v):
+        rv = 0
+        node = self.root
+        while node is not None:
+            if node.v == v:
+                rv += 1
+                node = node.left
+            else:
+                node = node.left if node.v > v else node.right
+        return rv
+
+    def size(self):
+        return 0 if self.root is None else self.root.subtree_size
+
+    __len__ = size
+
+    def min(self):
+        if self.root is None:
+            raise ValueError('min of an empty tree')
+        node = self.root
+        while node.left is not None:
+            node = node.left
+        return node.v
+
+    def max(self):
+        if self.root is None:
+            raise ValueError('max of an empty tree')
+        node = self.root
+        while node.right is not None:
+            node = node.right
+        return node.v
+
+    def depth(self):
+        if self.root is None:
+            raise ValueError('depth of an empty tree')
+        rv = 0
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth > rv:
+                rv = depth
+            if node.left is not None:
+                stack.append((node.left, depth+1))
+            if node.right is not None:
+                stack.append((node.right, depth+1))
+        return rv
+
+    def __iter__(self):
+        '''
+        Yields the values in sorted order
+        '''
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node.v
+                node = node.right
+
+    def to_string(self):
+        '''
+        Same rendering as BSTNode.to_string; an empty tree is rendered as "nil"
+        '''
+        return 'nil' if self.root is None else '\n'.join(to_string_lines(self.root))
+
+    def write_to(self, f, max_depth=None, max_nodes=None):
+        '''
+        Same as BSTNode.write_to
+        '''
+        write_lines(['nil'] if self.root is None else iter_to_string_lines(self.root, max_depth, max_nodes), f)
+
+    @staticmethod
+    def memory_stats(versions):
+        '''
+        Reports how much of their structure the given versions share. Returns a dict:
+        * versions      : the number of versions
+        * total_nodes   : the number of nodes the versions would need without sharing
+        * distinct_nodes: the number of nodes actually allocated for them
+        * shared_nodes  : the number of (distinct) nodes that belong to more than one version
+        A subtree met for the second time is shared in its entirety, so it is never
+        walked again; the whole computation takes O(distinct_nodes) time.
+        '''
+        seen = set()
+        shared = set()
+        total_nodes = 0
+        for version in versions:
+            if version.root is None:
+                continue
+            total_nodes += version.root.subtree_size
+            stack = [version.root]
+            while stack:
+                node = stack.pop()
+                if id(node) in seen:
+                    # reachable from an earlier version: mark the subtree as shared
+                    if id(node) in shared:
+                        continue
+                    shared_stack = [node]
+                    while shared_stack:
+                        n = shared_stack.pop()
+                        if id(n) in shared:
+                            continue
+                        shared.add(id(n))
+                        shared_stack.extend(x for x in (n.left, n.right) if x is not None)
+                    continue
+                seen.add(id(node))
+                stack.extend(x for x in (node.left, node.right) if x is not None)
+        return {'versions': len(versions),
+                'total_nodes': total_nodes,
+                'distinct_nodes': len(seen),
+                'shared_nodes': len(shared)}
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+class UnitTestCases(unittest.TestCase):
+
+    def test_same_shape_as_BSTNode(self):
+        random.seed(0)
+        for num_of_nodes in range(1, 51):
+            random_values = [random.randint(0, 25) for _ in range(0, num_of_nodes)]
+            tree = PersistentBST()
+            for v in random_values:
+                tree = tree.insert(v)
+            self.assertEqual(tree.to_string(), BSTNode.createTreeUsingRecursiveInsert(random_values).to_string())
+            self.assertEqual(PersistentBST.createTreeUsingBulkLoad(random_values).to_string(),
+                             BSTNode.createTreeUsingBulkLoad(random_values).to_string())
+
+    def test_versions_are_preserved(self):
+        random.seed(0)
+        versions = [PersistentBST()]
+        contents = [[]]
+        for _ in range(0, 400):
+            version, content = versions[-1], contents[-1]
+            v = random.randint(0, 30)
+            if random.random() < 0.6:
+                versions.append(version.insert(v))
+                contents.append(sorted(content+[v]))
+            else:
+                delete_all = random.choice([False, True])
+                new_version, howManyWereDeleted = version.delete(v, delete_all)
+                if delete_all:
+                    new_content = [x for x in content if x != v]
+                else:
+                    new_content = content[:]
+                    if v in new_content:
+                        new_content.remove(v)
+                self.assertEqual(howManyWereDeleted, len(content)-len(new_content))
+                versions.append(new_version)
+                contents.append(new_content)
+        for version, content in zip(versions, contents):
+            self.assertSequenceEqual(list(version), content)
+            self.assertEqual(version.size(), len(content))
+            for f in range(-1, 32):
+                self.assertEqual(version.find(f), f in content)
+                self.assertEqual(version.count(f), content.count(f))
+            if content:
+                self.assertEqual(version.min(), content[0])
+                self.assertEqual(version.max(), content[-1])
+
+    def test_updates_allocate_a_logarithmic_number_of_nodes(self):
+        N = 2**12-1
+        base = PersistentBST.createTreeUsingBulkLoad(range(0, 2*N, 2))
+        self.assertEqual(base.depth(), 11)
+        random.seed(0)
+        versions = [base]
+        for i in range(0, 200):
+            v = random.randint(0, 2*N)
+            if i % 2:
+                versions.append(versions[-1].insert(v))
+            else:
+                versions.append(versions[-1].delete(v, False)[0])
+            self.assertTrue(PersistentBST.memory_stats(versions[-2:])['distinct_nodes'] - versions[-2].size() <= 14)
+        stats = PersistentBST.memory_stats(versions)
+        self.assertEqual(stats['versions'], 201)
+        self.assertEqual(stats['total_nodes'], sum(x.size() for x in versions))
+        self.assertTrue(stats['distinct_nodes'] < N + 200*14)
+        self.assertTrue(stats['shared_nodes'] > N - 200*14)
+
+    def test_memory_stats(self):
+        v1 = PersistentBST().insert(2).insert(1).insert(3)
+        v2 = v1.insert(4) # copies 2 and 3, shares 1
+        self.assertEqual(PersistentBST.memory_stats([v1, v2]), {'versions': 2, 'total_nodes': 7, 'distinct_nodes': 6, 'shared_nodes': 1})
+        self.assertEqual(PersistentBST.memory_stats([v1, v1]), {'versions': 2, 'total_nodes': 6, 'distinct_nodes': 3, 'shared_nodes': 3})
+        self.assertEqual(PersistentBST.memory_stats([PersistentBST()]), {'versions': 1, 'total_nodes': 0, 'distinct_nodes': 0, 'shared_nodes': 0})
+
+    def test_write_to(self):
+        import io
+        for values in ([], [1], [5, 3, 8, 1, 4, 7, 9]):
+            tree = PersistentBST.createTreeUsingBulkLoad(values)
+            f = io.StringIO()
+            tree.write_to(f)
+            self.assertEqual(f.getvalue(), tree.to_string())
+        f = io.StringIO()
+        tree.write_to(f, max_depth=0)
+        self.assertEqual(f.getvalue(), '5\n\u2514\u2500... (6 values below)')
+
+    def test_empty_trees(self):
+        tree = PersistentBST()
+        self.assertEqual(tree.size(), 0)
+        self.assertEqual(tree.to_string(), 'nil')
+        self.assertEqual(tree.delete(1, True), (tree, 0))
+        tree, howManyWereDeleted = tree.insert(1).insert(1).delete(1, True)
+        self.assertEqual((tree.size(), howManyWereDeleted), (0, 2))
+        self.assertRaises(ValueError, tree.min)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import random
+
+
+class _SkipListNode(object):
+
+    __slots__ = ('v', 'forward')
+
+    def __init__(self, v, level):
+        self.v = v
+        self.forward = [None]*level
+
+
+class SkipList(object):
+    '''
+    Ordered multiset kept in a skip list (W. Pugh, 1990): a sorted linked list in
+    which every node also appears, with probability P, in the list one level up,
+    which skips over about 1/P nodes per link. A search starts at the sparsest list
+    and drops a level whenever the next node would overshoot, so insert, find and
+    delete take O(log n) expected time whatever the order of the insertions; there
+    is no rebalancing. Duplicates are kept as separate, adjacent nodes.
+
+    The interface is that of the ordered set engines (see ordered_set_unittests.py).
+    Pass a seed to make the shape of the list (not its contents) reproducible.
+    '''
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    __slots__ = ('_head', '_level', '_size', '_random')
+
+    def __init__(self, values=(), seed=None):
+        self._head = _SkipListNode(None, SkipList.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random(seed)
+        for v in values:
+            self.insert(v)
+
+    def _random_level(self):
+        level = 1
+        while level < SkipList.MAX_LEVEL and self._random.random() < SkipList.P:
+            level += 1
+        return level
+
+    def _predecessors(self, v):
+        '''
+        Returns, for every level, the last node whose value is smaller than v (or the
+        head of the list)
+        '''
+        update = [self._head]*SkipList.MAX_LEVEL
+        node = self._head
+        for i in range(self._level-1, -1, -1):
+            nxt = node.forward[i]
+            while nxt is not None and nxt.v < v:
+                node = nxt
+                nxt = node.forward[i]
+            update[i] = node
+        return update
+
+    def _first_not_smaller(self, v):
+        node = self._head
+        for i in range(self._level-1, -1, -1):
+            nxt = node.forward[i]
+            while nxt is not None and nxt.v < v:
+                node = nxt
+                nxt = node.forward[i]
+        return node.forward[0]
+
+    def insert(self, v):
+        update = self._predecessors(v)
+        level = self._random_level()
+        if level > self._level:
+            self._level = level
+        node = _SkipListNode(v, level)
+        for i in range(0, level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+        self._size += 1
+
+    def find(self, v):
+        node = self._first_not_smaller(v)
+        return node is not None and node.v == v
+
+    def count(self, v):
+        rv = 0
+        node = self._first_not_smaller(v)
+        while node is not None and node.v == v:
+            rv += 1
+            node = node.forward[0]
+        return rv
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        update = self._predecessors(v)
+        howManyWereDeleted = 0
+        node = update[0].forward[0]
+        # the predecessors of the first node holding v remain those of the next one
+        while node is not None and node.v == v:
+            for i in range(0, len(node.forward)):
+                update[i].forward[i] = node.forward[i]
+            howManyWereDeleted += 1
+            if not delete_all:
+                break
+            node = update[0].forward[0]
+        while self._level > 1 and self._head.forward[self._level-1] is None:
+            self._level -= 1
+        self._size -= howManyWereDeleted
+        return howManyWereDeleted
+
+    def size(self):
+        return self._size
+
+    __len__ = size
+
+    def min(self):
+        if self._size == 0:
+            raise ValueError('min of an empty tree')
+        return self._head.forward[0].v
+
+    def max(self):
+        if self._size == 0:
+            raise ValueError('max of an empty tree')
+        node = self._head
+        for i in range(self._level-1, -1, -1):
+            while node.forward[i] is not None:
+                node = node.forward[i]
+        return node.v
+
+    def __iter__(self):
+        node = self._head.forward[0]
+        while node is not None:
+            yield node.v
+            node = node.forward[0]
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import ordered_set_unittests
+
+class UnitTests(ordered_set_unittests.AbstractOrderedSetUnitTestCases):
+    def engine(self):
+        return SkipList
+
+    def check_invariants(self, skip_list):
+        # every level is a sorted sub-list of the level below it
+        below = None
+        for i in range(0, SkipList.MAX_LEVEL):
+            level = []
+            node = skip_list._head.forward[i]
+            while node is not None:
+                self.assertTrue(len(node.forward) > i)
+                level.append(node)
+                node = node.forward[i]
+            self.assertSequenceEqual([x.v for x in level], sorted(x.v for x in level))
+            if below is not None:
+                ids = set(id(x) for x in below)
+                self.assertTrue(all(id(x) in ids for x in level))
+            self.assertTrue(i < skip_list._level or not level)
+            below = level
+        self.assertEqual(len(list(skip_list)), skip_list.size())
+
+    def test_levels_are_logarithmic(self):
+        skip_list = SkipList(range(0, 20000), seed=0)
+        self.assertTrue(skip_list._level <= 12)
+        # about 1/4 of the nodes at each level make it to the next one
+        counts = []
+        for i in range(0, 4):
+            node, n = skip_list._head.forward[i], 0
+            while node is not None:
+                n += 1
+                node = node.forward[i]
+            counts.append(n)
+        for lower, upper in zip(counts, counts[1:]):
+            self.assertTrue(0.2 < float(upper)/lower < 0.3)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+import random
+
+
+class _TreapNode(object):
+
+    __slots__ = ('v', 'priority', 'multiplicity', 'left', 'right')
+
+    def __init__(self, v, priority):
+        self.v = v
+        self.priority = priority
+        self.multiplicity = 1
+        self.left = None
+        self.right = None
+
+
+class Treap(object):
+    '''
+    Ordered multiset kept in a treap (Seidel and Aragon, 1989): a binary search tree
+    on the values that is also a heap on random priorities drawn at insertion time.
+    Its shape is that of a BST built by inserting the values in random order, so its
+    height is O(log n) with high probability whatever the actual insertion order.
+    An insert adds a leaf and rotates it up until the heap property holds; a delete
+    rotates the node down until it is a leaf and cuts it off.
+
+    As in CountedBSTNode, every distinct value is stored once together with its
+    multiplicity. The interface is that of the ordered set engines (see
+    ordered_set_unittests.py). Pass a seed to make the shape of the tree (not its
+    contents) reproducible. Nothing is recursive.
+    '''
+
+    __slots__ = ('_root', '_size', '_random')
+
+    def __init__(self, values=(), seed=None):
+        self._root = None
+        self._size = 0
+        self._random = random.Random(seed)
+        for v in values:
+            self.insert(v)
+
+    def _replace_child(self, parent, old, new):
+        if parent is None:
+            self._root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
+    def _path_to(self, v):
+        '''
+        Returns the nodes from the root down to the node holding v (excluded) and that
+        node, or None if v is not in the treap
+        '''
+        path = []
+        node = self._root
+        while node is not None and node.v != v:
+            path.append(node)
+            node = node.left if v < node.v else node.right
+        return path, node
+
+    def insert(self, v):
+        self._size += 1
+        path, node = self._path_to(v)
+        if node is not None:
+            node.multiplicity += 1
+            return
+        node = _TreapNode(v, self._random.random())
+        if not path:
+            self._root = node
+            return
+        if v < path[-1].v:
+            path[-1].left = node
+        else:
+            path[-1].right = node
+        while path and path[-1].priority < node.priority:
+            parent = path.pop()
+            if parent.left is node:
+                parent.left = node.right
+                node.right = parent
+            else:
+                parent.right = node.left
+                node.left = parent
+            self._replace_child(path[-1] if path else None, parent, node)
+
+    def find(self, v):
+        return self._path_to(v)[1] is not None
+
+    def count(self, v):
+        node = self._path_to(v)[1]
+        return 0 if node is None else node.multiplicity
+
+    def delete(self, v, delete_all):
+        assert delete_all is True or delete_all is False
+        path, node = self._path_to(v)
+        if node is None:
+            return 0
+        howManyWereDeleted = node.multiplicity if delete_all else 1
+        self._size -= howManyWereDeleted
+        if howManyWereDeleted < node.multiplicity:
+            node.multiplicity -= howManyWereDeleted
+            return howManyWereDeleted
+        while node.left is not None and node.right is not None:
+            # rotate up the child with the higher priority
+            if node.left.priority > node.right.priority:
+                child = node.left
+                node.left = child.right
+                child.right = node
+            else:
+                child = node.right
+                node.right = child.left
+                child.left = node
+            self._replace_child(path[-1] if path else None, node, child)
+            path.append(child)
+        self._replace_child(path[-1] if path else None, node, node.left if node.left is not None else node.right)
+        return howManyWereDeleted
+
+    def size(self):
+        return self._size
+
+    __len__ = size
+
+    def min(self):
+        if self._root is None:
+            raise ValueError('min of an empty tree')
+        node = self._root
+        while node.left is not None:
+            node = node.left
+        return node.v
+
+    def max(self):
+        if self._root is None:
+            raise ValueError('max of an empty tree')
+        node = self._root
+        while node.right is not None:
+            node = node.right
+        return node.v
+
+    def depth(self):
+        if self._root is None:
+            raise ValueError('depth of an empty tree')
+        rv = 0
+        stack = [(self._root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if depth > rv:
+                rv = depth
+            if node.left is not None:
+                stack.append((node.left, depth+1))
+            if node.right is not None:
+                stack.append((node.right, depth+1))
+        return rv
+
+    def __iter__(self):
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                for _ in range(0, node.multiplicity):
+                    yield node.v
+                node = node.right
+
+
+# +-------------------------------------------+
+# |                                           |
+# |         U N I T    T E S T S              |
+# |                                           |
+# +-------------------------------------------+
+
+import unittest
+import ordered_set_unittests
+
+class UnitTests(ordered_set_unittests.AbstractOrderedSetUnitTestCases):
+    def engine(self):
+        return Treap
+
+    def check_invariants(self, treap):
+        stack = [] if treap._root is None else [(treap._root, None, None)]
+        size = 0
+        while stack:
+            node, lo, hi = stack.pop()
+            size += node.multiplicity
+            self.assertTrue(node.multiplicity >= 1)
+            self.assertTrue(lo is None or node.v > lo)
+            self.assertTrue(hi is None or node.v < hi)
+            for child in (node.left, node.right):
+                if child is not None:
+                    self.assertTrue(child.priority <= node.priority)
+            if node.left is not None:
+                stack.append((node.left, lo, node.v))
+            if node.right is not None:
+                stack.append((node.right, node.v, hi))
+        self.assertEqual(size, treap.size())
+
+    def test_sorted_input_yields_logarithmic_depth(self):
+        treap = Treap(range(0, 20000), seed=0)
+        self.assertTrue(treap.depth() < 50)
+
+
+if __name__ == '__main__' :
+    import doctest
+    doctest.testmod()
+    print 'Running unit tests. Please be patient...'
+    unittest.main()